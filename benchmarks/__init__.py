@@ -0,0 +1 @@
+""" Benchmarks of the library, run them with `python -m benchmarks.<name>` """
@@ -0,0 +1,327 @@
+""" Deterministic generator of a large synthetic modlist
+
+Writes mods with About.xml, LoadFolders.xml, Def files with abstract bases
+inherited across mods, and Patch files mixing the patch operation classes
+and xpath shapes found in real modlists, plus a ModsConfig.xml activating
+all of them. The same spec always gives the same files.
+
+    python -m benchmarks.corpus <folder> [--mods N] [--defs M] [--patches P]
+"""
+
+import argparse
+import random
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Callable
+
+__all__ = ["CorpusSpec", "generate"]
+
+type Operation = tuple[str, str]
+"""Class and content of a patch operation"""
+
+GAME_VERSION = "1.5.4104 rev435"
+DEFS_PER_FILE = 50
+OPERATIONS_PER_FILE = 25
+BASES_PER_MOD = 3
+TAGS = 40
+
+DEFAULT_OPERATIONS = {
+    "Add": 30,
+    "Replace": 20,
+    "Remove": 10,
+    "Insert": 5,
+    "AttributeSet": 5,
+    "Conditional": 10,
+    "Sequence": 10,
+    "FindMod": 5,
+    "SafeAdd": 3,
+    "AddOrReplace": 2,
+}
+
+DEFAULT_XPATHS = {
+    "def_name": 60,
+    "predicate": 25,
+    "name_attribute": 10,
+    "def_type": 5,
+}
+
+
+@dataclass(frozen=True)
+class CorpusSpec:
+    """What to generate
+
+    `operations` and `xpaths` are relative weights of patch operation
+    classes and xpath shapes:
+
+    - def_name: `/Defs/ThingDef[defName="..."]`
+    - predicate: `/Defs/ThingDef[tags/li="..."]`
+    - name_attribute: `/Defs/ThingDef[@Name="..."]`, abstract bases
+    - def_type: `/Defs/ThingDef`, every ThingDef
+    """
+
+    mods: int = 50
+    defs: int = 200
+    patches: int = 50
+    seed: int = 0
+    operations: dict[str, float] = field(
+        default_factory=lambda: dict(DEFAULT_OPERATIONS)
+    )
+    xpaths: dict[str, float] = field(default_factory=lambda: dict(DEFAULT_XPATHS))
+
+
+def generate(folder: Path, spec: CorpusSpec) -> Path:
+    """Write the modlist into `folder`, return the path to its ModsConfig.xml"""
+    generator = _Generator(spec)
+    for i in range(spec.mods):
+        generator.write_mod(folder.joinpath("Mods", f"Mod{i:04d}"), i)
+    package_ids = "".join(f"<li>{_package_id(i)}</li>" for i in range(spec.mods))
+    return _write(
+        folder.joinpath("Config", "ModsConfig.xml"),
+        f"<ModsConfigData><version>{GAME_VERSION}</version>"
+        f"<activeMods>{package_ids}</activeMods><knownExpansions />"
+        "</ModsConfigData>",
+    )
+
+
+# pylint: disable-next=too-few-public-methods
+class _Generator:
+    """Keeps the defs written so far, for later defs and patches to refer to"""
+
+    def __init__(self, spec: CorpusSpec) -> None:
+        self.spec = spec
+        self.rng = random.Random(spec.seed)
+        self.bases: list[str] = []
+        self.things: list[str] = []
+        self._operations: dict[str, Callable[[str], Operation]] = {
+            "Add": self._add,
+            "Replace": self._replace,
+            "Remove": self._remove,
+            "Insert": self._insert,
+            "AttributeSet": self._attribute_set,
+            "Conditional": self._conditional,
+            "Sequence": self._sequence,
+            "FindMod": self._find_mod,
+            "SafeAdd": self._safe_add,
+            "AddOrReplace": self._add_or_replace,
+        }
+
+    def write_mod(self, path: Path, i: int):
+        """Write the files of the i-th mod"""
+        load_after = (
+            f"<loadAfter><li>{_package_id(i - 1)}</li></loadAfter>" if i else ""
+        )
+        _write(
+            path.joinpath("About", "About.xml"),
+            f"<ModMetaData><packageId>{_package_id(i)}</packageId>"
+            f"<name>{_name(i)}</name><author>Benchmark</author>"
+            f"<supportedVersions><li>1.5</li></supportedVersions>{load_after}"
+            "</ModMetaData>",
+        )
+        _write(
+            path.joinpath("LoadFolders.xml"),
+            "<loadFolders><v1.5><li>/</li><li>1.5</li></v1.5></loadFolders>",
+        )
+        defs = self._bases(i) + [self._def(i, k) for k in range(self.spec.defs)]
+        for n, start in enumerate(range(0, len(defs), DEFS_PER_FILE)):
+            _write(
+                path.joinpath("1.5", "Defs", f"Defs_{n}.xml"),
+                f"<Defs>{''.join(defs[start : start + DEFS_PER_FILE])}</Defs>",
+            )
+        operations = [self._operation() for _ in range(self.spec.patches)]
+        for n, start in enumerate(range(0, len(operations), OPERATIONS_PER_FILE)):
+            _write(
+                path.joinpath("Patches", f"Patches_{n}.xml"),
+                "<Patch>"
+                + "".join(
+                    _element("Operation", op)
+                    for op in operations[start : start + OPERATIONS_PER_FILE]
+                )
+                + "</Patch>",
+            )
+
+    def _bases(self, i: int) -> list[str]:
+        result = []
+        for j in range(BASES_PER_MOD):
+            name = f"Bench{i}_Base{j}"
+            parent = (
+                f' ParentName="{self.rng.choice(self.bases)}"' if self.bases else ""
+            )
+            result.append(
+                f'<ThingDef Name="{name}"{parent} Abstract="True">'
+                f"<category>Item</category><tickerType>Never</tickerType>"
+                f"<statBases><MaxHitPoints>{self.rng.randint(50, 300)}</MaxHitPoints>"
+                f'</statBases><comps><li Class="CompProperties_Forbiddable" /></comps>'
+                "</ThingDef>"
+            )
+            self.bases.append(name)
+        return result
+
+    def _def(self, i: int, k: int) -> str:
+        rng = self.rng
+        roll = rng.random()
+        if roll < 0.1:
+            return (
+                f"<StatDef><defName>Bench{i}_Stat{k}</defName><label>stat {k}</label>"
+                f"<defaultBaseValue>{rng.randint(0, 10)}</defaultBaseValue></StatDef>"
+            )
+        if roll < 0.3 and len(self.things) >= 2:
+            users = "".join(f"<li>{t}</li>" for t in rng.sample(self.things, 2))
+            return (
+                f"<RecipeDef><defName>Bench{i}_Recipe{k}</defName>"
+                f"<label>make {k}</label><recipeUsers>{users}</recipeUsers>"
+                f"<ingredients><li><count>{rng.randint(1, 50)}</count></li></ingredients>"
+                "</RecipeDef>"
+            )
+        def_name = f"Bench{i}_Thing{k}"
+        tags = "".join(
+            f"<li>Tag{t}</li>"
+            for t in sorted(rng.sample(range(TAGS), rng.randint(1, 4)))
+        )
+        self.things.append(def_name)
+        return (
+            f'<ThingDef ParentName="{rng.choice(self.bases)}">'
+            f"<defName>{def_name}</defName><label>thing {k}</label>"
+            f"<description>A generated thing.</description>"
+            f"<statBases><MarketValue>{rng.uniform(0.1, 500):.2f}</MarketValue>"
+            f"<Mass>{rng.uniform(0.01, 50):.2f}</Mass>"
+            f"<Beauty>{rng.randint(-10, 10)}</Beauty></statBases>"
+            f"<tags>{tags}</tags></ThingDef>"
+        )
+
+    def _operation(self) -> Operation:
+        """A random operation"""
+        return self._operations[_pick(self.rng, self.spec.operations)](self._xpath())
+
+    def _xpath(self) -> str:
+        """A random xpath selecting ThingDefs"""
+        match _pick(self.rng, self.spec.xpaths):
+            case "def_name" if self.things:
+                return f'/Defs/ThingDef[defName="{self.rng.choice(self.things)}"]'
+            case "predicate":
+                return f'/Defs/ThingDef[tags/li="Tag{self.rng.randrange(TAGS)}"]'
+            case "name_attribute":
+                return f'/Defs/ThingDef[@Name="{self.rng.choice(self.bases)}"]'
+            case "def_type" | "def_name":
+                return "/Defs/ThingDef"
+        raise ValueError("Unknown xpath shape")
+
+    def _add(self, xpath: str) -> Operation:
+        return (
+            "PatchOperationAdd",
+            f"<xpath>{xpath}/statBases</xpath>"
+            f"<value><WorkToMake>{self.rng.randint(100, 5000)}</WorkToMake></value>",
+        )
+
+    def _replace(self, xpath: str) -> Operation:
+        return (
+            "PatchOperationReplace",
+            f"<xpath>{xpath}/statBases/MarketValue</xpath>"
+            f"<value><MarketValue>{self.rng.uniform(1, 100):.2f}</MarketValue></value>",
+        )
+
+    def _remove(self, xpath: str) -> Operation:
+        return ("PatchOperationRemove", f"<xpath>{xpath}/description</xpath>")
+
+    def _insert(self, xpath: str) -> Operation:
+        return (
+            "PatchOperationInsert",
+            f"<xpath>{xpath}/label</xpath><value><labelShort>short</labelShort></value>",
+        )
+
+    def _attribute_set(self, xpath: str) -> Operation:
+        return (
+            "PatchOperationAttributeSet",
+            f"<xpath>{xpath}</xpath><attribute>Benchmark</attribute><value>1</value>",
+        )
+
+    def _conditional(self, xpath: str) -> Operation:
+        return (
+            "PatchOperationConditional",
+            f"<xpath>{xpath}/statBases/Mass</xpath>"
+            + _element(
+                "match",
+                (
+                    "PatchOperationReplace",
+                    f"<xpath>{xpath}/statBases/Mass</xpath>"
+                    "<value><Mass>1</Mass></value>",
+                ),
+            )
+            + _element(
+                "nomatch",
+                (
+                    "PatchOperationAdd",
+                    f"<xpath>{xpath}/statBases</xpath><value><Mass>1</Mass></value>",
+                ),
+            ),
+        )
+
+    def _sequence(self, xpath: str) -> Operation:
+        return (
+            "PatchOperationSequence",
+            "<operations>"
+            + _element("li", self._add(xpath))
+            + _element("li", self._replace(xpath))
+            + "</operations>",
+        )
+
+    def _find_mod(self, xpath: str) -> Operation:
+        mod = self.rng.randrange(self.spec.mods * 2)  # half of them are missing
+        return (
+            "PatchOperationFindMod",
+            f"<mods><li>{_name(mod)}</li></mods>" + _element("match", self._add(xpath)),
+        )
+
+    def _safe_add(self, xpath: str) -> Operation:
+        return (
+            "XmlExtensions.PatchOperationSafeAdd",
+            f"<xpath>{xpath}</xpath><compare>InnerText</compare>"
+            f"<value><tags><li>Tag{self.rng.randrange(TAGS)}</li></tags></value>",
+        )
+
+    def _add_or_replace(self, xpath: str) -> Operation:
+        return (
+            "XmlExtensions.PatchOperationAddOrReplace",
+            f"<xpath>{xpath}/statBases</xpath>"
+            f"<value><Beauty>{self.rng.randint(-10, 10)}</Beauty></value>",
+        )
+
+
+def _element(tag: str, operation: Operation) -> str:
+    return f'<{tag} Class="{operation[0]}">{operation[1]}</{tag}>'
+
+
+def _pick(rng: random.Random, weights: dict[str, float]) -> str:
+    return rng.choices(list(weights), list(weights.values()))[0]
+
+
+def _package_id(i: int) -> str:
+    return f"bench.mod{i:04d}"
+
+
+def _name(i: int) -> str:
+    return f"Bench Mod {i}"
+
+
+def _write(path: Path, content: str) -> Path:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(content, encoding="utf-8")
+    return path
+
+
+def main():
+    """Generate a corpus from the command line"""
+    parser = argparse.ArgumentParser(
+        description=(__doc__ or "").partition("\n")[0].strip()
+    )
+    parser.add_argument("folder", type=Path)
+    defaults = CorpusSpec()
+    for name in ("mods", "defs", "patches", "seed"):
+        parser.add_argument(f"--{name}", type=int, default=getattr(defaults, name))
+    args = parser.parse_args()
+    spec = CorpusSpec(args.mods, args.defs, args.patches, args.seed)
+    modsconfig = generate(args.folder, spec)
+    print(f"{asdict(spec)} -> {modsconfig}")
+
+
+if __name__ == "__main__":
+    main()
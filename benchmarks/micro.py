@@ -0,0 +1,207 @@
+""" Cost of every patch operation class against every xpath shape
+
+For each combination of operation class, xpath shape and world size, measures
+the time to deserialize the operation, the time to apply it, and the memory
+allocated by Python while applying it, as seen by `tracemalloc`. Allocations
+made by libxml2 itself are not traced.
+
+Combinations that are not valid patches, like adding elements to
+attributes, are shown as `-`, and the exception they raise is kept in the
+rows. The table
+can be stored as JSON with `--output` and compared between releases.
+
+    python -m benchmarks.micro [--sizes 1000 10000 100000] [--output micro.json]
+"""
+
+import argparse
+import json
+import tracemalloc
+from copy import deepcopy
+from pathlib import Path
+from time import perf_counter
+from typing import Any
+
+from lxml import etree
+
+from rimworld.patch import PatchContext, PatchOperation, get_operation
+from rimworld.patch.specialize import specialize
+from rimworld.xml import DefNameIndex
+
+SIZES = (1_000, 10_000, 100_000)
+REPEAT = 3
+DESERIALIZE_LOOPS = 200
+NAMED_EVERY = 10
+PARSER = etree.XMLParser(remove_blank_text=True)
+
+VALUE = "<value><benchmark>1</benchmark></value>"
+# operations nested in Conditional, Sequence and FindMod always add to the
+# same def, so only the xpath of the outer operation changes between shapes
+NESTED = '/Defs/ThingDef[defName="Thing0"]'
+ADD = f'<li Class="PatchOperationAdd"><xpath>{NESTED}</xpath>{VALUE}</li>'
+MATCH = f'<match Class="PatchOperationAdd"><xpath>{NESTED}</xpath>{VALUE}</match>'
+
+OPERATIONS = {
+    "PatchOperationAdd": f"<xpath>{{xpath}}</xpath>{VALUE}",
+    "PatchOperationAddModExtension": (
+        '<xpath>{xpath}</xpath><value><li Class="Benchmark" /></value>'
+    ),
+    "PatchOperationAttributeAdd": (
+        "<xpath>{xpath}</xpath><attribute>Benchmark</attribute><value>1</value>"
+    ),
+    "PatchOperationAttributeRemove": "<xpath>{xpath}</xpath><attribute>Name</attribute>",
+    "PatchOperationAttributeSet": (
+        "<xpath>{xpath}</xpath><attribute>Name</attribute><value>1</value>"
+    ),
+    "PatchOperationConditional": (f"<xpath>{{xpath}}</xpath>{MATCH}"),
+    "PatchOperationFindMod": (f"<mods><li>Benchmark</li></mods>{MATCH}"),
+    "PatchOperationInsert": f"<xpath>{{xpath}}</xpath>{VALUE}",
+    "PatchOperationTest": "<xpath>{xpath}</xpath>",
+    "PatchOperationRemove": "<xpath>{xpath}</xpath>",
+    "PatchOperationReplace": f"<xpath>{{xpath}}</xpath>{VALUE}",
+    "PatchOperationSequence": (
+        '<operations><li Class="PatchOperationTest"><xpath>{xpath}</xpath></li>'
+        f"{ADD}</operations>"
+    ),
+    "PatchOperationSetName": "<xpath>{xpath}</xpath><name>Benchmark</name>",
+    "XmlExtensions.PatchOperationSafeAdd": f"<xpath>{{xpath}}</xpath>{VALUE}",
+    "XmlExtensions.PatchOperationAddOrReplace": f"<xpath>{{xpath}}</xpath>{VALUE}",
+}
+
+XPATHS = {
+    "def_name": '/Defs/ThingDef[defName="Thing{middle}"]',
+    # leading slashes are collapsed into one when deserializing, so `//li` is
+    # written relative to the root
+    "descendant_li": "/Defs//li",
+    "name_attribute": "/Defs/*[@Name]",
+    "text": "/Defs/ThingDef/label/text()",
+    "attribute": "/Defs/ThingDef/@Name",
+}
+
+COLUMNS = ("operation", "xpath", "defs", "from_xml_us", "apply_ms", "blocks", "peak_kb")
+
+
+def make_world(size: int) -> etree._ElementTree:
+    """A world of `size` ThingDefs, every `NAMED_EVERY`th of them with a Name"""
+    root = etree.Element("Defs")
+    for i in range(size):
+        thing = etree.SubElement(root, "ThingDef")
+        if i % NAMED_EVERY == 0:
+            thing.set("Name", f"Base{i}")
+        etree.SubElement(thing, "defName").text = f"Thing{i}"
+        etree.SubElement(thing, "label").text = f"thing {i}"
+        tags = etree.SubElement(thing, "tags")
+        etree.SubElement(tags, "li").text = f"Tag{i % 40}"
+        comps = etree.SubElement(thing, "comps")
+        etree.SubElement(comps, "li", Class="CompProperties_Forbiddable")
+    return etree.ElementTree(root)
+
+
+def make_node(operation: str, xpath: str) -> etree._Element:
+    """Xml of an operation of the given class selecting `xpath`"""
+    content = OPERATIONS[operation].format(xpath=xpath)
+    return etree.fromstring(
+        f'<Operation Class="{operation}">{content}</Operation>', PARSER
+    )
+
+
+def measure_from_xml(node: etree._Element) -> float:
+    """Best time to deserialize the operation, in seconds per call"""
+    best = float("inf")
+    for _ in range(REPEAT):
+        start = perf_counter()
+        for _ in range(DESERIALIZE_LOOPS):
+            get_operation(node)
+        best = min(best, (perf_counter() - start) / DESERIALIZE_LOOPS)
+    return best
+
+
+def measure_apply(
+    node: etree._Element, world: etree._ElementTree
+) -> tuple[float, int, int]:
+    """Best time to apply the operation to a copy of the world, in seconds,
+    and the number and peak size of Python allocations while applying it"""
+    best = float("inf")
+    for _ in range(REPEAT):
+        operation, xml, context = _prepare(node, world)
+        start = perf_counter()
+        operation(xml, context)
+        best = min(best, perf_counter() - start)
+
+    operation, xml, context = _prepare(node, world)
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    tracemalloc.reset_peak()
+    operation(xml, context)
+    _, peak = tracemalloc.get_traced_memory()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    blocks = sum(max(stat.count_diff, 0) for stat in after.compare_to(before, "lineno"))
+    return best, blocks, peak
+
+
+def matrix(sizes: list[int]) -> list[dict[str, Any]]:
+    """Measure every combination, printing rows as they are measured"""
+    rows = []
+    print(_format(dict(zip(COLUMNS, COLUMNS))))
+    for size in sizes:
+        world = make_world(size)
+        for operation in OPERATIONS:
+            for shape, xpath in XPATHS.items():
+                row: dict[str, Any] = dict(zip(COLUMNS, (operation, shape, size)))
+                node = make_node(operation, xpath.format(middle=size // 2))
+                try:
+                    row["from_xml_us"] = measure_from_xml(node) * 1e6
+                    apply, row["blocks"], peak = measure_apply(node, world)
+                # pylint: disable-next=broad-exception-caught
+                except Exception as e:
+                    row["error"] = type(e).__name__
+                else:
+                    row["apply_ms"] = apply * 1e3
+                    row["peak_kb"] = peak / 1024
+                rows.append(row)
+                print(_format(row))
+    return rows
+
+
+def _prepare(
+    node: etree._Element, world: etree._ElementTree
+) -> tuple[PatchOperation, etree._ElementTree, PatchContext]:
+    """Fresh copies of the operation and the world, applied like load_world does"""
+    xml = deepcopy(world)
+    context = PatchContext(
+        active_package_ids=set(),
+        active_package_names={"Benchmark"},
+        def_index=DefNameIndex(xml.getroot()),
+        consume_values=True,
+    )
+    operation = specialize(get_operation(deepcopy(node)), context)
+    return operation, xml, context
+
+
+def _format(row: dict[str, Any]) -> str:
+    cells = []
+    for column, width in zip(COLUMNS, (41, 15, 7, 12, 10, 8, 9)):
+        value = row.get(column, "-")
+        if isinstance(value, float):
+            value = f"{value:.1f}"
+        cells.append(
+            f"{value:<{width}}" if column in COLUMNS[:2] else f"{value:>{width}}"
+        )
+    return " ".join(cells)
+
+
+def main():
+    """Print the table, and optionally store it"""
+    parser = argparse.ArgumentParser(
+        description=(__doc__ or "").partition("\n")[0].strip()
+    )
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(SIZES))
+    parser.add_argument("--output", type=Path, help="Store rows as JSON")
+    args = parser.parse_args()
+    rows = matrix(args.sizes)
+    if args.output is not None:
+        args.output.write_text(json.dumps(rows, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
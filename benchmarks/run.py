@@ -0,0 +1,205 @@
+""" Time loading a synthetic modlist, phase by phase
+
+Generates a corpus with `benchmarks.corpus` and times each phase of
+loading it: discovering mod folders, parsing About.xml and LoadFolders.xml,
+listing files, parsing Def files, merging them, deserializing Patch files
+and applying them, and `load_world` as a whole, also when loading only
+some def types. Every phase is timed `--repeat` times and the best time is
+kept.
+
+Results are printed, and stored as JSON with `--output`. With `--baseline`,
+they are compared against earlier results, and the run fails if a phase got
+slower than `--threshold` times its baseline.
+
+    python -m benchmarks.run [--mods N] [--defs M] [--patches P]
+        [--output results.json] [--baseline baseline.json]
+"""
+
+import argparse
+import json
+import platform
+import sys
+import tempfile
+from dataclasses import asdict
+from pathlib import Path
+from time import perf_counter
+from typing import Any, Callable
+
+from lxml import etree
+
+from benchmarks.corpus import CorpusSpec, generate
+from rimworld import load_world
+from rimworld.mod import Mod, ModsConfig, find_mod_folders, select_mods
+from rimworld.patch import PatchContext, PatchOperation, get_operation
+from rimworld.patch.specialize import specialize
+from rimworld.xml import DefNameIndex, load_xml, merge
+
+REPEAT = 3
+THRESHOLD = 1.1
+PROJECTION = ("StatDef", "RecipeDef")
+
+type Phases = dict[str, float]
+type ModFiles = list[tuple[Mod, list[Path], list[Path]]]
+
+
+# pylint: disable-next=too-many-locals
+def measure(folder: Path, modsconfig_path: Path) -> Phases:
+    """Time each phase of loading the corpus once, in seconds"""
+    phases: Phases = {}
+
+    def timed[T](name: str, function: Callable[[], T]) -> T:
+        start = perf_counter()
+        result = function()
+        phases[name] = phases.get(name, 0) + perf_counter() - start
+        return result
+
+    mods_folder = folder.joinpath("Mods")
+    paths = timed("discovery", lambda: list(find_mod_folders(mods_folder)))
+    mods = timed("about", lambda: [Mod.load(path) for path in paths])
+    mods_config = ModsConfig.load(modsconfig_path)
+    active_mods = list(select_mods(mods, package_id_in=mods_config.active_mods))
+    mod_files: ModFiles = timed(
+        "files",
+        lambda: [
+            (
+                mod,
+                list(mod.def_files(mods_config)),
+                list(mod.patch_files(mods_config)),
+            )
+            for mod in active_mods
+        ],
+    )
+    defs = timed(
+        "def_parse",
+        lambda: [[load_xml(path) for path in files[1]] for files in mod_files],
+    )
+    patches = timed(
+        "patch_deserialize",
+        lambda: [[_deserialize(path) for path in files[2]] for files in mod_files],
+    )
+
+    tree = etree.ElementTree(etree.Element("Defs"))
+    context = PatchContext(
+        active_package_ids={m.package_id for m in active_mods},
+        active_package_names={m.about.name for m in active_mods if m.about.name},
+        def_index=DefNameIndex(tree.getroot()),
+        consume_values=True,
+    )
+    for mod_defs, mod_patches in zip(defs, patches):
+        timed("merge", lambda mod_defs=mod_defs: _merge(tree, mod_defs, context))
+        timed("patch_apply", lambda p=mod_patches: _apply(tree, p, context))
+
+    timed("load_world", lambda: load_world([mods_folder], modsconfig_path))
+    timed(
+        "load_def_types",
+        lambda: load_world([mods_folder], modsconfig_path, def_types=PROJECTION),
+    )
+    return phases
+
+
+def best(folder: Path, modsconfig_path: Path, repeat: int) -> Phases:
+    """Best time of each phase over `repeat` runs"""
+    results = [measure(folder, modsconfig_path) for _ in range(repeat)]
+    return {name: min(r[name] for r in results) for name in results[0]}
+
+
+def peak_rss() -> int | None:
+    """Peak resident set size of the process in bytes, if it can be known"""
+    try:
+        import resource  # pylint: disable=import-outside-toplevel
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+def compare(results: dict[str, Any], baseline: dict[str, Any], threshold: float):
+    """Print ratios to the baseline, return names of phases that got slower"""
+    if baseline.get("spec") != results["spec"]:
+        print("The baseline was measured on a different corpus")
+    regressions = []
+    for name, elapsed in results["phases"].items():
+        if (before := baseline["phases"].get(name)) is None:
+            continue
+        ratio = elapsed / before
+        flag = ""
+        if ratio > threshold:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:>18}: {before * 1000:9.1f} ms -> x{ratio:.2f}{flag}")
+    if results["peak_rss"] and baseline.get("peak_rss"):
+        ratio = results["peak_rss"] / baseline["peak_rss"]
+        print(f"{'peak_rss':>18}: {baseline['peak_rss'] >> 20:9d} MB -> x{ratio:.2f}")
+    return regressions
+
+
+def _deserialize(path: Path) -> list[PatchOperation]:
+    return [
+        get_operation(node) for node in load_xml(path).getroot().findall("Operation")
+    ]
+
+
+def _merge(
+    tree: etree._ElementTree, defs: list[etree._ElementTree], context: PatchContext
+):
+    for document in defs:
+        added = merge(tree, document)
+        root = tree.getroot()
+        context.notify_changed(*root[len(root) - added :])
+
+
+def _apply(
+    tree: etree._ElementTree,
+    patches: list[list[PatchOperation]],
+    context: PatchContext,
+):
+    for operations in patches:
+        for operation in operations:
+            specialize(operation, context)(tree, context)
+
+
+def main():
+    """Run the benchmark from the command line"""
+    parser = argparse.ArgumentParser(
+        description=(__doc__ or "").partition("\n")[0].strip()
+    )
+    defaults = CorpusSpec()
+    for name in ("mods", "defs", "patches", "seed"):
+        parser.add_argument(f"--{name}", type=int, default=getattr(defaults, name))
+    parser.add_argument("--repeat", type=int, default=REPEAT)
+    parser.add_argument(
+        "--corpus", type=Path, help="Keep the corpus in this folder instead"
+    )
+    parser.add_argument("--output", type=Path, help="Store results as JSON")
+    parser.add_argument("--baseline", type=Path, help="Compare against results")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD)
+    args = parser.parse_args()
+
+    spec = CorpusSpec(args.mods, args.defs, args.patches, args.seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        folder = args.corpus or Path(tmp)
+        phases = best(folder, generate(folder, spec), args.repeat)
+
+    results = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "spec": asdict(spec),
+        "repeat": args.repeat,
+        "phases": phases,
+        "peak_rss": peak_rss(),
+    }
+    for name, elapsed in phases.items():
+        print(f"{name:>18}: {elapsed * 1000:9.1f} ms")
+    if results["peak_rss"] is not None:
+        print(f"{'peak_rss':>18}: {results['peak_rss'] >> 20:9d} MB")
+    if args.output is not None:
+        args.output.write_text(json.dumps(results, indent=2), encoding="utf-8")
+    if args.baseline is not None:
+        baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+        if regressions := compare(results, baseline, args.threshold):
+            sys.exit(f"Slower than the baseline: {', '.join(regressions)}")
+
+
+if __name__ == "__main__":
+    main()
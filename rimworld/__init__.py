@@ -1,25 +1,111 @@
+import logging
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from copy import deepcopy
+from dataclasses import replace
+from itertools import islice
 from pathlib import Path
-from typing import Collection
+from typing import Collection, Iterable, Iterator
 
 from lxml import etree
 
-from rimworld.mod import ModsConfig, load_mods, select_mods
-from rimworld.patch import PatchContext, get_operation
-from rimworld.xml import load_xml, merge
+from rimworld.error import UnsafeProjectionError
+from rimworld.events import Event, EventKind, Instrumentation
+from rimworld.incremental import DependencyGraph
+from rimworld.memory import DefOrigins
+from rimworld.mod import Mod, ModCatalog, ModsConfig, load_mods, select_mods
+from rimworld.patch import (MutationJournal, PatchCache, PatchContext,
+                            PatchOperation, PatchOperationWrapper,
+                            get_operation, patch_can_apply)
+from rimworld.patch.profiler import PatchProfiler
+from rimworld.patch.specialize import specialize
+from rimworld.projection import Projection, project_world
+from rimworld.snapshot import SnapshotStore, WorldCache
+from rimworld.xml import (DefNameIndex, compact_xml, load_normalized_xml,
+                          load_xml, merge, normalize_xml)
 
 __all__ = ["load_world"]
 
 
+# pylint: disable-next=too-many-arguments,too-many-locals
 def load_world(
-    mod_folders: Collection[Path], modsconfig_folder: Path
+    mod_folders: Collection[Path],
+    modsconfig_folder: Path,
+    *,
+    workers: int | None = None,
+    mod_catalog: Path | None = None,
+    processes: int | None = None,
+    profiler: PatchProfiler | None = None,
+    patch_cache: Path | None = None,
+    snapshots: SnapshotStore | None = None,
+    journal: MutationJournal | None = None,
+    dependencies: DependencyGraph | None = None,
+    world_cache: WorldCache | None = None,
+    events: Instrumentation | None = None,
+    low_memory: bool = False,
+    def_origins: DefOrigins | None = None,
+    def_types: Collection[str] | None = None,
 ) -> etree._ElementTree:
     """Convenience function to just load the world as Rimworld would do
 
+    Args:
+        mod_folders: Folders to search for mods
+        modsconfig_folder: Path to ModsConfig.xml
+        workers: Load mods' About.xml on a thread pool of this size (see `load_mods`)
+        mod_catalog: Path to a `ModCatalog` file caching parsed About.xml and
+            LoadFolders.xml files between runs
+        processes: Read and parse Def and Patch files ahead of time on a process
+            pool of this size. Files are still merged and applied in the same
+            order, so the result is the same as without it.
+        profiler: Record measurements of every patch operation applied, see
+            `PatchProfiler.report`
+        patch_cache: Path to a `PatchCache` file keeping patch operations
+            deserialized from Patch files between runs
+        snapshots: Take snapshots of the world after applying mods, and resume
+            from the latest one still matching the modlist and its files
+        journal: Record every change made by patch operations, attributed to
+            their mod and Patch file
+        dependencies: Record which defs patch operations search and change, so
+            the world can be brought up to date with `DependencyGraph.rebuild`
+            after some files change. Cannot be combined with `snapshots` or
+            `world_cache`.
+        world_cache: Read the world back from the cache if the modlist and its
+            files did not change since it was stored. Nothing is recorded by
+            `profiler` and `journal` when it is.
+        events: Report every step of loading, see `rimworld.events`. With
+            `processes`, parse events measure the time spent waiting for and
+            reading back documents parsed by the workers.
+        low_memory: Strip comments, processing instructions and whitespace-only
+            tails from Def and Patch files, so they never make it into the
+            world, and release every file as soon as it is applied
+        def_origins: Record which mod added every def, to attribute memory
+            to mods with `rimworld.memory.memory_report`
+        def_types: Only load defs of these types, and the defs they inherit
+            from. Defs of other types are dropped as they are merged, and
+            patch operations only touching them are skipped, see
+            `rimworld.projection`. When that cannot be proven to give the
+            same defs, every def type is loaded and the others are removed
+            afterwards; only that load is profiled, journaled and reported.
+            Cannot be combined with `dependencies`, `snapshots` or
+            `world_cache`.
+
     Note:
         hopefully
     """
 
-    mods_collection = list(load_mods(*mod_folders))
+    if dependencies is not None:
+        if snapshots is not None:
+            raise ValueError("Dependencies cannot be recorded when using snapshots")
+        if world_cache is not None:
+            raise ValueError("Dependencies cannot be recorded when using a world cache")
+    if def_types is not None and (
+        dependencies is not None or snapshots is not None or world_cache is not None
+    ):
+        raise ValueError(
+            "Def types cannot be selected when using dependencies, snapshots "
+            "or a world cache"
+        )
+    mods_collection = _load_mods(mod_folders, workers, mod_catalog, events)
     mods_config = ModsConfig.load(modsconfig_folder)
     active_mods = list(
         select_mods(mods_collection, package_id_in=mods_config.active_mods)
@@ -27,16 +113,392 @@ def load_world(
     patch_context = PatchContext(
         active_package_ids={m.package_id for m in active_mods},
         active_package_names={m.about.name for m in active_mods if m.about.name},
+        profiler=profiler,
+        journal=journal,
+        dependencies=dependencies,
+        events=events,
+        projection=Projection(def_types) if def_types is not None else None,
+    )
+
+    mod_files = [
+        (mod, list(mod.def_files(mods_config)), list(mod.patch_files(mods_config)))
+        for mod in active_mods
+    ]
+    world_key: str | None = None
+    if world_cache is not None:
+        world_key = world_cache.key(mods_config, patch_context, mod_files, low_memory)
+        if (cached := world_cache.load(world_key)) is not None:
+            return cached
+    if dependencies is not None:
+        dependencies.start(mod_files)
+    cache = PatchCache(patch_cache) if patch_cache is not None else None
+    if patch_context.projection is not None:
+        tree = _apply_projected(
+            mod_files, patch_context, processes, cache, low_memory, def_origins
+        )
+    else:
+        tree = _apply_mods(
+            mod_files,
+            patch_context,
+            processes,
+            cache,
+            snapshots,
+            low_memory,
+            def_origins,
+        )
+    if cache is not None:
+        cache.save()
+    if world_cache is not None and world_key is not None:
+        world_cache.save(world_key, tree)
+    if dependencies is not None:
+        dependencies.finish(tree, mod_files, patch_context)
+    return tree
+
+
+# pylint: disable-next=too-many-arguments,too-many-positional-arguments,too-many-locals
+def _apply_mods(
+    mod_files: list[tuple[Mod, list[Path], list[Path]]],
+    context: PatchContext,
+    processes: int | None,
+    patch_cache: PatchCache | None,
+    snapshots: SnapshotStore | None,
+    low_memory: bool,
+    origins: DefOrigins | None,
+) -> etree._ElementTree:
+    """Merge Def files and apply Patch files of each mod, in order"""
+    keys = (
+        snapshots.prefix_keys(context, mod_files, low_memory)
+        if snapshots is not None
+        else []
+    )
+    tree, done = _resume(snapshots, keys)
+    if origins is not None:
+        origins.claim(tree.getroot(), None)
+    context = replace(
+        context,
+        def_index=DefNameIndex(tree.getroot()),
+        consume_values=patch_cache is None and context.dependencies is None,
+    )
+    sources = _mod_sources(
+        mod_files[done:], context, processes, patch_cache, low_memory
     )
+    for i, (mod, defs, patches) in enumerate(sources, start=done):
+        _merge_defs(tree, zip(mod_files[i][1], defs), context, mod)
+        for path, operations in patches:
+            _apply_patch(tree, operations, context, mod, path)
+        if low_memory:
+            del defs, patches
+        if context.projection is not None:
+            context.projection.prune(tree.getroot())
+        if origins is not None:
+            origins.claim(tree.getroot(), mod.package_id)
+        if snapshots is not None and snapshots.wants(mod):
+            snapshots.save(keys[i], tree)
+    if snapshots is not None:
+        snapshots.prune(keys)
+    if context.projection is not None:
+        context.projection.check(tree)
+    return tree
+
 
-    tree = etree.ElementTree(etree.Element("Defs"))
+# pylint: disable-next=too-many-arguments,too-many-positional-arguments
+def _apply_projected(
+    mod_files: list[tuple[Mod, list[Path], list[Path]]],
+    context: PatchContext,
+    processes: int | None,
+    patch_cache: PatchCache | None,
+    low_memory: bool,
+    origins: DefOrigins | None,
+) -> etree._ElementTree:
+    """Apply mods loading only the def types of the context's projection
 
-    for mod in active_mods:
-        for def_file in mod.def_files(mods_config):
-            merge(tree, load_xml(def_file))
-        for patch_file in mod.patch_files(mods_config):
-            patch_operation_nodes = load_xml(patch_file).getroot().findall("Operation")
-            for patch_operation_node in patch_operation_nodes:
-                patch_operation = get_operation(patch_operation_node)
-                patch_operation(tree, patch_context)
+    If that is not safe, every def type is loaded and the others are removed
+    afterwards. Profiler records, events, journal entries and def origins
+    of the abandoned attempt are dropped.
+    """
+    assert context.projection is not None
+    held: list[Event] = []
+    profiler = context.profiler
+    profiled = len(profiler.records) if profiler is not None else 0
+    xpaths = deepcopy(profiler.xpaths) if profiler is not None else {}
+    attempt = replace(
+        context,
+        events=Instrumentation(held.append) if context.events is not None else None,
+    )
+    try:
+        tree = _apply_mods(
+            mod_files, attempt, processes, patch_cache, None, low_memory, origins
+        )
+    except UnsafeProjectionError as e:
+        logging.getLogger(__name__).info("Loading every def type: %s", e)
+        if profiler is not None:
+            del profiler.records[profiled:]
+            profiler.xpaths = xpaths
+        if context.journal is not None:
+            context.journal.clear()
+        if origins is not None:
+            origins.clear()
+        tree = _apply_mods(
+            mod_files,
+            replace(context, projection=None),
+            processes,
+            patch_cache,
+            None,
+            low_memory,
+            origins,
+        )
+        return project_world(tree, context.projection.def_types, origins)
+    if context.events is not None:
+        for event in held:
+            context.events.send(event)
     return tree
+
+
+def _resume(
+    snapshots: SnapshotStore | None, keys: list[str]
+) -> tuple[etree._ElementTree, int]:
+    """Return the latest snapshot and number of mods in it, or an empty world"""
+    if snapshots is not None and (resumed := snapshots.load_latest(keys)) is not None:
+        return resumed
+    return etree.ElementTree(etree.Element("Defs")), 0
+
+
+def _mod_sources(
+    mod_files: list[tuple[Mod, list[Path], list[Path]]],
+    context: PatchContext,
+    processes: int | None,
+    patch_cache: PatchCache | None,
+    low_memory: bool,
+) -> Iterator[
+    tuple[Mod, list[etree._ElementTree], list[tuple[Path, list[PatchOperation]]]]
+]:
+    """Yield each mod with its parsed Def files and deserialized Patch files
+
+    Patch files that cannot apply under the context are not loaded at all.
+    Operations are only kept until their mod is yielded.
+    """
+    cached: dict[Path, list[PatchOperation]] = {}
+    skipped = 0
+    for mod, _, patch_files in mod_files:
+        for path in patch_files:
+            if patch_cache is not None and (
+                (operations := patch_cache.lookup(path)) is not None
+            ):
+                cached[path] = operations
+            elif not _can_apply(path, mod, context):
+                # depends on the active mods, so it is never stored in the cache
+                cached[path] = []
+                skipped += 1
+    if skipped:
+        logging.getLogger(__name__).info(
+            "Skipped %d patch files that cannot apply to active mods", skipped
+        )
+    documents = _load_xmls(
+        [
+            path
+            for _, def_files, patch_files in mod_files
+            for path in def_files + patch_files
+            if path not in cached
+        ],
+        processes,
+    )
+    if low_memory:
+        documents = map(compact_xml, documents)
+    for mod, def_files, patch_files in mod_files:
+        defs = _parse_defs(documents, def_files, mod, context.events)
+        patches = []
+        for path in patch_files:
+            if path not in cached:
+                # pylint: disable-next=looping-through-iterator
+                cached[path] = _parse_patch(documents, path, mod, context.events)
+                if patch_cache is not None:
+                    patch_cache.store(path, cached[path])
+            patches.append((path, cached.pop(path)))
+        yield mod, defs, patches
+        if low_memory:
+            del defs, patches
+
+
+def _can_apply(path: Path, mod: Mod, context: PatchContext) -> bool:
+    """Check if a Patch file may apply under the context, reporting it if not"""
+    events = context.events
+    if events is None:
+        return patch_can_apply(path, context)
+    start = events.start()
+    if patch_can_apply(path, context):
+        return True
+    events.emit(
+        EventKind.PATCH_FILE_SKIPPED,
+        start,
+        path=path,
+        mod=mod.package_id,
+        size=path.stat().st_size,
+    )
+    return False
+
+
+def _parse_defs(
+    documents: Iterator[etree._ElementTree],
+    paths: list[Path],
+    mod: Mod,
+    events: Instrumentation | None,
+) -> list[etree._ElementTree]:
+    """Take the parsed Def files of a mod from `documents`"""
+    if events is None:
+        return list(islice(documents, len(paths)))
+    result = []
+    for path in paths:
+        start = events.start()
+        result.append(next(documents))
+        events.emit(
+            EventKind.DEF_FILE_PARSED,
+            start,
+            path=path,
+            mod=mod.package_id,
+            size=path.stat().st_size,
+            nodes=len(result[-1].getroot()),
+        )
+    return result
+
+
+def _parse_patch(
+    documents: Iterator[etree._ElementTree],
+    path: Path,
+    mod: Mod,
+    events: Instrumentation | None,
+) -> list[PatchOperation]:
+    """Take the parsed Patch file from `documents` and deserialize it"""
+    if events is None:
+        return _deserialize_patch(next(documents))
+    start = events.start()
+    result = _deserialize_patch(next(documents))
+    events.emit(
+        EventKind.PATCH_FILE_PARSED,
+        start,
+        path=path,
+        mod=mod.package_id,
+        size=path.stat().st_size,
+        nodes=len(result),
+    )
+    return result
+
+
+def _merge_defs(
+    tree: etree._ElementTree,
+    documents: Iterable[tuple[Path, etree._ElementTree]],
+    context: PatchContext,
+    mod: Mod,
+):
+    for path, defs in documents:
+        if context.projection is not None:
+            context.projection.filter_defs(defs)
+        start = context.events.start() if context.events is not None else 0.0
+        added = merge(tree, defs)
+        if context.events is not None:
+            context.events.emit(
+                EventKind.DEFS_MERGED,
+                start,
+                path=path,
+                mod=mod.package_id,
+                nodes=added,
+            )
+        root = tree.getroot()
+        nodes = root[len(root) - added :]
+        if context.dependencies is not None:
+            context.dependencies.merged(path, nodes)
+        context.notify_changed(*nodes)
+
+
+def _deserialize_patch(patch: etree._ElementTree) -> list[PatchOperation]:
+    return [get_operation(node) for node in patch.getroot().findall("Operation")]
+
+
+def _apply_patch(
+    tree: etree._ElementTree,
+    operations: list[PatchOperation],
+    context: PatchContext,
+    mod: Mod,
+    path: Path,
+):
+    if context.journal is not None:
+        context.journal.begin(mod.package_id, str(path))
+    for index, patch_operation in enumerate(operations):
+        patch_operation = specialize(patch_operation, context)
+        if context.projection is not None and not context.projection.wants(
+            patch_operation
+        ):
+            continue
+        if context.dependencies is not None:
+            context.dependencies.begin_operation(path, index, patch_operation)
+        if context.profiler is not None:
+            patch_operation = context.profiler.profile(
+                patch_operation, mod.package_id, path
+            )
+        if context.events is None:
+            patch_operation(tree, context)
+        else:
+            start = context.events.start()
+            result = patch_operation(tree, context)
+            context.events.emit(
+                EventKind.OPERATION_APPLIED,
+                start,
+                path=path,
+                mod=mod.package_id,
+                nodes=result.nodes_affected,
+                operation=_operation_name(operations[index]),
+            )
+        if context.dependencies is not None:
+            context.dependencies.end_operation()
+
+
+def _operation_name(operation: PatchOperation) -> str:
+    if isinstance(operation, PatchOperationWrapper):
+        operation = operation.operation
+    return type(operation).__name__
+
+
+def _load_mods(
+    mod_folders: Collection[Path],
+    workers: int | None,
+    mod_catalog: Path | None,
+    events: Instrumentation | None,
+) -> list[Mod]:
+    catalog = ModCatalog(mod_catalog) if mod_catalog is not None else None
+    result = list(
+        load_mods(*mod_folders, workers=workers, catalog=catalog, events=events)
+    )
+    if catalog is not None:
+        catalog.save()
+    return result
+
+
+def _load_xmls(
+    paths: list[Path], processes: int | None
+) -> Iterator[etree._ElementTree]:
+    """Load xml files in order, optionally parsing them ahead in worker processes"""
+    if processes is None:
+        for path in paths:
+            yield load_xml(path)
+        return
+
+    batches = iter(
+        [paths[i : i + _BATCH_SIZE] for i in range(0, len(paths), _BATCH_SIZE)]
+    )
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        pending = deque(
+            executor.submit(_normalize_xmls, batch)
+            for batch in islice(batches, processes * 2)
+        )
+        while pending:
+            contents = pending.popleft().result()
+            if (batch := next(batches, None)) is not None:
+                pending.append(executor.submit(_normalize_xmls, batch))
+            for content in contents:
+                yield load_normalized_xml(content)
+
+
+_BATCH_SIZE = 16
+
+
+def _normalize_xmls(paths: list[Path]) -> list[bytes]:
+    return [normalize_xml(path) for path in paths]
@@ -0,0 +1,93 @@
+""" Helpers shared by the on-disk caches
+
+Every cache keys its files with its name, a `FORMAT_VERSION` and the
+`library_version`. Bump a cache's `FORMAT_VERSION` whenever the classes it
+pickles, or the layout of what it stores, change.
+"""
+
+import hashlib
+import logging
+import os
+import pickle
+from dataclasses import dataclass
+from functools import cache
+from importlib import metadata
+from pathlib import Path
+from typing import Any, Self
+
+__all__ = [
+    "FileFingerprint",
+    "library_version",
+    "read_cache_file",
+    "write_cache_file",
+]
+
+
+@dataclass(frozen=True)
+class FileFingerprint:
+    """Cheap identity of a file's content: its modification time and size"""
+
+    mtime_ns: int
+    size: int
+
+    @classmethod
+    def of(cls, path: Path) -> Self | None:
+        """Stat a file, return None if it does not exist"""
+        try:
+            stat = os.stat(path)
+        except (FileNotFoundError, NotADirectoryError):
+            return None
+        return cls(stat.st_mtime_ns, stat.st_size)
+
+
+@cache
+def library_version() -> str:
+    """Version of this library, used to invalidate caches written by other versions
+
+    When the library is not installed, as when running from a checkout, a
+    digest of its source files is used instead, so that any change to the
+    code invalidates the caches.
+    """
+    try:
+        return metadata.version("rimworld")
+    except metadata.PackageNotFoundError:
+        return _source_digest(Path(__file__).parent)
+
+
+def _source_digest(root: Path) -> str:
+    hasher = hashlib.sha256()
+    for path in sorted(root.rglob("*.py")):
+        hasher.update(path.relative_to(root).as_posix().encode())
+        hasher.update(path.read_bytes())
+    return f"source-{hasher.hexdigest()[:16]}"
+
+
+def read_cache_file(path: Path, key: tuple) -> Any | None:
+    """Read a cache file written by `write_cache_file`
+
+    Returns None if the file does not exist, cannot be read, or was written with
+    a different `key` (for example, by another version of the library).
+
+    Note:
+        Cache files are pickles, only read the ones you wrote yourself.
+    """
+    try:
+        with path.open("rb") as f:
+            stored_key, payload = pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception:  # pylint: disable=broad-exception-caught
+        logging.getLogger(__name__).warning("Ignoring unreadable cache file %s", path)
+        return None
+    if stored_key != key:
+        return None
+    return payload
+
+
+def write_cache_file(path: Path, key: tuple, payload: Any):
+    """Atomically write a cache file, readable with `read_cache_file`"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with tmp_path.open("wb") as f:
+        pickle.dump((key, payload), f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
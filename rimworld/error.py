@@ -28,3 +28,12 @@ class PatchingUnsuccessful(Exception):
 
 class NoNodesFound(PatchingUnsuccessful):
     """No nodes were found during xpath search"""
+
+
+class IncrementalRebuildError(Exception):
+    """Raised when a world rebuilt incrementally differs from a full rebuild"""
+
+
+class UnsafeProjectionError(Exception):
+    """Raised when loading only some def types may not give the same defs as
+    loading all of them and keeping those types"""
@@ -0,0 +1,155 @@
+""" Events reported while loading a world, and a Chrome trace of them
+
+Pass `Instrumentation` to `load_world` to be told about every step of
+loading: mods found, About.xml files parsed, Def and Patch files parsed,
+Patch files skipped because they cannot apply to the active mods, Def files
+merged and top-level patch operations applied. Without it, no time is
+measured and no event is created.
+
+>>> events = []
+>>> instrumentation = Instrumentation(events.append)
+>>> start = instrumentation.start()
+>>> instrumentation.emit(EventKind.DEFS_MERGED, start, path=Path("Defs/a.xml"), nodes=3)
+>>> events[0].kind, events[0].nodes
+(<EventKind.DEFS_MERGED: 'defs_merged'>, 3)
+
+A `ChromeTrace` listener keeps events in the Chrome trace event format, to be
+opened in chrome://tracing or https://ui.perfetto.dev:
+
+>>> trace = ChromeTrace()
+>>> trace(events[0])
+>>> trace.to_json()["traceEvents"][0]["name"]
+'defs_merged'
+"""
+
+import json
+import os
+import threading
+from dataclasses import dataclass, field
+from enum import Enum
+from pathlib import Path
+from time import perf_counter
+from typing import Any, Protocol
+
+__all__ = [
+    "ChromeTrace",
+    "Event",
+    "EventKind",
+    "EventListener",
+    "Instrumentation",
+]
+
+
+class EventKind(Enum):
+    """Steps of loading a world"""
+
+    MOD_DISCOVERED = "mod_discovered"
+    ABOUT_PARSED = "about_parsed"
+    DEF_FILE_PARSED = "def_file_parsed"
+    DEFS_MERGED = "defs_merged"
+    PATCH_FILE_PARSED = "patch_file_parsed"
+    PATCH_FILE_SKIPPED = "patch_file_skipped"
+    OPERATION_APPLIED = "operation_applied"
+
+
+@dataclass(frozen=True)
+class Event:  # pylint: disable=too-many-instance-attributes
+    """A step of loading a world
+
+    `start` is a `time.perf_counter` value, `start` and `duration` are in
+    seconds. `size` is the size in bytes of the file the step read, `nodes`
+    the number of nodes it produced or changed: defs parsed or merged,
+    operations deserialized, or nodes affected by an operation. `operation`
+    is the class of the applied operation.
+    """
+
+    kind: EventKind
+    start: float
+    duration: float
+    path: Path | None = None
+    mod: str | None = None
+    size: int = 0
+    nodes: int = 0
+    operation: str | None = None
+    thread: int = field(default_factory=threading.get_ident)
+
+
+class EventListener(Protocol):  # pylint: disable=too-few-public-methods
+    """Receives events, possibly from several threads at once"""
+
+    def __call__(self, event: Event, /) -> None: ...
+
+
+class Instrumentation:
+    """Sends events to listeners
+
+    Callers only measure and emit events when they are given an
+    instrumentation, so there is no cost when nobody listens.
+    """
+
+    def __init__(self, *listeners: EventListener) -> None:
+        self.listeners = list(listeners)
+
+    def add(self, listener: EventListener):
+        """Register another listener"""
+        self.listeners.append(listener)
+
+    def start(self) -> float:
+        """Start timing a step, pass the result to `emit`"""
+        return perf_counter()
+
+    def emit(self, kind: EventKind, start: float, **fields: Any):
+        """Report a step that started at `start` and ends now"""
+        self.send(Event(kind, start, perf_counter() - start, **fields))
+
+    def send(self, event: Event):
+        """Send an event to the listeners, like one held back until a step
+        was known to be kept"""
+        for listener in self.listeners:
+            listener(event)
+
+
+class ChromeTrace:
+    """Listener keeping events in the Chrome trace event format
+
+    Every event is a complete event, named after its operation class or its
+    kind, with the mod, path, size and node count as arguments.
+
+    Example:
+        trace = ChromeTrace()
+        world = load_world(mod_folders, modsconfig, events=Instrumentation(trace))
+        trace.dump(Path("world.trace.json"))
+    """
+
+    def __init__(self) -> None:
+        self.events: list[dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def __call__(self, event: Event) -> None:
+        args: dict[str, Any] = {"size": event.size, "nodes": event.nodes}
+        if event.mod is not None:
+            args["mod"] = event.mod
+        if event.path is not None:
+            args["path"] = str(event.path)
+        trace_event = {
+            "name": event.operation or event.kind.value,
+            "cat": event.kind.value,
+            "ph": "X",
+            "ts": event.start * 1e6,
+            "dur": event.duration * 1e6,
+            "pid": os.getpid(),
+            "tid": event.thread,
+            "args": args,
+        }
+        with self._lock:
+            self.events.append(trace_event)
+
+    def to_json(self) -> dict[str, Any]:
+        """The trace, in the JSON object format"""
+        with self._lock:
+            return {"traceEvents": list(self.events), "displayTimeUnit": "ms"}
+
+    def dump(self, path: Path):
+        """Write the trace to a json file"""
+        with path.open("w", encoding="utf-8") as f:
+            json.dump(self.to_json(), f)
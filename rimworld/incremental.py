@@ -0,0 +1,666 @@
+""" Rebuilding a loaded world after some of its Def and Patch files change
+
+A `DependencyGraph` passed to `load_world` records which top-level defs
+every patch operation searched and changed. After some Def or Patch files
+change, `DependencyGraph.rebuild` only recomputes the defs the change can
+reach: they are merged again from their Def files, and the operations that
+may touch them are replayed in their original order, on a tree holding
+nothing but those defs. If the replay creates or renames defs that more
+operations may find, those are added and the replay starts over. The
+recomputed defs then replace their previous versions in the world.
+
+Which defs an operation may touch is decided from its xpaths, see
+`def_footprint`. If one of the operations to replay may touch any def, the
+whole world is rebuilt instead.
+"""
+
+import logging
+from bisect import bisect_left
+from copy import deepcopy
+from dataclasses import dataclass, field, replace
+from pathlib import Path
+from typing import Collection, Iterable, Sequence
+
+from lxml import etree
+
+from rimworld.error import DifferentRootsError, IncrementalRebuildError
+from rimworld.mod import Mod
+from rimworld.patch import Change, PatchContext, PatchOperation, get_operation
+from rimworld.patch.effect import Effect, operation_effect
+from rimworld.patch.operations.add import PatchOperationAdd
+from rimworld.patch.operations.insert import PatchOperationInsert
+from rimworld.patch.operations.replace import PatchOperationReplace
+from rimworld.patch.serializers import Order
+from rimworld.patch.specialize import specialize
+from rimworld.xml import DefFootprint, DefNameIndex, load_xml, merge, xml_to_string
+
+__all__ = ["DependencyGraph", "OperationRecord", "RebuildStats"]
+
+
+type Origin = tuple[Path, int, int]
+"""Identifies a top-level node across builds
+
+`(path, -1, i)` is the i-th node of a Def file, `(path, index, k)` is the
+k-th top-level node created by the operation at `index` in a Patch file.
+"""
+
+type Position = tuple[int, ...]
+"""Where a top-level node goes among the others
+
+Positions of the nodes of a world are in the same order as the nodes.
+Nodes merged from Def files are positioned by the file and their index in
+it; nodes created by operations are positioned relative to the node they
+were inserted next to, so positions stay valid when other nodes are
+recomputed.
+"""
+
+
+@dataclass
+class OperationRecord:
+    """Top-level defs a patch operation searched and changed"""
+
+    reads: set[Origin] = field(default_factory=set)
+    writes: set[Origin] = field(default_factory=set)
+
+
+@dataclass(frozen=True)
+class RebuildStats:
+    """What `DependencyGraph.rebuild` did
+
+    `reason` tells why the whole world was rebuilt, it is None if only
+    `defs` defs were recomputed by replaying `operations` operations.
+    """
+
+    defs: int
+    operations: int
+    reason: str | None = None
+
+
+class DependencyGraph:
+    """Dependencies between top-level defs and the patch operations applied to them
+
+    Def and Patch files are expected to keep their paths; adding or removing
+    files, or changing the modlist, requires a new `load_world`.
+
+    Example:
+        graph = DependencyGraph()
+        world = load_world(mod_folders, modsconfig_folder, dependencies=graph)
+        # ... edit a Patch file
+        world = graph.rebuild([patch_file])
+    """
+
+    # pylint: disable-next=too-many-instance-attributes
+    def __init__(self) -> None:
+        self.tree: etree._ElementTree | None = None
+        self.records: dict[tuple[Path, int], OperationRecord] = {}
+        self.last_rebuild: RebuildStats | None = None
+        self._context: PatchContext | None = None
+        self._mod_files: list[tuple[Mod, list[Path], list[Path]]] = []
+        self._operations: dict[Path, list[PatchOperation]] = {}
+        self._def_counts: dict[Path, int] = {}
+        self._origins: dict[etree._Element, Origin] = {}
+        self._keys: dict[Origin, set[tuple[str, ...]]] = {}
+        self._positions: dict[Origin, Position] = {}
+        self._numbers: dict[Path, int] = {}
+        self._current: tuple[Path, int] | None = None
+        self._created = 0
+        self._replaced: tuple[etree._Element, int, Position] | None = None
+        self._replacing: set[etree._Element] = set()
+
+    def start(self, mod_files: list[tuple[Mod, list[Path], list[Path]]]):
+        """Forget everything recorded, before loading a world from `mod_files`"""
+        self.__init__()  # pylint: disable=unnecessary-dunder-call
+        files = (p for _, defs, patches in mod_files for p in (*defs, *patches))
+        self._numbers = {path: number for number, path in enumerate(files)}
+
+    def merged(
+        self,
+        path: Path,
+        nodes: Sequence[etree._Element],
+        indices: Iterable[int] | None = None,
+    ):
+        """Record top-level nodes merged from a Def file, at `indices` in it"""
+        for i, node in zip(
+            indices if indices is not None else range(len(nodes)), nodes
+        ):
+            origin = (path, -1, i)
+            self._origins[node] = origin
+            self._keys[origin] = _keys(node)
+            self._positions[origin] = (self._numbers[path], i)
+        self._def_counts[path] = max(self._def_counts.get(path, 0), len(nodes))
+
+    def begin_operation(self, path: Path, index: int, operation: PatchOperation):
+        """Attribute following searches and changes to an operation of a Patch file"""
+        operations = self._operations.setdefault(path, [])
+        del operations[index:]
+        operations.append(operation)
+        self.records[(path, index)] = OperationRecord()
+        self._current = (path, index)
+        self._created = 0
+
+    def end_operation(self):
+        """Stop attributing searches and changes to an operation"""
+        self._current = None
+        self._replaced = None
+        self._replacing.clear()
+
+    def read(self, nodes: Iterable[etree._Element]):
+        """Record nodes found by a search"""
+        if self._current is None:
+            return
+        record = self.records[self._current]
+        for node in nodes:
+            if (origin := self._origin(node)) is not None:
+                record.reads.add(origin)
+
+    def record(self, operation: PatchOperation, change: Change, node: etree._Element):
+        """Record a change an operation made to a node"""
+        if self._current is None:
+            return
+        parent = node.getparent()
+        if (
+            change == Change.REPLACED
+            and parent is not None
+            and parent.getparent() is None
+            and (origin := self._origins.get(node)) is not None
+        ):
+            # the first replacing node takes the place of the replaced one
+            self._replaced = (parent, parent.index(node), self._positions[origin])
+        if (origin := self._origin(node, operation, create=True)) is not None:
+            self.records[self._current].writes.add(origin)
+
+    def changed(self, *nodes: etree._Element):
+        """Record nodes inserted or whose content was changed"""
+        if self._current is None:
+            return
+        record = self.records[self._current]
+        for node in nodes:
+            if (origin := self._origin(node, create=True)) is not None:
+                record.writes.add(origin)
+
+    def finish(
+        self,
+        tree: etree._ElementTree,
+        mod_files: list[tuple[Mod, list[Path], list[Path]]],
+        context: PatchContext,
+    ):
+        """Record the loaded world, and the files and context it was loaded with"""
+        root = tree.getroot()
+        self.tree = tree
+        self._mod_files = mod_files
+        self._context = replace(
+            context,
+            def_index=None,
+            profiler=None,
+            consume_values=False,
+            journal=None,
+            dependencies=None,
+        )
+        self._origins = {
+            n: o for n, o in self._origins.items() if n.getparent() is root
+        }
+        for node, origin in self._origins.items():
+            self._keys[origin] |= _keys(node)
+
+    def rebuild(
+        self, changed: Collection[Path], verify: bool = False
+    ) -> etree._ElementTree:
+        """Bring the world up to date with changed Def and Patch files
+
+        Files that are not part of the world are ignored. Statistics of the
+        rebuild are kept in `last_rebuild`.
+
+        Args:
+            changed: Def and Patch files changed since the world was loaded
+                or last rebuilt
+            verify: Rebuild the whole world as well, and compare the results
+
+        Raises:
+            IncrementalRebuildError: If `verify` is set and the results differ
+        """
+        if self.tree is None or self._context is None:
+            raise ValueError("Nothing was recorded, pass the graph to load_world")
+        def_files = {p for _, paths, _ in self._mod_files for p in paths}
+        patch_files = {p for _, _, paths in self._mod_files for p in paths}
+        documents = {p: load_xml(p) for p in changed if p in def_files}
+        operations = {
+            p: _deserialize_patch(p, self._context) for p in changed if p in patch_files
+        }
+        cone = _Cone(self, documents, operations)
+        while cone.reason is None:
+            replayed, nodes = self._replay(cone, documents, operations)
+            # defs created or renamed by the replay may be found by more
+            # operations, replay again until the cone stops growing
+            if cone.learn(replayed._keys) or cone.reason is not None:
+                continue
+            counts = {p: len(d.getroot()) for p, d in documents.items()}
+            self._splice(cone, replayed, nodes)
+            self._update(cone, replayed, counts, operations)
+            self.last_rebuild = RebuildStats(len(nodes), len(cone.affected))
+            break
+        else:
+            self._build()
+            self.last_rebuild = RebuildStats(
+                len(self.tree.getroot()), len(self.records), cone.reason
+            )
+        logging.getLogger(__name__).info("%s", self.last_rebuild)
+        if verify:
+            self._verify()
+        return self.tree
+
+    def _origin(
+        self,
+        node: etree._Element,
+        operation: PatchOperation | None = None,
+        create: bool = False,
+    ) -> Origin | None:
+        """Origin of the top-level node containing `node`
+
+        If `create` is set, a top-level node without one is recorded as
+        created by `operation`, the current operation.
+        """
+        parent = node.getparent()
+        if parent is None:
+            return None
+        while (grandparent := parent.getparent()) is not None:
+            node, parent = parent, grandparent
+        if node in self._origins or not create or self._current is None:
+            return self._origins.get(node)
+        if self._replaced is not None:
+            root, index, position = self._replaced
+            self._replaced = None
+            if index < len(root) and root[index] not in self._origins:
+                self._create(root[index], position)
+                self._replacing.add(root[index])
+        if node not in self._origins:
+            self._create(node, self._position(node, operation))
+        return self._origins[node]
+
+    def _create(self, node: etree._Element, position: Position):
+        """Record a top-level node as created by the current operation"""
+        assert self._current is not None
+        origin = (*self._current, self._created)
+        self._created += 1
+        self._origins[node] = origin
+        self._keys[origin] = _keys(node)
+        self._positions[origin] = position
+
+    def _position(
+        self, node: etree._Element, operation: PatchOperation | None
+    ) -> Position:
+        """Position of a top-level node created by an operation
+
+        Nodes inserted next to a node are positioned right after or before
+        it, the later the operation the closer. Nodes added to the root are
+        positioned after the nodes of the file or before everything.
+        """
+        assert self._current is not None
+        path, index = self._current
+        stamp = (self._numbers[path], index, self._created)
+        prepend = getattr(operation, "order", None) == Order.PREPEND
+        if isinstance(operation, PatchOperationInsert) and prepend:
+            if (anchor := self._anchor(node.itersiblings())) is not None:
+                return (*anchor[:-1], anchor[-1] - 1, _LAST, *stamp)
+        elif isinstance(operation, PatchOperationAdd) and prepend:
+            return (-1, -stamp[0], -stamp[1], -stamp[2])
+        elif isinstance(operation, PatchOperationInsert | PatchOperationReplace | None):
+            if (anchor := self._anchor(node.itersiblings(preceding=True))) is not None:
+                return (*anchor, -stamp[0], -stamp[1], stamp[2])
+        return stamp
+
+    def _anchor(self, siblings: Iterable[etree._Element]) -> Position | None:
+        """Position of the first sibling not inserted by the current operation"""
+        for sibling in siblings:
+            origin = self._origins.get(sibling)
+            if origin is None:
+                continue
+            if origin[:2] != self._current or sibling in self._replacing:
+                return self._positions[origin]
+        return None
+
+    def _build(self):
+        """Load the whole world again from its files"""
+        mod_files, context = self._mod_files, self._context
+        assert context is not None
+        self.start(mod_files)
+        tree = etree.ElementTree(etree.Element("Defs"))
+        root = tree.getroot()
+        context = replace(context, def_index=DefNameIndex(root), dependencies=self)
+        for _, def_files, patch_files in mod_files:
+            for path in def_files:
+                added = merge(tree, load_xml(path))
+                nodes = root[len(root) - added :]
+                self.merged(path, nodes)
+                context.notify_changed(*nodes)
+            for path in patch_files:
+                for index, operation in enumerate(_deserialize_patch(path, context)):
+                    self.begin_operation(path, index, operation)
+                    operation(tree, context)
+                    self.end_operation()
+        self.finish(tree, mod_files, context)
+
+    def _replay(
+        self,
+        cone: "_Cone",
+        documents: dict[Path, etree._ElementTree],
+        operations: dict[Path, list[PatchOperation]],
+    ) -> tuple["DependencyGraph", list[etree._Element]]:
+        """Recompute defs in the cone on a tree of their own
+
+        Returns what was recorded while replaying, and the recomputed defs.
+        """
+        assert self._context is not None
+        partial = etree.ElementTree(etree.Element("Defs"))
+        replayed = DependencyGraph()
+        replayed.start(self._mod_files)
+        context = replace(
+            self._context,
+            def_index=DefNameIndex(partial.getroot()),
+            dependencies=replayed,
+        )
+        for _, def_files, patch_files in self._mod_files:
+            for path in def_files:
+                self._replay_defs(cone, path, documents, partial, context)
+            for path in patch_files:
+                for index, operation in enumerate(
+                    operations.get(path, self._operations.get(path, []))
+                ):
+                    if (path, index) in cone.affected:
+                        replayed.begin_operation(path, index, operation)
+                        operation(partial, context)
+                        replayed.end_operation()
+        replayed.finish(partial, [], context)
+        return replayed, list(partial.getroot())
+
+    def _update(
+        self,
+        cone: "_Cone",
+        replayed: "DependencyGraph",
+        counts: dict[Path, int],
+        operations: dict[Path, list[PatchOperation]],
+    ):
+        """Take over what was recorded while replaying operations"""
+        for path, ops in operations.items():
+            for index in range(len(self._operations.get(path, []))):
+                self.records.pop((path, index), None)
+            self._operations[path] = ops
+        for key in cone.affected:
+            record = replayed.records.get(key, OperationRecord())
+            if (previous := self.records.get(key)) is not None:
+                record.reads |= {o for o in previous.reads if not cone.contains(o)}
+                record.writes |= {o for o in previous.writes if not cone.contains(o)}
+            self.records[key] = record
+        self._def_counts.update(counts)
+        self._keys = {
+            o: keys for o, keys in self._keys.items() if not cone.contains(o)
+        } | replayed._keys
+        self._positions = {
+            o: p for o, p in self._positions.items() if not cone.contains(o)
+        } | replayed._positions
+
+    # pylint: disable-next=too-many-arguments,too-many-positional-arguments
+    def _replay_defs(
+        self,
+        cone: "_Cone",
+        path: Path,
+        documents: dict[Path, etree._ElementTree],
+        partial: etree._ElementTree,
+        context: PatchContext,
+    ):
+        """Merge the defs of a Def file which are in the cone"""
+        assert context.dependencies is not None
+        count = (
+            len(documents[path].getroot())
+            if path in documents
+            else self._def_counts.get(path, 0)
+        )
+        wanted = [i for i in range(count) if cone.contains((path, -1, i))]
+        if not wanted:
+            return
+        document = documents[path] if path in documents else load_xml(path)
+        if document.getroot().tag != "Defs":
+            raise DifferentRootsError(f"Defs != {document.getroot().tag}")
+        children = list(document.getroot())
+        # copies, as the cone may be replayed again from the same documents
+        nodes = [deepcopy(children[i]) for i in wanted]
+        partial.getroot().extend(nodes)
+        context.dependencies.merged(path, nodes, wanted)
+        context.notify_changed(*nodes)
+
+    def _splice(
+        self,
+        cone: "_Cone",
+        replayed: "DependencyGraph",
+        nodes: list[etree._Element],
+    ):
+        """Replace defs in the cone with their recomputed versions"""
+        assert self.tree is not None
+        root = self.tree.getroot()
+        for node, origin in list(self._origins.items()):
+            if cone.contains(origin):
+                root.remove(node)
+                del self._origins[node]
+        kept = list(root)
+        positions = [self._positions[self._origins[node]] for node in kept]
+        for node in nodes:
+            origin = replayed._origins[node]
+            i = bisect_left(positions, replayed._positions[origin])
+            if i < len(kept):
+                kept[i].addprevious(node)
+            else:
+                root.append(node)
+            self._origins[node] = origin
+
+    def _verify(self):
+        assert self.tree is not None
+        expected = DependencyGraph()
+        expected._mod_files = self._mod_files
+        expected._context = self._context
+        expected._build()
+        assert expected.tree is not None
+        actual_lines = xml_to_string(self.tree).splitlines()
+        expected_lines = xml_to_string(expected.tree).splitlines()
+        if actual_lines == expected_lines:
+            return
+        line = next(
+            (i for i, (a, e) in enumerate(zip(actual_lines, expected_lines)) if a != e),
+            min(len(actual_lines), len(expected_lines)),
+        )
+        raise IncrementalRebuildError(
+            f"Rebuilt world differs from a full rebuild at line {line + 1}: "
+            f"{_line(actual_lines, line)!r} != {_line(expected_lines, line)!r}"
+        )
+
+
+# pylint: disable-next=too-many-instance-attributes,too-few-public-methods
+class _Cone:
+    """Defs which have to be recomputed after some files change, and the
+    operations to replay to do so
+
+    A def is in the cone if its Def file changed, or it was changed by an
+    operation of a changed Patch file, or by an operation that can behave
+    differently because of another def in the cone. Operations are replayed
+    if they may touch a def in the cone.
+    """
+
+    def __init__(
+        self,
+        graph: DependencyGraph,
+        documents: dict[Path, etree._ElementTree],
+        operations: dict[Path, list[PatchOperation]],
+    ) -> None:
+        self.graph = graph
+        self.defs: set[Origin] = set()
+        self.prefixes: set[tuple[Path, int]] = set()
+        self.affected: set[tuple[Path, int]] = set()
+        self.dirty: set[tuple[Path, int]] = set()
+        self.reason: str | None = None
+        self._born: dict[tuple[Path, int], int] = {}
+        self._key_born: dict[tuple[str, ...], float] = {}
+        self._by_key: dict[tuple[str, ...], set[Origin]] = {}
+        self._by_prefix: dict[tuple[Path, int], set[Origin]] = {}
+        self._min_born = _NEVER
+        self._entries: list[tuple[Path, int, int, Effect]] = []
+
+        for path, document in documents.items():
+            for i, node in enumerate(document.getroot()):
+                graph._keys.setdefault((path, -1, i), set()).update(_keys(node))
+        for origin, keys in graph._keys.items():
+            self._by_prefix.setdefault(origin[:2], set()).add(origin)
+            for key in keys:
+                self._by_key.setdefault(key, set()).add(origin)
+        self._index(operations)
+        for path in documents:
+            self._add_prefix((path, -1))
+        for path, ops in operations.items():
+            for index in range(len(graph._operations.get(path, []))):
+                if (record := graph.records.get((path, index))) is not None:
+                    self._add(record.writes)
+                self._add_prefix((path, index))
+            for index in range(len(ops)):
+                self._add_prefix((path, index))
+                self.dirty.add((path, index))
+        self._grow()
+
+    def learn(self, keys: dict[Origin, set[tuple[str, ...]]]) -> bool:
+        """Take the keys top-level nodes have after replaying the cone, and
+        return True if the cone grew because of keys it did not know about"""
+        size = (len(self.defs), len(self.prefixes), len(self.affected))
+        for origin, new in keys.items():
+            known = self.graph._keys.setdefault(origin, set())
+            if new <= known:
+                continue
+            new = new - known
+            known |= new
+            self._by_prefix.setdefault(origin[:2], set()).add(origin)
+            for key in new:
+                self._by_key.setdefault(key, set()).add(origin)
+            if self.contains(origin):
+                born = self._born.get(origin[:2], _NEVER)
+                self._min_born = min(self._min_born, born)
+                for key in new:
+                    self._key_born[key] = min(self._key_born.get(key, _NEVER), born)
+        self._grow()
+        return size != (len(self.defs), len(self.prefixes), len(self.affected))
+
+    def contains(self, origin: Origin) -> bool:
+        """Check if a top-level node is in the cone"""
+        return origin in self.defs or origin[:2] in self.prefixes
+
+    def _index(self, operations: dict[Path, list[PatchOperation]]):
+        """Number operations and Def files in the order they are applied"""
+        position = 0
+        for _, def_files, patch_files in self.graph._mod_files:
+            for path in def_files:
+                self._born[(path, -1)] = position
+            for path in patch_files:
+                ops = operations.get(path, self.graph._operations.get(path, []))
+                for index, operation in enumerate(ops):
+                    position += 1
+                    self._born[(path, index)] = position
+                    if (effect := operation_effect(operation)) is not None:
+                        self._entries.append((path, index, position, effect))
+
+    def _grow(self):
+        """Add defs reachable from the cone until there are none left"""
+        size = -1
+        while size != len(self.defs) + len(self.prefixes):
+            size = len(self.defs) + len(self.prefixes)
+            for path, index, position, effect in self._entries:
+                key = (path, index)
+                if not self._touches(key, position, effect):
+                    continue
+                if any(f.kind == "any" for f in effect.footprints):
+                    self.reason = f"operation {index} of {path} may change any def"
+                    return
+                self.affected.add(key)
+                if key in self.dirty or effect.compound or effect.structural:
+                    self._pull(key, position, effect)
+
+    def _touches(self, key: tuple[Path, int], position: int, effect: Effect) -> bool:
+        if key in self.dirty or key in self.prefixes:
+            return True
+        record = self.graph.records.get(key)
+        if record is not None and any(
+            self.contains(o) for o in (*record.reads, *record.writes)
+        ):
+            return True
+        for footprint in effect.footprints:
+            if footprint.kind == "any" and self._min_born < position:
+                return True
+            if footprint.kind == "defs" and any(
+                self._key_born.get(k, _NEVER) < position
+                for k in _footprint_keys(footprint)
+            ):
+                return True
+        return False
+
+    def _pull(self, key: tuple[Path, int], position: int, effect: Effect):
+        """Add every def an operation may touch to the cone"""
+        if key not in self.dirty and (record := self.graph.records.get(key)):
+            self._add(record.reads | record.writes)
+        for footprint in effect.footprints:
+            if footprint.kind == "root":
+                self._add_prefix(key)
+            elif footprint.kind == "defs":
+                self._add(
+                    o
+                    for k in _footprint_keys(footprint)
+                    for o in self._by_key.get(k, ())
+                    if self._born.get(o[:2], _NEVER) < position
+                )
+        if effect.structural:
+            self._add_prefix(key)
+
+    def _add(self, origins: Iterable[Origin]):
+        for origin in origins:
+            if origin in self.defs:
+                continue
+            self.defs.add(origin)
+            born = self._born.get(origin[:2], _NEVER)
+            self._min_born = min(self._min_born, born)
+            for k in self.graph._keys.get(origin, ()):
+                self._key_born[k] = min(self._key_born.get(k, _NEVER), born)
+
+    def _add_prefix(self, prefix: tuple[Path, int]):
+        if prefix in self.prefixes:
+            return
+        self.prefixes.add(prefix)
+        self._min_born = min(self._min_born, self._born.get(prefix, _NEVER))
+        self._add(self._by_prefix.get(prefix, ()))
+
+
+_NEVER = float("inf")
+_LAST = 1 << 62
+
+
+def _footprint_keys(footprint: DefFootprint) -> list[tuple[str, ...]]:
+    tag = footprint.tag or "*"
+    if not footprint.keys:
+        return [(tag,)]
+    return [(tag, kind, value) for kind, value in footprint.keys]
+
+
+def _keys(node: etree._Element) -> set[tuple[str, ...]]:
+    """Keys a def can be matched by footprints with"""
+    if not isinstance(node.tag, str):
+        return set()
+    keys: set[tuple[str, ...]] = {(node.tag,), ("*",)}
+    values = [("Name", node.get("Name"))] + [
+        ("defName", "".join(c.itertext())) for c in node.iterchildren("defName")
+    ]
+    for kind, value in values:
+        if value is not None:
+            keys.update({(node.tag, kind, value), ("*", kind, value)})
+    return keys
+
+
+def _deserialize_patch(path: Path, context: PatchContext) -> list[PatchOperation]:
+    return [
+        specialize(get_operation(node), context)
+        for node in load_xml(path).getroot().findall("Operation")
+    ]
+
+
+def _line(lines: list[str], i: int) -> str:
+    return lines[i] if i < len(lines) else ""
@@ -0,0 +1,191 @@
+""" Resolving def inheritance the way RimWorld does
+
+Defs name a parent with `ParentName`, which refers to the `Name` of
+another def. A resolved def is a copy of its resolved parent, overwritten
+with the def itself:
+
+- attributes of the def replace those of the parent
+- an element with text replaces the content of the parent's element
+- `li` elements are appended to the parent's list
+- other elements overwrite the first element of the parent with the same
+  tag, or are appended if there is none
+- an element with `Inherit="False"` replaces the content of the parent's
+  element
+
+>>> tree = etree.ElementTree(etree.fromstring('''
+... <Defs>
+...     <ThingDef Name="BaseThing" Abstract="True">
+...         <mass>1</mass><tags><li>A</li></tags>
+...     </ThingDef>
+...     <ThingDef ParentName="BaseThing">
+...         <defName>Steel</defName><tags><li>B</li></tags>
+...     </ThingDef>
+... </Defs>
+... ''', etree.XMLParser(remove_blank_text=True)))
+>>> resolved = resolve_inheritance(tree)
+>>> steel = resolved.getroot()[0]
+>>> steel.findtext("mass"), [li.text for li in steel.iterfind("tags/li")]
+('1', ['A', 'B'])
+"""
+
+import logging
+from copy import deepcopy
+from typing import Iterator
+
+from lxml import etree
+
+from rimworld.memory import DefOrigins
+
+__all__ = ["InheritanceResolver", "resolve_inheritance"]
+
+
+class InheritanceResolver:
+    """Resolves inheritance of the defs of a world
+
+    Every def is resolved at most once; resolved defs, including the
+    parents resolved on the way, are kept and reused. They are copies, the
+    world itself is left untouched. Resolved defs are shared between
+    callers, copy them before making changes.
+
+    If several defs have the same `Name`, RimWorld prefers a parent added
+    by the same mod as the child, then the one loaded first. Given the
+    `DefOrigins` recorded while loading the world, so does the resolver.
+    Without them, the last def with the `Name` is the parent, which may
+    differ from the game. Defs whose parent is missing, or which inherit
+    from themselves, are resolved as if they had no parent.
+
+    Example:
+        resolver = InheritanceResolver(world)
+        # resolve defs as they are needed
+        steel = resolver.resolve(world.find("ThingDef[defName='Steel']"))
+        # or all of them at once
+        resolved = resolver.resolve_all()
+    """
+
+    def __init__(
+        self, tree: etree._ElementTree, origins: DefOrigins | None = None
+    ) -> None:
+        self.tree = tree
+        self.origins = origins
+        self._named: dict[str, list[etree._Element]] = {}
+        for node in self._defs():
+            if (name := node.get("Name")) is not None:
+                self._named.setdefault(name, []).append(node)
+        self._resolved: dict[etree._Element, etree._Element] = {}
+        self._orphans: set[etree._Element] = set()
+
+    def parent(self, node: etree._Element) -> etree._Element | None:
+        """Def a def inherits from, if there is one"""
+        if node in self._orphans or (name := node.get("ParentName")) is None:
+            return None
+        if (parent := self._choose(node, self._named.get(name, []))) is None:
+            logging.getLogger(__name__).warning(
+                "Parent %s of %s not found", name, _describe(node)
+            )
+            self._orphans.add(node)
+        return parent
+
+    def resolve(self, node: etree._Element) -> etree._Element:
+        """Resolve a top-level def of the world"""
+        if (resolved := self._resolved.get(node)) is not None:
+            return resolved
+        chain = [node]
+        while (parent := self.parent(chain[-1])) is not None:
+            if parent in self._resolved:
+                break
+            if parent in chain:
+                logging.getLogger(__name__).warning(
+                    "Cyclic inheritance of %s", _describe(chain[-1])
+                )
+                self._orphans.add(chain[-1])
+                break
+            chain.append(parent)
+        for current in reversed(chain):
+            parent = self.parent(current)
+            if parent is None:
+                resolved = _copy(current)
+            else:
+                resolved = _copy(self._resolved[parent])
+                _overwrite(current, resolved)
+            self._resolved[current] = resolved
+        return self._resolved[node]
+
+    def resolve_all(self) -> etree._ElementTree:
+        """Resolve every def, and collect the ones that are not abstract"""
+        root = etree.Element(self.tree.getroot().tag)
+        for node in self._defs():
+            resolved = self.resolve(node)
+            if not _is_abstract(resolved):
+                root.append(resolved)
+        return etree.ElementTree(root)
+
+    def _choose(
+        self, node: etree._Element, candidates: list[etree._Element]
+    ) -> etree._Element | None:
+        """Pick the parent of a def among the defs with its `ParentName`"""
+        if not candidates:
+            return None
+        if self.origins is None:
+            return candidates[-1]
+        mod = self.origins.mod_of(node)
+        return next(
+            (c for c in candidates if self.origins.mod_of(c) == mod), candidates[0]
+        )
+
+    def _defs(self) -> Iterator[etree._Element]:
+        return (n for n in self.tree.getroot() if isinstance(n.tag, str))
+
+
+def resolve_inheritance(
+    tree: etree._ElementTree, origins: DefOrigins | None = None
+) -> etree._ElementTree:
+    """Resolve inheritance of every def of a world, dropping abstract defs
+
+    See `InheritanceResolver` for what `origins` are used for.
+    """
+    return InheritanceResolver(tree, origins).resolve_all()
+
+
+def _overwrite(child: etree._Element, current: etree._Element):
+    """Overwrite a copy of the parent's element with the child's element"""
+    if child.get("Inherit", "").lower() == "false":
+        _clear(current)
+        current.text = child.text
+        current.extend(deepcopy(n) for n in child)
+        return
+
+    current.attrib.clear()
+    current.attrib.update(child.attrib)
+
+    if child.text is not None and child.text.strip():
+        _clear(current)
+        current.text = child.text
+        return
+
+    for node in child:
+        if not isinstance(node.tag, str):
+            continue
+        if node.tag != "li" and (existing := current.find(node.tag)) is not None:
+            _overwrite(node, existing)
+        else:
+            current.append(_copy(node))
+
+
+def _clear(node: etree._Element):
+    for n in list(node):
+        node.remove(n)
+
+
+def _copy(node: etree._Element) -> etree._Element:
+    result = deepcopy(node)
+    result.tail = None
+    return result
+
+
+def _is_abstract(node: etree._Element) -> bool:
+    return node.get("Abstract", "").lower() == "true"
+
+
+def _describe(node: etree._Element) -> str:
+    name = node.findtext("defName") or node.get("Name")
+    return f"{node.tag} {name}" if name else str(node.tag)
@@ -0,0 +1,150 @@
+""" Approximate memory used by a loaded world, by def type and by mod
+
+Sizes are estimated from the structures libxml2 allocates for every node,
+attribute and piece of text, so they are close to, but not exactly, what the
+process uses. Tag and attribute names are shared by a document and are not
+counted.
+
+>>> world = etree.ElementTree(etree.fromstring(
+...     "<Defs><ThingDef><defName>Steel</defName></ThingDef><StatDef /></Defs>"
+... ))
+>>> report = memory_report(world)
+>>> report.by_type["ThingDef"].nodes, report.total.nodes
+(2, 4)
+
+Pass `DefOrigins` to `load_world` to know which mod added every def, and
+attribute memory to mods as well:
+
+    origins = DefOrigins()
+    world = load_world(mod_folders, modsconfig, def_origins=origins)
+    print(memory_report(world, origins).report())
+"""
+
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Any
+
+from lxml import etree
+
+__all__ = ["DefOrigins", "MemoryReport", "Usage", "memory_report"]
+
+# sizes of libxml2 structures on 64-bit platforms, in bytes
+NODE_SIZE = 120
+ATTRIBUTE_SIZE = 96
+
+
+class DefOrigins:
+    """Which mod added every top-level def of a world
+
+    A def belongs to the mod whose Def file merged it, or whose patch
+    operation inserted it. Defs of a resumed snapshot or a cached world
+    belong to no mod.
+    """
+
+    def __init__(self) -> None:
+        self._mods: dict[etree._Element, str | None] = {}
+
+    def claim(self, root: etree._Element, mod: str | None):
+        """Attribute top-level defs that have no mod yet to `mod`"""
+        for node in root:
+            self._mods.setdefault(node, mod)
+
+    def mod_of(self, node: etree._Element) -> str | None:
+        """Mod that added a top-level def"""
+        return self._mods.get(node)
+
+    def clear(self):
+        """Forget every def"""
+        self._mods.clear()
+
+
+@dataclass
+class Usage:
+    """Number of nodes and their approximate size in bytes"""
+
+    nodes: int = 0
+    bytes: int = 0
+
+    def add(self, other: "Usage"):
+        """Accumulate another usage into this one"""
+        self.nodes += other.nodes
+        self.bytes += other.bytes
+
+
+@dataclass
+class MemoryReport:
+    """Memory used by the defs of a world, by def type and by mod"""
+
+    total: Usage = field(default_factory=Usage)
+    by_type: dict[str, Usage] = field(default_factory=lambda: defaultdict(Usage))
+    by_mod: dict[str | None, Usage] = field(default_factory=lambda: defaultdict(Usage))
+
+    def report(self, top: int = 20) -> str:
+        """A human readable report of the largest def types and mods"""
+        lines = [
+            f"Total: {self.total.nodes} nodes, {self.total.bytes / 2**20:.1f} MB",
+            f"Largest def types (top {top}):",
+        ]
+        for name, usage in _largest(self.by_type, top):
+            lines.append(f"  {usage.bytes / 2**20:10.2f} MB {usage.nodes:>10} {name}")
+        lines.append(f"Largest mods (top {top}):")
+        for mod, usage in _largest(self.by_mod, top):
+            lines.append(f"  {usage.bytes / 2**20:10.2f} MB {usage.nodes:>10} {mod}")
+        return "\n".join(lines)
+
+    def to_json(self) -> dict[str, Any]:
+        """Machine-readable form of the report"""
+        return {
+            "total": vars(self.total),
+            "types": {name: vars(usage) for name, usage in self.by_type.items()},
+            "mods": {str(mod): vars(usage) for mod, usage in self.by_mod.items()},
+        }
+
+
+def memory_report(
+    tree: etree._ElementTree, origins: DefOrigins | None = None
+) -> MemoryReport:
+    """Attribute the nodes of a world to def types, and to mods if `origins` is given
+
+    Nodes are elements, comments and processing instructions; their size
+    includes their text, tail and attributes. The root itself only counts
+    towards the total. Top-level comments are counted as their own type.
+    """
+    result = MemoryReport()
+    root = tree.getroot()
+    result.total.add(_usage(root, recursive=False))
+    for node in root:
+        usage = _usage(node)
+        result.total.add(usage)
+        result.by_type[_def_type(node)].add(usage)
+        result.by_mod[origins.mod_of(node) if origins is not None else None].add(usage)
+    return result
+
+
+def _usage(node: etree._Element, recursive: bool = True) -> Usage:
+    nodes = 0
+    size = 0
+    for n in node.iter() if recursive else (node,):
+        nodes += 1
+        size += NODE_SIZE
+        if n.text is not None:
+            size += NODE_SIZE + len(n.text) + 1
+        if n.tail is not None:
+            size += NODE_SIZE + len(n.tail) + 1
+        for value in n.attrib.values() if isinstance(n.tag, str) else ():
+            size += ATTRIBUTE_SIZE + NODE_SIZE + len(value) + 1
+    return Usage(nodes, size)
+
+
+def _def_type(node: etree._Element) -> str:
+    if isinstance(node.tag, str):
+        return node.tag
+    if isinstance(node, etree._Comment):
+        return "<!-- -->"
+    if isinstance(node, etree._ProcessingInstruction):
+        return "<? ?>"
+    return str(node.tag)
+
+
+def _largest[K](usages: dict[K, Usage], top: int) -> list[tuple[K, Usage]]:
+    return sorted(usages.items(), key=lambda i: -i[1].bytes)[:top]
@@ -2,13 +2,23 @@
 Module for modeling RimWorld's mod metadata formats.
 """
 
+# pylint: disable=too-many-lines
+
 import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass, field
+from functools import cached_property, partial
 from pathlib import Path
-from typing import Collection, Iterable, Iterator, Self, Sequence, cast
+from typing import (Any, Callable, Collection, Iterable, Iterator, Self,
+                    Sequence, cast)
 
 from lxml import etree
 
+from .cache import (FileFingerprint, library_version, read_cache_file,
+                    write_cache_file)
+from .events import EventKind, Instrumentation
 from .gameversion import GameVersion
 from .xml import (XMLSerializable, deserialize_from_list,
                   deserialize_strings_from_list, element_text_or_none,
@@ -21,8 +31,12 @@ __all__ = [
     "ModAbout",
     "ModsConfig",
     "LoadFolders",
+    "LoadFolderFiles",
+    "ModManifest",
+    "ModCatalog",
     "NotAModFolderError",
     "is_mod_folder",
+    "find_mod_folders",
     "load_mods",
     "select_mods",
 ]
@@ -611,6 +625,79 @@ class LoadFolders:
         return result
 
 
+class ModCatalog:
+    """On-disk cache of parsed About.xml and LoadFolders.xml files
+
+    Entries are keyed by file path and invalidated when the file's modification
+    time or size changes, so a warm `load_mods` only has to stat the files and
+    re-parse the ones that changed. Only the entries looked up since the
+    catalog was opened are saved, so files no longer scanned are dropped.
+
+    Example:
+        catalog = ModCatalog(Path("mods.cache"))
+        mods = list(load_mods(mods_folder, catalog=catalog))
+        catalog.save()
+    """
+
+    # bump when the pickled classes change
+    FORMAT_VERSION = 1
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._entries: dict[str, tuple[FileFingerprint, Any]] = (
+            read_cache_file(path, self._cache_key()) or {}
+        )
+        self._seen: set[str] = set()
+
+    def about(self, path: Path) -> ModAbout | None:
+        """Return parsed About.xml, or None if the file does not exist"""
+        return self._get(path, ModAbout.load)
+
+    def loadfolders(self, path: Path) -> LoadFolders | None:
+        """Return parsed LoadFolders.xml, or None if the file does not exist"""
+        return self._get(path, LoadFolders.load)
+
+    def save(self):
+        """Write entries looked up since the catalog was opened to disk"""
+        with self._lock:
+            if not self._dirty and self._seen == self._entries.keys():
+                return
+            self._entries = {k: v for k, v in self._entries.items() if k in self._seen}
+            write_cache_file(self.path, self._cache_key(), self._entries)
+            self._dirty = False
+
+    def _get[T](self, path: Path, loader: Callable[[Path], T]) -> T | None:
+        key = str(path)
+        with self._lock:
+            self._seen.add(key)
+        fingerprint = FileFingerprint.of(path)
+        if fingerprint is None:
+            with self._lock:
+                if self._entries.pop(key, None) is not None:
+                    self._dirty = True
+            return None
+
+        cached = self._entries.get(key)
+        if cached is not None and cached[0] == fingerprint:
+            with self._lock:
+                self.hits += 1
+            return cached[1]
+
+        value = loader(path)
+        with self._lock:
+            self.misses += 1
+            self._entries[key] = (fingerprint, value)
+            self._dirty = True
+        return value
+
+    def _cache_key(self) -> tuple:
+        return ("ModCatalog", self.FORMAT_VERSION, library_version())
+
+
 @dataclass(frozen=True)
 class Mod:
     """
@@ -628,40 +715,74 @@ class Mod:
         return self.about.package_id.lower()
 
     @classmethod
-    def load(cls, path: Path) -> Self:
-        """Load a mod from the given path"""
+    def load(
+        cls,
+        path: Path,
+        catalog: ModCatalog | None = None,
+        events: Instrumentation | None = None,
+    ) -> Self:
+        """Load a mod from the given path
+
+        If `catalog` is given, About.xml and LoadFolders.xml are only parsed
+        if they are not in the catalog or changed since they were cached.
+
+        If `events` is given, reading About.xml and the whole mod is reported.
+        """
         logging.getLogger(__name__).info("Loading mod at %s", path)
+        start = events.start() if events is not None else 0.0
 
         about_path = path.joinpath("About", "About.xml")
-        if not about_path.exists():
+        loadfolders_path = path.joinpath("LoadFolders.xml")
+
+        if catalog is not None:
+            about = catalog.about(about_path)
+        elif about_path.exists():
+            about = ModAbout.load(about_path)
+        else:
+            about = None
+        if about is None:
             raise NotAModFolderError(path)
-        about = ModAbout.load(about_path)
+        if events is not None:
+            size = about_path.stat().st_size
+            events.emit(EventKind.ABOUT_PARSED, start, path=about_path, size=size)
 
-        loadfolders_path = path.joinpath("LoadFolders.xml")
-        loadfolders = None
-        if loadfolders_path.exists():
+        if catalog is not None:
+            loadfolders = catalog.loadfolders(loadfolders_path)
+        elif loadfolders_path.exists():
             loadfolders = LoadFolders.load(loadfolders_path)
+        else:
+            loadfolders = None
 
-        return cls(path, about=about, loadfolders=loadfolders)
+        mod = cls(path, about=about, loadfolders=loadfolders)
+        if events is not None:
+            events.emit(EventKind.MOD_DISCOVERED, start, path=path, mod=mod.package_id)
+        return mod
+
+    @cached_property
+    def manifest(self) -> "ModManifest":
+        """XML files of this mod's load folders, scanned once and memoized"""
+        return ModManifest(self.path)
 
     def mod_folders(self, mods_config: "ModsConfig") -> Iterator[AbsoluteModFolder]:
         """Return a list of mod folders based on the game version and loaded mods"""
+        for folder in self._compatible_folders(mods_config):
+            yield folder.with_root(self.path)
 
+    def _compatible_folders(
+        self, mods_config: "ModsConfig"
+    ) -> Iterator[RelativeModFolder]:
         if self.loadfolders is not None:
-            yield from (
-                f.with_root(self.path)
-                for f in self.loadfolders.compatible_folders(
-                    mods_config.version, mods_config.active_mods
-                )
+            yield from self.loadfolders.compatible_folders(
+                mods_config.version, mods_config.active_mods
             )
         else:
-            yield RelativeModFolder().with_root(self.path)
-            yield RelativeModFolder("Common").with_root(self.path)
+            yield RelativeModFolder()
+            yield RelativeModFolder("Common")
             matching_version = mods_config.version.get_matching_version(
                 self.about.supported_versions or []
             )
             if matching_version is not None:
-                yield RelativeModFolder(str(matching_version)).with_root(self.path)
+                yield RelativeModFolder(str(matching_version))
 
     def _default_folders(self) -> Iterator[RelativeModFolder]:
         """Return default mod folders for this mod"""
@@ -672,13 +793,96 @@ class Mod:
 
     def def_files(self, mods_config: "ModsConfig") -> Iterator[Path]:
         """Iterate through absolute paths to all .xml files in Defs"""
-        for mod_folder in self.mod_folders(mods_config):
-            yield from mod_folder.def_files()
+        for folder in self._compatible_folders(mods_config):
+            yield from self.manifest.files(folder).def_files
 
     def patch_files(self, mods_config: "ModsConfig") -> Iterator[Path]:
         """Iterate through absolute paths to all .xml files in Patches"""
-        for mod_folder in self.mod_folders(mods_config):
-            yield from mod_folder.patch_files()
+        for folder in self._compatible_folders(mods_config):
+            yield from self.manifest.files(folder).patch_files
+
+    def language_files(self, mods_config: "ModsConfig") -> Iterator[Path]:
+        """Iterate through absolute paths to all .xml files in Languages"""
+        for folder in self._compatible_folders(mods_config):
+            yield from self.manifest.files(folder).language_files
+
+
+@dataclass(frozen=True)
+class LoadFolderFiles:
+    """XML files found in a single load folder"""
+
+    def_files: tuple[Path, ...] = ()
+    patch_files: tuple[Path, ...] = ()
+    language_files: tuple[Path, ...] = ()
+
+
+# pylint: disable-next=too-few-public-methods
+class ModManifest:
+    """XML files of a mod, grouped by load folder
+
+    Each load folder is scanned on first use, in a single `os.scandir` pass over
+    its Defs, Patches and Languages trees. Asset trees like Textures, Sounds or
+    Assemblies are never entered. Files are listed in the same order as
+    `find_xmls` would list them.
+    """
+
+    def __init__(self, root: Path) -> None:
+        self.root = root
+        self._folders: dict[Path, LoadFolderFiles] = {}
+
+    def files(self, folder: Path) -> LoadFolderFiles:
+        """Return files of a load folder, relative to the mod's root"""
+        if (result := self._folders.get(folder)) is None:
+            result = self._scan(self.root.joinpath(folder))
+            self._folders[folder] = result
+        return result
+
+    @staticmethod
+    def _scan(folder: Path) -> LoadFolderFiles:
+        content_folders: dict[str, str] = {}
+        try:
+            with os.scandir(folder) as entries:
+                for entry in entries:
+                    if entry.name in _CONTENT_FOLDERS and entry.is_dir():
+                        content_folders[entry.name] = entry.path
+        except OSError:
+            return LoadFolderFiles()
+
+        return LoadFolderFiles(
+            def_files=_scan_xmls(content_folders.get("Defs")),
+            patch_files=_scan_xmls(content_folders.get("Patches")),
+            language_files=_scan_xmls(content_folders.get("Languages")),
+        )
+
+
+_CONTENT_FOLDERS = frozenset(("Defs", "Patches", "Languages"))
+
+
+def _scan_xmls(top: str | None) -> tuple[Path, ...]:
+    """Same as `find_xmls`, but with less syscalls and allocations"""
+    if top is None:
+        return ()
+    result = []
+    folders = [top]
+    while folders:
+        folder = folders.pop()
+        try:
+            with os.scandir(folder) as scandir_it:
+                entries = list(scandir_it)
+        except OSError:
+            continue
+        subfolders = []
+        for entry in entries:
+            try:
+                is_dir = entry.is_dir(follow_symlinks=False)
+            except OSError:
+                is_dir = False
+            if is_dir:
+                subfolders.append(entry.path)
+            elif os.path.splitext(entry.name)[1] == ".xml":
+                result.append(Path(entry.path))
+        folders.extend(reversed(subfolders))
+    return tuple(result)
 
 
 @dataclass(frozen=True)
@@ -734,16 +938,72 @@ def is_mod_folder(path: Path) -> bool:
     return path.joinpath("About", "About.xml").exists()
 
 
-def load_mods(*folders: Path) -> Iterator[Mod]:
-    """Recursively load mods from folders"""
+def find_mod_folders(*folders: Path) -> Iterator[Path]:
+    """Recursively find mod folders"""
     for folder in folders:
         if not folder.is_dir():
             continue
         if is_mod_folder(folder):
-            yield Mod.load(folder)
+            yield folder
             continue
         for sf in folder.iterdir():
-            yield from load_mods(sf)
+            yield from find_mod_folders(sf)
+
+
+def load_mods(
+    *folders: Path,
+    workers: int | None = None,
+    catalog: ModCatalog | None = None,
+    events: Instrumentation | None = None,
+) -> Iterator[Mod]:
+    """Recursively load mods from folders
+
+    If `workers` is given, mod folders are discovered and loaded on a thread pool
+    of that size. Mods are yielded in the same order as in the serial mode, but a
+    mod that fails to load is logged and skipped instead of aborting the scan.
+
+    If `catalog` is given, parsed About.xml and LoadFolders.xml files are taken
+    from it when they did not change. Call `ModCatalog.save` to persist it.
+
+    If `events` is given, every mod loaded is reported to it.
+    """
+    if workers is None:
+        for path in find_mod_folders(*folders):
+            yield Mod.load(path, catalog, events)
+        return
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        subtrees = executor.map(_find_mod_folders_list, _discovery_roots(folders))
+        paths = [path for subtree in subtrees for path in subtree]
+        load = partial(_load_mod_or_none, catalog=catalog, events=events)
+        for mod in executor.map(load, paths):
+            if mod is not None:
+                yield mod
+
+
+def _discovery_roots(folders: Iterable[Path]) -> Iterator[Path]:
+    """Split folders into independent subtrees that can be searched in parallel"""
+    for folder in folders:
+        if not folder.is_dir():
+            continue
+        if is_mod_folder(folder):
+            yield folder
+            continue
+        yield from folder.iterdir()
+
+
+def _find_mod_folders_list(folder: Path) -> list[Path]:
+    return list(find_mod_folders(folder))
+
+
+def _load_mod_or_none(
+    path: Path, catalog: ModCatalog | None, events: Instrumentation | None
+) -> Mod | None:
+    try:
+        return Mod.load(path, catalog, events)
+    except Exception:  # pylint: disable=broad-exception-caught
+        logging.getLogger(__name__).exception("Failed to load mod at %s", path)
+        return None
 
 
 def select_mods(
@@ -42,6 +42,8 @@ from lxml import etree
 
 from rimworld.error import MalformedPatchError
 
+from .cache import PatchCache
+from .journal import Change, Mutation, MutationJournal
 from .operations.add import PatchOperationAdd
 from .operations.addmodextension import PatchOperationAddModExtension
 from .operations.attributeadd import PatchOperationAttributeAdd
@@ -55,10 +57,12 @@ from .operations.remove import PatchOperationRemove
 from .operations.replace import PatchOperationReplace
 from .operations.sequence import PatchOperationSequence
 from .operations.setname import PatchOperationSetName
+from .prescan import patch_can_apply
 from .proto import PatchContext, PatchOperation, PatchOperationResult
 from .result import (PatchOperationDenied, PatchOperationForceFailed,
                      PatchOperationInverted, PatchOperationSkipped,
                      PatchOperationSuppressed)
+from .serializers import get_may_require, reduce_element, restore_element
 from .xmlextensions.addorreplace import PatchOperationAddOrReplace
 from .xmlextensions.safeadd import PatchOperationSafeAdd
 
@@ -77,6 +81,10 @@ __all__ = [
     "PatchOperationSetName",
     "PatchOperationAddOrReplace",
     "PatchOperationSafeAdd",
+    "PatchCache",
+    "Change",
+    "Mutation",
+    "MutationJournal",
     "PatchContext",
     "PatchOperation",
     "PatchOperationResult",
@@ -87,6 +95,7 @@ __all__ = [
     "PatchOperationSuppressed",
     "PatchOperationWrapper",
     "get_operation",
+    "patch_can_apply",
     "Success",
 ]
 
@@ -135,14 +144,8 @@ class PatchOperationWrapper(PatchOperation):
     def __call__(
         self, xml: etree._ElementTree, context: PatchContext
     ) -> PatchOperationResult:
-        if self.may_require:
-            if not all(pid in context.active_package_ids for pid in self.may_require):
-                return PatchOperationDenied(self.operation)
-        if self.may_require_any_of:
-            if not any(
-                pid in context.active_package_ids for pid in self.may_require_any_of
-            ):
-                return PatchOperationDenied(self.operation)
+        if not context.is_allowed(self.may_require, self.may_require_any_of):
+            return PatchOperationDenied(self.operation)
         op_result = self.operation(xml, context)
         match self.success:
             case Success.NORMAL:
@@ -181,6 +184,9 @@ class PatchOperationUnknown(PatchOperation):
     def __call__(self, *_) -> "PatchOperationResult":
         return PatchOperationSkipped(self)
 
+    def __reduce__(self):
+        return (_restore_unknown_operation, reduce_element(self.node))
+
     def to_xml(self, node: etree._Element):
         n = deepcopy(self.node)
         for k, v in n.attrib.items():
@@ -189,6 +195,12 @@ class PatchOperationUnknown(PatchOperation):
             node.append(c)
 
 
+def _restore_unknown_operation(
+    content: bytes, tail: str | None
+) -> PatchOperationUnknown:
+    return PatchOperationUnknown(restore_element(content, tail))
+
+
 def get_operation(node: etree._Element) -> PatchOperation:
     """Basic Patcher"""
     base_op = _select_operation_concrete(node)
@@ -196,13 +208,7 @@ def get_operation(node: etree._Element) -> PatchOperation:
     if isinstance(base_op, PatchOperationUnknown):
         return base_op
 
-    may_require = None
-    may_require_any_of = None
-
-    if mr := node.get("MayRequire"):
-        may_require = [x.strip() for x in mr.split(",")]
-    if mr := node.get("MayRequireAnyOf"):
-        may_require_any_of = [x.strip() for x in mr.split(",")]
+    may_require, may_require_any_of = get_may_require(node)
     success = Success.from_xml(node)
 
     if may_require or may_require_any_of or success != Success.NORMAL:
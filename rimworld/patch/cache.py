@@ -0,0 +1,76 @@
+""" On-disk cache of deserialized patch files """
+
+import hashlib
+from pathlib import Path
+
+from rimworld.cache import library_version, read_cache_file, write_cache_file
+
+from .proto import PatchOperation
+
+__all__ = ["PatchCache"]
+
+
+class PatchCache:
+    """On-disk cache of patch operations deserialized from patch files
+
+    Entries are keyed by the sha256 of a patch file's content, so touching or
+    moving a file does not invalidate its entry, and a different version of
+    the library invalidates all of them. Entries not used since the cache was
+    opened are dropped on save.
+
+    Example:
+        cache = PatchCache(Path("patches.cache"))
+        operations = cache.lookup(path)
+        if operations is None:
+            operations = [get_operation(n) for n in load_xml(path).findall("Operation")]
+            cache.store(path, operations)
+        cache.save()
+    """
+
+    # bump when the pickled classes change
+    FORMAT_VERSION = 1
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._entries: dict[str, list[PatchOperation]] = (
+            read_cache_file(path, self._cache_key()) or {}
+        )
+        self._used: dict[str, list[PatchOperation]] = {}
+        self._digests: dict[Path, str] = {}
+        self._dirty = False
+
+    def lookup(self, path: Path) -> list[PatchOperation] | None:
+        """Return operations of a patch file, or None if it is not cached"""
+        digest = self._digest(path)
+        operations = self._entries.get(digest)
+        if operations is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._used[digest] = operations
+        return operations
+
+    def store(self, path: Path, operations: list[PatchOperation]):
+        """Cache operations deserialized from a patch file"""
+        digest = self._digest(path)
+        self._entries[digest] = operations
+        self._used[digest] = operations
+        self._dirty = True
+
+    def save(self):
+        """Write entries used since the cache was opened to disk"""
+        if not self._dirty and self._used.keys() == self._entries.keys():
+            return
+        write_cache_file(self.path, self._cache_key(), self._used)
+        self._entries = dict(self._used)
+        self._dirty = False
+
+    def _digest(self, path: Path) -> str:
+        if (digest := self._digests.get(path)) is None:
+            digest = self._digests[path] = hashlib.sha256(path.read_bytes()).hexdigest()
+        return digest
+
+    def _cache_key(self) -> tuple:
+        return ("PatchCache", self.FORMAT_VERSION, library_version())
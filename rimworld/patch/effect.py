@@ -0,0 +1,128 @@
+""" What a specialized patch operation may touch, decided from its xpaths
+
+>>> from lxml import etree
+>>> from rimworld.patch import get_operation
+>>> operation = get_operation(etree.fromstring('''
+... <Operation Class="PatchOperationRemove">
+...     <xpath>/Defs/ThingDef[defName="Steel"]/comps</xpath>
+... </Operation>
+... '''))
+>>> effect = operation_effect(operation)
+>>> effect.footprints[0].tag, effect.compound, effect.structural
+('ThingDef', False, False)
+"""
+
+from dataclasses import dataclass
+
+from rimworld.patch import (PatchOperation, PatchOperationUnknown,
+                            PatchOperationWrapper)
+from rimworld.patch.operations.add import PatchOperationAdd
+from rimworld.patch.operations.addmodextension import \
+    PatchOperationAddModExtension
+from rimworld.patch.operations.attributeadd import PatchOperationAttributeAdd
+from rimworld.patch.operations.attributeremove import \
+    PatchOperationAttributeRemove
+from rimworld.patch.operations.attributeset import PatchOperationAttributeSet
+from rimworld.patch.operations.conditional import PatchOperationConditional
+from rimworld.patch.operations.insert import PatchOperationInsert
+from rimworld.patch.operations.op_test import PatchOperationTest
+from rimworld.patch.operations.remove import PatchOperationRemove
+from rimworld.patch.operations.replace import PatchOperationReplace
+from rimworld.patch.operations.sequence import PatchOperationSequence
+from rimworld.patch.operations.setname import PatchOperationSetName
+from rimworld.patch.specialize import (PatchOperationDisabled,
+                                       PatchOperationResolved)
+from rimworld.patch.xmlextensions.addorreplace import \
+    PatchOperationAddOrReplace
+from rimworld.patch.xmlextensions.safeadd import PatchOperationSafeAdd
+from rimworld.xml import DefFootprint, ElementXpath, def_footprint
+
+__all__ = ["Effect", "creates_defs", "operation_effect"]
+
+_ELEMENT_OPERATIONS = (
+    PatchOperationAdd,
+    PatchOperationAddModExtension,
+    PatchOperationAttributeAdd,
+    PatchOperationAttributeRemove,
+    PatchOperationAttributeSet,
+    PatchOperationInsert,
+    PatchOperationRemove,
+    PatchOperationReplace,
+    PatchOperationSetName,
+    PatchOperationSafeAdd,
+    PatchOperationAddOrReplace,
+    PatchOperationTest,
+)
+
+_ANY = DefFootprint("any")
+
+
+@dataclass(frozen=True)
+class Effect:
+    """What an operation may touch, see `operation_effect`
+
+    `operations` are the operations doing the actual changes, the ones
+    inside sequences, conditionals and resolved operations.
+    """
+
+    footprints: tuple[DefFootprint, ...]
+    compound: bool
+    structural: bool
+    operations: tuple[PatchOperation, ...] = ()
+
+
+def operation_effect(operation: PatchOperation) -> Effect | None:
+    """Footprints of the xpaths an operation may evaluate
+
+    An operation is compound if what it does to one def may depend on
+    another, and structural if it creates top-level nodes. Returns None if
+    the operation has no effect.
+    """
+    footprints: list[DefFootprint] = []
+    operations: list[PatchOperation] = []
+    compound = structural = False
+    pending = [operation]
+    while pending:
+        match pending.pop():
+            case PatchOperationDisabled():
+                pass
+            case PatchOperationResolved(branch=branch) if branch is not None:
+                pending.append(branch)
+            case PatchOperationResolved():
+                pass
+            case PatchOperationWrapper(operation=inner):
+                pending.append(inner)
+            case PatchOperationSequence(operations=inner):
+                compound = True
+                pending.extend(inner)
+            case PatchOperationConditional(xpath=xpath, match=match, nomatch=nomatch):
+                compound = True
+                footprints.append(def_footprint(xpath.xpath))
+                pending.extend(op for op in (match, nomatch) if op is not None)
+            case PatchOperationAdd(xpath=xpath) as op if xpath.xpath == "/Defs":
+                footprints.append(def_footprint(xpath.xpath))
+                operations.append(op)
+                structural = True
+            case op if isinstance(op, _ELEMENT_OPERATIONS):
+                footprint = def_footprint(op.xpath.xpath)
+                if footprint.kind == "root":
+                    footprint = _ANY
+                footprints.append(footprint)
+                operations.append(op)
+                structural |= creates_defs(op, footprint)
+            case PatchOperationUnknown():
+                pass
+            case _:
+                footprints.append(_ANY)
+    if not footprints:
+        return None
+    return Effect(tuple(footprints), compound, structural, tuple(operations))
+
+
+def creates_defs(operation: PatchOperation, footprint: DefFootprint) -> bool:
+    """Check if an element operation with this footprint adds top-level nodes"""
+    return (
+        footprint.whole
+        and isinstance(operation, (PatchOperationInsert, PatchOperationReplace))
+        and isinstance(operation.xpath, ElementXpath)
+    )
@@ -0,0 +1,152 @@
+""" Opt-in record of changes made by patch operations
+
+Pass a journal to the patch context, and every built-in operation records
+what it changed:
+
+>>> from rimworld.patch import PatchContext, get_operation
+>>> journal = MutationJournal()
+>>> context = PatchContext(set(), set(), journal=journal)
+>>> defs = etree.ElementTree(etree.fromstring(
+...     "<Defs><ThingDef><defName>Steel</defName></ThingDef></Defs>"
+... ))
+>>> operation = get_operation(etree.fromstring('''
+... <Operation Class="PatchOperationAdd">
+...     <xpath>/Defs/ThingDef</xpath><value><label>steel</label></value>
+... </Operation>
+... '''))
+>>> journal.begin("my.mod", "Patches/a.xml")
+>>> operation(defs, context)
+PatchOperationBasicCounterResult(...)
+>>> [(m.change.name, m.path, m.def_name, m.mod) for m in journal]
+[('INSERTED', '/Defs/ThingDef/label', 'Steel', 'my.mod')]
+"""
+
+from collections import defaultdict, deque
+from dataclasses import dataclass
+from enum import Enum, auto
+from typing import Any, Iterator
+
+from lxml import etree
+
+__all__ = ["Change", "Mutation", "MutationJournal"]
+
+
+class Change(Enum):
+    """Kind of a change made to the patched xml"""
+
+    INSERTED = auto()
+    REMOVED = auto()
+    REPLACED = auto()
+    RENAMED = auto()
+    ATTRIBUTE = auto()
+    TEXT = auto()
+
+
+@dataclass(frozen=True, slots=True)
+class Mutation:
+    """A single change made by a patch operation
+
+    `path` locates the changed node at the time of the change; for removed
+    and replaced nodes it is where they were. `name` is the name of a
+    changed attribute, `old` and `new` are the attribute values, texts or
+    tags before and after the change.
+    """
+
+    change: Change
+    path: str
+    def_name: str | None
+    operation: str
+    xpath: str | None
+    mod: str | None
+    file: str | None
+    name: str | None = None
+    old: str | None = None
+    new: str | None = None
+
+
+class MutationJournal:
+    """Bounded record of changes made by patch operations
+
+    Only the latest `max_entries` changes are kept, `dropped` counts the
+    ones discarded to make room. If `max_entries` is None, every change is
+    kept.
+
+    Call `begin` before applying operations of a patch file to attribute
+    their changes to it.
+    """
+
+    def __init__(self, max_entries: int | None = 100_000) -> None:
+        self.entries: deque[Mutation] = deque(maxlen=max_entries)
+        self.dropped = 0
+        self.mod: str | None = None
+        self.file: str | None = None
+
+    def begin(self, mod: str | None, file: str | None):
+        """Attribute following changes to a mod and a patch file"""
+        self.mod = mod
+        self.file = file
+
+    # pylint: disable-next=too-many-arguments,too-many-positional-arguments
+    def record(
+        self,
+        operation: Any,
+        change: Change,
+        node: etree._Element,
+        name: str | None = None,
+        old: str | None = None,
+        new: str | None = None,
+    ):
+        """Record a change an operation made to a node of the patched xml"""
+        if len(self.entries) == self.entries.maxlen:
+            self.dropped += 1
+        xpath = getattr(operation, "xpath", None)
+        self.entries.append(
+            Mutation(
+                change=change,
+                path=node.getroottree().getpath(node),
+                def_name=_def_name(node),
+                operation=type(operation).__name__,
+                xpath=str(xpath) if xpath is not None else None,
+                mod=self.mod,
+                file=self.file,
+                name=name,
+                old=old,
+                new=new,
+            )
+        )
+
+    def by_def(self) -> dict[str | None, list[Mutation]]:
+        """Changes grouped by the defName of the def they were made in"""
+        result: dict[str | None, list[Mutation]] = defaultdict(list)
+        for mutation in self.entries:
+            result[mutation.def_name].append(mutation)
+        return dict(result)
+
+    def conflicts(self) -> dict[str, set[str | None]]:
+        """Defs changed by more than one mod, with the mods that changed them"""
+        mods: dict[str, set[str | None]] = defaultdict(set)
+        for mutation in self.entries:
+            if mutation.def_name is not None:
+                mods[mutation.def_name].add(mutation.mod)
+        return {name: m for name, m in mods.items() if len(m) > 1}
+
+    def clear(self):
+        """Forget all recorded changes"""
+        self.entries.clear()
+        self.dropped = 0
+
+    def __iter__(self) -> Iterator[Mutation]:
+        return iter(self.entries)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+
+def _def_name(node: etree._Element) -> str | None:
+    """defName of the top-level def containing a node"""
+    parent = node.getparent()
+    if parent is None:
+        return None
+    while (grandparent := parent.getparent()) is not None:
+        node, parent = parent, grandparent
+    return node.findtext("defName")
@@ -6,7 +6,9 @@ from typing import Self
 from lxml import etree
 
 from rimworld.error import NoNodesFound
-from rimworld.patch.proto import PatchOperation, PatchOperationResult
+from rimworld.patch.journal import Change
+from rimworld.patch.proto import (PatchContext, PatchOperation,
+                                  PatchOperationResult)
 from rimworld.patch.result import (PatchOperationBasicCounterResult,
                                    PatchOperationFailedResult)
 from rimworld.patch.serializers import (Order, SafeElement, ensure_value,
@@ -25,15 +27,19 @@ class PatchOperationAdd(PatchOperation):
     value: SafeElement
     order: Order = Order.APPEND
 
-    def __call__(self, xml: etree._ElementTree, *_) -> PatchOperationResult:
+    def __call__(
+        self, xml: etree._ElementTree, context: PatchContext
+    ) -> PatchOperationResult:
 
-        found = self.xpath.search(xml)
+        found = context.search(self.xpath, xml)
 
         if len(found) == 0:
             return PatchOperationFailedResult(self, NoNodesFound(str(self.xpath)))
 
-        for elt in found:
-            value = self.value.copy()
+        values = self.value.materialize(len(found), context.consume_values)
+        for elt, value in zip(found, values):
+            added = list(value)
+            old_text = elt.text
             match self.order:
                 case Order.APPEND:
                     if value.text:
@@ -44,6 +50,11 @@ class PatchOperationAdd(PatchOperation):
                         elt.text = value.text + (elt.text or "")
                     for v in value:
                         elt.insert(0, v)
+            if value.text:
+                context.record(self, Change.TEXT, elt, old=old_text, new=elt.text)
+            for v in added:
+                context.record(self, Change.INSERTED, v)
+            context.notify_changed(elt, *added)
 
         return PatchOperationBasicCounterResult(self, len(found))
 
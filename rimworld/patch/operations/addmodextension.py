@@ -6,7 +6,9 @@ from typing import Self
 from lxml import etree
 
 from rimworld.error import MalformedPatchError, NoNodesFound
-from rimworld.patch.proto import PatchOperation, PatchOperationResult
+from rimworld.patch.journal import Change
+from rimworld.patch.proto import (PatchContext, PatchOperation,
+                                  PatchOperationResult)
 from rimworld.patch.result import (PatchOperationBasicCounterResult,
                                    PatchOperationFailedResult)
 from rimworld.patch.serializers import (SafeElement, ensure_value,
@@ -24,19 +26,24 @@ class PatchOperationAddModExtension(PatchOperation):
     xpath: ElementXpath
     value: SafeElement
 
-    def __call__(self, xml: etree._ElementTree, *_) -> PatchOperationResult:
-        found = self.xpath.search(xml)
+    def __call__(
+        self, xml: etree._ElementTree, context: PatchContext
+    ) -> PatchOperationResult:
+        found = context.search(self.xpath, xml)
 
         if not found:
             return PatchOperationFailedResult(self, NoNodesFound(str(self.xpath)))
 
-        for elt in found:
+        values = self.value.materialize(len(found), context.consume_values)
+        for elt, value in zip(found, values):
             mod_extensions = elt.find("modExtensions")
             if mod_extensions is None:
                 mod_extensions = etree.Element("modExtensions")
                 elt.append(mod_extensions)
-            for v in self.value.copy():
+            for v in value:
                 mod_extensions.append(v)
+                context.record(self, Change.INSERTED, v)
+            context.notify_changed(mod_extensions)
 
         return PatchOperationBasicCounterResult(self, len(found))
 
@@ -6,7 +6,9 @@ from typing import Self
 from lxml import etree
 
 from rimworld.error import NoNodesFound
-from rimworld.patch.proto import PatchOperation, PatchOperationResult
+from rimworld.patch.journal import Change
+from rimworld.patch.proto import (PatchContext, PatchOperation,
+                                  PatchOperationResult)
 from rimworld.patch.result import (PatchOperationBasicCounterResult,
                                    PatchOperationFailedResult)
 from rimworld.patch.serializers import ensure_xpath_elt
@@ -24,8 +26,10 @@ class PatchOperationAttributeAdd(PatchOperation):
     attribute: str
     value: str
 
-    def __call__(self, xml: etree._ElementTree, *_) -> PatchOperationResult:
-        found = self.xpath.search(xml)
+    def __call__(
+        self, xml: etree._ElementTree, context: PatchContext
+    ) -> PatchOperationResult:
+        found = context.search(self.xpath, xml)
         if not found:
             return PatchOperationFailedResult(self, NoNodesFound(str(self.xpath)))
 
@@ -33,6 +37,10 @@ class PatchOperationAttributeAdd(PatchOperation):
             if elt.get(self.attribute) is not None:
                 continue
             elt.set(self.attribute, self.value)
+            context.record(
+                self, Change.ATTRIBUTE, elt, name=self.attribute, new=self.value
+            )
+            context.notify_changed(elt)
         return PatchOperationBasicCounterResult(self, len(found))
 
     @classmethod
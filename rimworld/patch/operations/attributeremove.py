@@ -6,7 +6,9 @@ from typing import Self
 from lxml import etree
 
 from rimworld.error import NoNodesFound
-from rimworld.patch.proto import PatchOperation, PatchOperationResult
+from rimworld.patch.journal import Change
+from rimworld.patch.proto import (PatchContext, PatchOperation,
+                                  PatchOperationResult)
 from rimworld.patch.result import (PatchOperationBasicCounterResult,
                                    PatchOperationFailedResult)
 from rimworld.patch.serializers import ensure_xpath_elt
@@ -23,14 +25,18 @@ class PatchOperationAttributeRemove(PatchOperation):
     xpath: ElementXpath
     attribute: str
 
-    def __call__(self, xml: etree._ElementTree, *_) -> PatchOperationResult:
-        found = self.xpath.search(xml)
+    def __call__(
+        self, xml: etree._ElementTree, context: PatchContext
+    ) -> PatchOperationResult:
+        found = context.search(self.xpath, xml)
 
         if not found:
             return PatchOperationFailedResult(self, NoNodesFound(str(self.xpath)))
 
         for elt in found:
-            elt.attrib.pop(self.attribute)
+            old = elt.attrib.pop(self.attribute)
+            context.record(self, Change.ATTRIBUTE, elt, name=self.attribute, old=old)
+            context.notify_changed(elt)
 
         return PatchOperationBasicCounterResult(self, len(found))
 
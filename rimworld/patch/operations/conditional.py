@@ -26,7 +26,7 @@ class PatchOperationConditional(PatchOperation):
     def __call__(
         self, xml: etree._ElementTree, context: PatchContext
     ) -> PatchOperationResult:
-        matches = self.xpath.search(xml)
+        matches = context.search(self.xpath, xml)
         if matches:
             return PatchOperationBasicConditionalResult(
                 self, True, self.match(xml, context) if self.match else None
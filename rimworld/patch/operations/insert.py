@@ -6,7 +6,9 @@ from typing import Self
 from lxml import etree
 
 from rimworld.error import NoNodesFound, PatchError
-from rimworld.patch.proto import PatchOperation, PatchOperationResult
+from rimworld.patch.journal import Change
+from rimworld.patch.proto import (PatchContext, PatchOperation,
+                                  PatchOperationResult)
 from rimworld.patch.result import (PatchOperationBasicCounterResult,
                                    PatchOperationFailedResult)
 from rimworld.patch.serializers import (Order, SafeElement, ensure_value,
@@ -25,17 +27,20 @@ class PatchOperationInsert(PatchOperation):
     value: SafeElement
     order: Order = Order.PREPEND
 
-    def __call__(self, xml: etree._ElementTree, *_) -> PatchOperationResult:
+    def __call__(
+        self, xml: etree._ElementTree, context: PatchContext
+    ) -> PatchOperationResult:
 
-        found = self.xpath.search(xml)
+        found = context.search(self.xpath, xml)
 
         if not found:
             return PatchOperationFailedResult(self, NoNodesFound(str(self.xpath)))
 
-        for node in found:
-            value = self.value.copy()
+        values = self.value.materialize(len(found), context.consume_values)
+        for node, value in zip(found, values):
             if value.text:
                 raise PatchError("Value cannot be text")
+            added = list(value)
             match self.order:
                 case Order.APPEND:
                     for v in reversed(value):
@@ -43,6 +48,9 @@ class PatchOperationInsert(PatchOperation):
                 case Order.PREPEND:
                     for v in value:
                         node.addprevious(v)
+            for v in added:
+                context.record(self, Change.INSERTED, v)
+            context.notify_changed(*added)
 
         return PatchOperationBasicCounterResult(self, len(found))
 
@@ -5,7 +5,8 @@ from typing import Self
 
 from lxml import etree
 
-from rimworld.patch.proto import PatchOperation, PatchOperationResult
+from rimworld.patch.proto import (PatchContext, PatchOperation,
+                                  PatchOperationResult)
 from rimworld.patch.serializers import ensure_xpath
 from rimworld.xml import Xpath
 
@@ -17,16 +18,19 @@ class PatchOperationTestResult(PatchOperationResult):
     operation: "PatchOperationTest"
     result: bool
 
+    @property
     # pylint: disable-next=missing-function-docstring
     def is_successful(self) -> bool:
         return self.result
 
+    @property
     # pylint: disable-next=missing-function-docstring
     def exception(
         self,
     ) -> Exception | None:
         return None
 
+    @property
     # pylint: disable-next=missing-function-docstring
     def nodes_affected(self) -> int:
         return 0
@@ -41,8 +45,10 @@ class PatchOperationTest(PatchOperation):
 
     xpath: Xpath
 
-    def __call__(self, xml: etree._ElementTree, *_) -> PatchOperationResult:
-        found = self.xpath.search(xml)
+    def __call__(
+        self, xml: etree._ElementTree, context: PatchContext
+    ) -> PatchOperationResult:
+        found = context.search(self.xpath, xml)
         return PatchOperationTestResult(self, bool(found))
 
     @classmethod
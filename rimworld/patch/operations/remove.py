@@ -6,7 +6,9 @@ from typing import Self, cast
 from lxml import etree
 
 from rimworld.error import MalformedPatchError, NoNodesFound, PatchError
-from rimworld.patch.proto import PatchOperation, PatchOperationResult
+from rimworld.patch.journal import Change
+from rimworld.patch.proto import (PatchContext, PatchOperation,
+                                  PatchOperationResult)
 from rimworld.patch.result import (PatchOperationBasicCounterResult,
                                    PatchOperationFailedResult)
 from rimworld.patch.serializers import ensure_xpath
@@ -22,11 +24,13 @@ class PatchOperationRemove(PatchOperation):
 
     xpath: ElementXpath | TextXpath
 
-    def __call__(self, xml: etree._ElementTree, *_) -> PatchOperationResult:
+    def __call__(
+        self, xml: etree._ElementTree, context: PatchContext
+    ) -> PatchOperationResult:
 
         match self.xpath:
             case ElementXpath():
-                found = self.xpath.search(xml)
+                found = context.search(self.xpath, xml)
                 if not found:
                     return PatchOperationFailedResult(
                         self, NoNodesFound(str(self.xpath))
@@ -35,15 +39,19 @@ class PatchOperationRemove(PatchOperation):
                     parent = elt.getparent()
                     if parent is None:
                         raise PatchError(f"Parent not found for {self.xpath}")
+                    context.record(self, Change.REMOVED, elt)
                     parent.remove(elt)
+                    context.notify_changed(parent)
             case TextXpath():
-                found = self.xpath.search(xml)
+                found = context.search(self.xpath, xml)
                 if not found:
                     return PatchOperationFailedResult(
                         self, NoNodesFound(str(self.xpath))
                     )
                 for elt in found:
+                    context.record(self, Change.TEXT, elt.node, old=elt.node.text)
                     elt.node.text = None
+                    context.notify_changed(elt.node)
 
         return PatchOperationBasicCounterResult(self, len(found))
 
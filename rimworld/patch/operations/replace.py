@@ -6,7 +6,9 @@ from typing import Self, cast
 from lxml import etree
 
 from rimworld.error import MalformedPatchError, NoNodesFound, PatchError
-from rimworld.patch.proto import PatchOperation, PatchOperationResult
+from rimworld.patch.journal import Change
+from rimworld.patch.proto import (PatchContext, PatchOperation,
+                                  PatchOperationResult)
 from rimworld.patch.result import (PatchOperationBasicCounterResult,
                                    PatchOperationFailedResult)
 from rimworld.patch.serializers import SafeElement, ensure_value, ensure_xpath
@@ -23,42 +25,54 @@ class PatchOperationReplace(PatchOperation):
     xpath: ElementXpath | TextXpath
     value: SafeElement
 
-    def __call__(self, xml: etree._ElementTree, *_) -> PatchOperationResult:
+    def __call__(
+        self, xml: etree._ElementTree, context: PatchContext
+    ) -> PatchOperationResult:
         match self.xpath:
             case ElementXpath():
                 if isinstance(self.value, str):
                     raise PatchError(
                         "Elements can only be replaced with other elements"
                     )
-                found = self.xpath.search(xml)
+                found = context.search(self.xpath, xml)
                 if not found:
                     return PatchOperationFailedResult(
                         self, NoNodesFound(str(self.xpath))
                     )
-                for f in found:
+                values = self.value.materialize(len(found), context.consume_values)
+                for f, value in zip(found, values):
                     parent = f.getparent()
                     if parent is None:
                         raise PatchError(f"Parent not found for {self.xpath}")
-                    v1, *v_ = self.value.copy()
+                    v1, *v_ = value
+                    context.record(self, Change.REPLACED, f)
                     parent.replace(f, v1)
 
                     for v in reversed(v_):
                         v1.addnext(v)
+                    for v in v_:
+                        context.record(self, Change.INSERTED, v)
+                    context.notify_changed(v1, *v_)
 
             case TextXpath():
-                found = self.xpath.search(xml)
+                found = context.search(self.xpath, xml)
                 if not found:
                     return PatchOperationFailedResult(
                         self, NoNodesFound(str(self.xpath))
                     )
-                for f in found:
-                    value = self.value.copy()
+                values = self.value.materialize(len(found), context.consume_values)
+                for f, value in zip(found, values):
+                    context.record(
+                        self, Change.TEXT, f.node, old=f.node.text, new=value.text
+                    )
                     if value.text is not None:
                         f.node.text = value.text
                     else:
                         f.node.text = None
                         for v in value:
                             f.node.append(v)
+                            context.record(self, Change.INSERTED, v)
+                    context.notify_changed(f.node)
 
         return PatchOperationBasicCounterResult(self, len(found))
 
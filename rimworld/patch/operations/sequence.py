@@ -17,10 +17,12 @@ class PatchOperationSequenceResult(PatchOperationResult):
     operation: "PatchOperationSequence"
     results: list[PatchOperationResult]
 
+    @property
     # pylint: disable-next=missing-function-docstring
     def is_successful(self) -> bool:
         return bool(self.results)
 
+    @property
     # pylint: disable-next=missing-function-docstring
     def exception(self) -> Exception | None:
         exceptions = [r.exception for r in self.results if r.exception is not None]
@@ -30,6 +32,7 @@ class PatchOperationSequenceResult(PatchOperationResult):
             )
         return None
 
+    @property
     # pylint: disable-next=missing-function-docstring
     def nodes_affected(self) -> int:
         return sum(r.nodes_affected for r in self.results)
@@ -6,7 +6,9 @@ from typing import Self
 from lxml import etree
 
 from rimworld.error import NoNodesFound
-from rimworld.patch.proto import PatchOperation, PatchOperationResult
+from rimworld.patch.journal import Change
+from rimworld.patch.proto import (PatchContext, PatchOperation,
+                                  PatchOperationResult)
 from rimworld.patch.result import (PatchOperationBasicCounterResult,
                                    PatchOperationFailedResult)
 from rimworld.patch.serializers import ensure_xpath_elt
@@ -23,13 +25,17 @@ class PatchOperationSetName(PatchOperation):
     xpath: ElementXpath
     name: str
 
-    def __call__(self, xml: etree._ElementTree, *_) -> PatchOperationResult:
-        found = self.xpath.search(xml)
+    def __call__(
+        self, xml: etree._ElementTree, context: PatchContext
+    ) -> PatchOperationResult:
+        found = context.search(self.xpath, xml)
         if not found:
             return PatchOperationFailedResult(self, NoNodesFound(str(self.xpath)))
 
         for elt in found:
+            context.record(self, Change.RENAMED, elt, old=elt.tag, new=self.name)
             elt.tag = self.name
+            context.notify_changed(elt)
 
         return PatchOperationBasicCounterResult(self, len(found))
 
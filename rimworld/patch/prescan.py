@@ -0,0 +1,69 @@
+""" Cheap check of whether a patch file can change anything """
+
+from pathlib import Path
+
+from lxml import etree
+
+from .proto import PatchContext
+from .serializers import get_may_require
+
+__all__ = ["patch_can_apply"]
+
+
+def patch_can_apply(path: Path, context: PatchContext) -> bool:
+    """Check if any operation of a patch file may apply under the context
+
+    Scans top-level operations without building the whole tree, and stops at
+    the first one that may apply. An operation cannot apply if its
+    MayRequire or MayRequireAnyOf mods are not active, or if it is a
+    PatchOperationFindMod without a `nomatch` branch whose mods are not all
+    active.
+
+    Files that cannot be parsed cleanly are assumed to apply, so they are
+    loaded and reported as usual.
+    """
+    try:
+        return _scan(path, context)
+    except (OSError, etree.XMLSyntaxError):
+        return True
+
+
+def _scan(path: Path, context: PatchContext) -> bool:
+    events = etree.iterparse(
+        str(path),
+        events=("start", "end"),
+        tag="Operation",
+        recover=True,
+        remove_comments=True,
+    )
+    for event, element in events:
+        parent = element.getparent()
+        if parent is None or parent.getparent() is not None:
+            continue  # not a top-level operation
+        if event == "start":
+            if not context.is_allowed(*get_may_require(element)):
+                continue
+            if element.get("Class") != "PatchOperationFindMod":
+                return True
+            continue
+        if _find_mod_can_apply(element, context):
+            return True
+        element.clear()
+        while element.getprevious() is not None:
+            del parent[0]
+    # recovered files may parse differently when loaded, do not skip them
+    return len(events.error_log) > 0
+
+
+def _find_mod_can_apply(element: etree._Element, context: PatchContext) -> bool:
+    if element.get("Class") != "PatchOperationFindMod":
+        return False
+    if not context.is_allowed(*get_may_require(element)):
+        return False
+    if element.find("nomatch") is not None:
+        return True
+    mods = element.find("mods")
+    names = (
+        [li.text or "" for li in mods.iterchildren("li")] if mods is not None else []
+    )
+    return all(name in context.active_package_names for name in names)
@@ -0,0 +1,257 @@
+""" Opt-in profiling of patch operations
+
+Wrap operations with `PatchProfiler.profile` and pass the profiler to the
+patch context, then apply the operations as usual:
+
+>>> from rimworld.patch import get_operation
+>>> profiler = PatchProfiler()
+>>> context = PatchContext(
+...     active_package_ids=set(), active_package_names=set(), profiler=profiler
+... )
+>>> defs = etree.ElementTree(etree.fromstring("<Defs><ThingDef/></Defs>"))
+>>> operation = get_operation(etree.fromstring('''
+... <Operation Class="PatchOperationSequence"><operations>
+...     <li Class="PatchOperationAdd">
+...         <xpath>/Defs/ThingDef</xpath><value><label>a</label></value>
+...     </li>
+... </operations></Operation>
+... '''))
+>>> profiler.profile(operation, mod="my.mod", file="Patches/a.xml")(defs, context)
+PatchOperationSequenceResult(...)
+>>> [(r.operation, r.depth, r.nodes_matched) for r in profiler.records]
+[('PatchOperationSequence', 0, 0), ('PatchOperationAdd', 1, 1)]
+"""
+
+import json
+from collections import defaultdict
+from dataclasses import asdict, dataclass, field, replace
+from pathlib import Path
+from time import perf_counter
+from typing import Any
+
+from lxml import etree
+
+from rimworld.patch import (
+    PatchContext,
+    PatchOperation,
+    PatchOperationResult,
+    PatchOperationWrapper,
+)
+from rimworld.patch.operations.conditional import PatchOperationConditional
+from rimworld.patch.operations.findmod import PatchOperationFindMod
+from rimworld.patch.operations.sequence import PatchOperationSequence
+from rimworld.patch.specialize import PatchOperationDisabled, PatchOperationResolved
+from rimworld.xml import Xpath
+
+__all__ = [
+    "OperationRecord",
+    "XpathRecord",
+    "PatchProfiler",
+    "ProfiledOperation",
+]
+
+
+@dataclass
+class OperationRecord:  # pylint: disable=too-many-instance-attributes
+    """Measurements of a single application of a patch operation
+
+    `elapsed` includes the time spent in nested operations, `self_elapsed`
+    does not. Times are in seconds.
+    """
+
+    operation: str
+    xpath: str | None
+    mod: str | None
+    file: str | None
+    depth: int
+    parent: int | None
+    elapsed: float = 0.0
+    self_elapsed: float = 0.0
+    nodes_matched: int = 0
+    nodes_affected: int = 0
+    successful: bool = False
+
+
+@dataclass
+class XpathRecord:
+    """Accumulated measurements of searches made with an xpath"""
+
+    xpath: str
+    calls: int = 0
+    elapsed: float = 0.0
+    nodes_matched: int = 0
+
+
+@dataclass
+class PatchProfiler:
+    """Records wall time, matched and affected nodes of patch operations
+
+    Operations nested inside Sequence, Conditional and FindMod operations are
+    recorded separately, and every record is attributed to the mod and patch
+    file its top-level operation came from.
+    """
+
+    records: list[OperationRecord] = field(default_factory=list)
+    xpaths: dict[str, XpathRecord] = field(default_factory=dict)
+    _stack: list[int] = field(default_factory=list, repr=False)
+
+    def profile(
+        self,
+        operation: PatchOperation,
+        mod: str | None = None,
+        file: str | Path | None = None,
+    ) -> "ProfiledOperation":
+        """Wrap an operation, and all operations nested in it, for profiling"""
+        return ProfiledOperation(
+            self._profile_children(operation, mod, file),
+            self,
+            mod,
+            str(file) if file is not None else None,
+        )
+
+    def searched(self, xpath: Xpath, nodes_matched: int, elapsed: float):
+        """Record a search made by the currently running operation"""
+        record = self.xpaths.get(xpath.xpath)
+        if record is None:
+            record = self.xpaths[xpath.xpath] = XpathRecord(xpath.xpath)
+        record.calls += 1
+        record.elapsed += elapsed
+        record.nodes_matched += nodes_matched
+        if self._stack:
+            self.records[self._stack[-1]].nodes_matched += nodes_matched
+
+    def by_mod(self) -> dict[str | None, float]:
+        """Total time spent in top-level operations of each mod"""
+        result: dict[str | None, float] = defaultdict(float)
+        for record in self.records:
+            if record.depth == 0:
+                result[record.mod] += record.elapsed
+        return dict(result)
+
+    def by_file(self) -> dict[str | None, float]:
+        """Total time spent in top-level operations of each patch file"""
+        result: dict[str | None, float] = defaultdict(float)
+        for record in self.records:
+            if record.depth == 0:
+                result[record.file] += record.elapsed
+        return dict(result)
+
+    def report(self, top: int = 20) -> str:
+        """A human readable report of the slowest operations, mods and xpaths"""
+        lines = [f"Slowest operations (self time, top {top}):"]
+        for record in sorted(self.records, key=lambda r: -r.self_elapsed)[:top]:
+            lines.append(
+                f"  {record.self_elapsed * 1000:10.3f} ms  {record.operation}"
+                f"  matched={record.nodes_matched} affected={record.nodes_affected}"
+                f"  {record.mod}:{record.file}  {record.xpath or ''}"
+            )
+        lines.append(f"Slowest mods (top {top}):")
+        for mod, elapsed in sorted(self.by_mod().items(), key=lambda i: -i[1])[:top]:
+            lines.append(f"  {elapsed * 1000:10.3f} ms  {mod}")
+        lines.append(f"Slowest xpaths (top {top}):")
+        for xpath in sorted(self.xpaths.values(), key=lambda r: -r.elapsed)[:top]:
+            lines.append(
+                f"  {xpath.elapsed * 1000:10.3f} ms  calls={xpath.calls}"
+                f" matched={xpath.nodes_matched}  {xpath.xpath}"
+            )
+        return "\n".join(lines)
+
+    def to_json(self) -> dict[str, Any]:
+        """Machine-readable form of all the measurements"""
+        return {
+            "operations": [asdict(record) for record in self.records],
+            "mods": self.by_mod(),
+            "files": self.by_file(),
+            "xpaths": [asdict(record) for record in self.xpaths.values()],
+        }
+
+    def dump(self, path: Path):
+        """Write measurements to a json file"""
+        with path.open("w", encoding="utf-8") as f:
+            json.dump(self.to_json(), f, indent=2)
+
+    def _profile_children(
+        self, operation: PatchOperation, mod: str | None, file: str | Path | None
+    ) -> PatchOperation:
+        def profile(op: PatchOperation | None) -> PatchOperation | None:
+            return self.profile(op, mod, file) if op is not None else None
+
+        match operation:
+            case PatchOperationSequence():
+                return replace(
+                    operation,
+                    operations=[
+                        self.profile(op, mod, file) for op in operation.operations
+                    ],
+                )
+            case PatchOperationConditional() | PatchOperationFindMod():
+                return replace(
+                    operation,
+                    match=profile(operation.match),
+                    nomatch=profile(operation.nomatch),
+                )
+            case PatchOperationWrapper():
+                return replace(
+                    operation,
+                    operation=self._profile_children(operation.operation, mod, file),
+                )
+            case PatchOperationResolved():
+                return replace(operation, branch=profile(operation.branch))
+        return operation
+
+    def run(
+        self,
+        operation: "ProfiledOperation",
+        xml: etree._ElementTree,
+        context: PatchContext,
+    ) -> PatchOperationResult:
+        """Apply a profiled operation, recording its measurements"""
+        inner = operation.operation
+        while isinstance(
+            inner,
+            (PatchOperationWrapper, PatchOperationDisabled, PatchOperationResolved),
+        ):
+            inner = inner.operation
+        xpath = getattr(inner, "xpath", None)
+        index = len(self.records)
+        record = OperationRecord(
+            operation=type(inner).__name__,
+            xpath=xpath.xpath if isinstance(xpath, Xpath) else None,
+            mod=operation.mod,
+            file=operation.file,
+            depth=len(self._stack),
+            parent=self._stack[-1] if self._stack else None,
+        )
+        self.records.append(record)
+        self._stack.append(index)
+        start = perf_counter()
+        try:
+            result = operation.operation(xml, context)
+        finally:
+            elapsed = perf_counter() - start
+            self._stack.pop()
+            record.elapsed = elapsed
+            record.self_elapsed += elapsed
+            if self._stack:
+                self.records[self._stack[-1]].self_elapsed -= elapsed
+        record.nodes_affected = result.nodes_affected
+        record.successful = result.is_successful
+        return result
+
+
+@dataclass(frozen=True)
+class ProfiledOperation(PatchOperation):
+    """An operation recording its measurements into a `PatchProfiler`"""
+
+    operation: PatchOperation
+    profiler: PatchProfiler
+    mod: str | None = None
+    file: str | None = None
+
+    def __call__(
+        self, xml: etree._ElementTree, context: PatchContext
+    ) -> PatchOperationResult:
+        return self.profiler.run(self, xml, context)
+
+    def to_xml(self, node: etree._Element):
+        self.operation.to_xml(node)
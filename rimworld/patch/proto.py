@@ -1,10 +1,22 @@
 """ Base definitions for patching """
 
 from dataclasses import dataclass
-from typing import Protocol, runtime_checkable
+from time import perf_counter
+from typing import TYPE_CHECKING, Protocol, runtime_checkable
 
 from lxml import etree
 
+from rimworld.events import Instrumentation
+from rimworld.xml import DefNameIndex, Xpath
+
+from .journal import Change, MutationJournal
+
+if TYPE_CHECKING:
+    from rimworld.incremental import DependencyGraph
+    from rimworld.projection import Projection
+
+    from .profiler import PatchProfiler
+
 
 class PatchOperationResult(Protocol):  # pylint: disable=R0903
     """Result of a patch operation"""
@@ -61,7 +73,83 @@ class PatchContext:
 
     This is required for operations like PatchOperationFindMod, as well as
     filtering operations by MayRequire and MayRequireAnyOf attributes
+
+    If `def_index` is set, operations use it to find defs by defName or Name,
+    and keep it up to date as they modify the xml.
+
+    If `profiler` is set, searches made by operations are recorded in it.
+
+    If `consume_values` is set, operations move their values into the last
+    node they apply them to instead of copying them, and cannot be applied
+    again. Only set it when operations are thrown away after being applied.
+
+    If `journal` is set, operations record every change they make in it.
+
+    If `dependencies` is set, the defs operations search and change are
+    recorded in it.
+
+    If `events` is set, `load_world` reports the top-level operations it
+    applies to it.
+
+    If `projection` is set, `load_world` only applies the operations it
+    wants.
     """
 
     active_package_ids: set[str]
     active_package_names: set[str]
+    def_index: DefNameIndex | None = None
+    profiler: "PatchProfiler | None" = None
+    consume_values: bool = False
+    journal: MutationJournal | None = None
+    dependencies: "DependencyGraph | None" = None
+    events: Instrumentation | None = None
+    projection: "Projection | None" = None
+
+    def is_allowed(
+        self, may_require: list[str] | None, may_require_any_of: list[str] | None
+    ) -> bool:
+        """Check MayRequire and MayRequireAnyOf package ids against active mods"""
+        if may_require and not all(
+            pid in self.active_package_ids for pid in may_require
+        ):
+            return False
+        if may_require_any_of and not any(
+            pid in self.active_package_ids for pid in may_require_any_of
+        ):
+            return False
+        return True
+
+    def search[T](self, xpath: Xpath[T], xml: etree._ElementTree) -> list[T]:
+        """Search the xml on behalf of an operation"""
+        if self.profiler is None:
+            found = xpath.search(xml, self.def_index)
+        else:
+            start = perf_counter()
+            found = xpath.search(xml, self.def_index)
+            self.profiler.searched(xpath, len(found), perf_counter() - start)
+        if self.dependencies is not None:
+            self.dependencies.read(getattr(item, "node", item) for item in found)
+        return found
+
+    # pylint: disable-next=too-many-arguments,too-many-positional-arguments
+    def record(
+        self,
+        operation: "PatchOperation",
+        change: Change,
+        node: etree._Element,
+        name: str | None = None,
+        old: str | None = None,
+        new: str | None = None,
+    ):
+        """Report a change made by an operation to the journal and dependencies"""
+        if self.journal is not None:
+            self.journal.record(operation, change, node, name, old, new)
+        if self.dependencies is not None:
+            self.dependencies.record(operation, change, node)
+
+    def notify_changed(self, *nodes: etree._Element):
+        """Report nodes inserted into the xml, or whose content was changed"""
+        if self.def_index is not None:
+            self.def_index.update(*nodes)
+        if self.dependencies is not None:
+            self.dependencies.changed(*nodes)
@@ -7,7 +7,7 @@ from typing import Iterator
 
 from lxml import etree
 
-from rimworld.error import MalformedPatchError
+from rimworld.error import MalformedPatchError, PatchError
 from rimworld.xml import ElementXpath, Xpath
 
 __all__ = [
@@ -18,6 +18,9 @@ __all__ = [
     "ensure_value",
     "ensure_element",
     "get_order",
+    "get_may_require",
+    "reduce_element",
+    "restore_element",
 ]
 
 
@@ -29,7 +32,69 @@ class SafeElement:
 
     def copy(self) -> etree._Element:
         """Return a copy of the contained element"""
-        return deepcopy(self._element)
+        return deepcopy(self._template())
+
+    def materialize(
+        self, count: int, consume: bool = False
+    ) -> Iterator[etree._Element]:
+        """Yield the value to apply to each of `count` targets
+
+        A value without child elements is never copied: the contained element
+        is yielded for every target, and must only be read. Otherwise each
+        target gets its own copy, except the last one when `consume` is set:
+        it gets the contained element itself, and the value cannot be used
+        again.
+        """
+        element = self._template()
+        if len(element) == 0:
+            for _ in range(count):
+                yield element
+            return
+        for i in range(count):
+            if consume and i == count - 1:
+                object.__setattr__(self, "_consumed", True)
+                yield element
+            else:
+                yield deepcopy(element)
+
+    def _template(self) -> etree._Element:
+        if "_consumed" in self.__dict__:
+            raise PatchError("Value was already moved into the patched xml")
+        return self._element
+
+    def __reduce__(self):
+        return (_restore_safe_element, reduce_element(self._template()))
+
+    def __getattr__(self, name: str):
+        # unpickled instances parse their element on first use
+        if name == "_element" and "_reduced" in self.__dict__:
+            element = restore_element(*self.__dict__.pop("_reduced"))
+            object.__setattr__(self, "_element", element)
+            return element
+        raise AttributeError(name)
+
+
+def _restore_safe_element(content: bytes, tail: str | None) -> SafeElement:
+    result = SafeElement.__new__(SafeElement)
+    object.__setattr__(result, "_reduced", (content, tail))
+    return result
+
+
+def reduce_element(element: etree._Element) -> tuple[bytes, str | None]:
+    """Serialize an element, so it can be pickled
+
+    lxml elements cannot be pickled themselves. Use `restore_element` to get
+    the element back.
+    """
+    return etree.tostring(element, with_tail=False), element.tail
+
+
+def restore_element(content: bytes, tail: str | None) -> etree._Element:
+    """Restore an element serialized with `reduce_element`"""
+    # parse inside a wrapper, so comments and processing instructions work too
+    element = etree.fromstring(b"<_>" + content + b"</_>")[0]
+    element.tail = tail
+    return element
 
 
 class Order(Enum):
@@ -80,6 +145,17 @@ def ensure_element(xml: etree._Element, tag: str) -> etree._Element:
     return elt
 
 
+def get_may_require(xml: etree._Element) -> tuple[list[str] | None, list[str] | None]:
+    """Returns package ids listed in MayRequire and MayRequireAnyOf attributes"""
+    may_require = None
+    may_require_any_of = None
+    if mr := xml.get("MayRequire"):
+        may_require = [x.strip() for x in mr.split(",")]
+    if mr := xml.get("MayRequireAnyOf"):
+        may_require_any_of = [x.strip() for x in mr.split(",")]
+    return may_require, may_require_any_of
+
+
 def get_order(xml: etree._Element, default=Order.APPEND) -> Order:
     """Returns <order> as Order enum"""
 
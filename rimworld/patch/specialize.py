@@ -0,0 +1,186 @@
+""" Partial evaluation of patch operations against a fixed patch context
+
+MayRequire, MayRequireAnyOf and PatchOperationFindMod only depend on the
+active mods, so they can be decided before the operations are applied:
+
+>>> from rimworld.patch import get_operation
+>>> context = PatchContext(
+...     active_package_ids={"ludeon.rimworld"}, active_package_names={"Core"}
+... )
+>>> operation = get_operation(etree.fromstring('''
+... <Operation Class="PatchOperationFindMod">
+...     <mods><li>Core</li></mods>
+...     <match Class="PatchOperationSequence"><operations>
+...         <li Class="PatchOperationRemove" MayRequire="some.mod">
+...             <xpath>/Defs/ThingDef</xpath>
+...         </li>
+...         <li Class="PatchOperationAdd">
+...             <xpath>/Defs</xpath><value><ThingDef/></value>
+...         </li>
+...     </operations></match>
+... </Operation>
+... '''))
+>>> specialized = specialize(operation, context)
+>>> type(specialized).__name__, type(specialized.branch).__name__
+('PatchOperationResolved', 'PatchOperationAdd')
+"""
+
+from dataclasses import dataclass, replace
+
+from lxml import etree
+
+from rimworld.patch import (PatchContext, PatchOperation, PatchOperationDenied,
+                            PatchOperationResult, PatchOperationWrapper,
+                            Success)
+from rimworld.patch.operations.conditional import PatchOperationConditional
+from rimworld.patch.operations.findmod import PatchOperationFindMod
+from rimworld.patch.operations.sequence import PatchOperationSequence
+from rimworld.patch.result import PatchOperationBasicConditionalResult
+
+__all__ = [
+    "specialize",
+    "PatchOperationDisabled",
+    "PatchOperationResolved",
+]
+
+
+def specialize(operation: PatchOperation, context: PatchContext) -> PatchOperation:
+    """Fold checks of active mods into the operation
+
+    - operations denied by MayRequire or MayRequireAnyOf are disabled, and
+      the checks of allowed ones are dropped
+    - PatchOperationFindMod only keeps the branch it takes
+    - operations that have no effect are removed from sequences, as are
+      operations following one that is known to stop the sequence
+    - sequences whose success is not checked by anything are flattened
+
+    The specialized operation changes the xml exactly like the original one
+    does when applied with the same `context`, but its results may be
+    structured differently. Apply it with that context only.
+    """
+    return _specialize(operation, context, observed=False)
+
+
+@dataclass(frozen=True)
+class PatchOperationDisabled(PatchOperation):
+    """An operation whose MayRequire or MayRequireAnyOf check fails"""
+
+    operation: PatchOperationWrapper
+
+    def __call__(
+        self, xml: etree._ElementTree, context: PatchContext
+    ) -> PatchOperationResult:
+        return PatchOperationDenied(self.operation.operation)
+
+    def to_xml(self, node: etree._Element):
+        self.operation.to_xml(node)
+
+
+@dataclass(frozen=True)
+class PatchOperationResolved(PatchOperation):
+    """A PatchOperationFindMod whose outcome is already known"""
+
+    operation: PatchOperationFindMod
+    matched: bool
+    branch: PatchOperation | None
+
+    def __call__(
+        self, xml: etree._ElementTree, context: PatchContext
+    ) -> PatchOperationResult:
+        return PatchOperationBasicConditionalResult(
+            self.operation,
+            self.matched,
+            self.branch(xml, context) if self.branch else None,
+        )
+
+    def to_xml(self, node: etree._Element):
+        self.operation.to_xml(node)
+
+
+def _specialize(
+    operation: PatchOperation, context: PatchContext, observed: bool
+) -> PatchOperation:
+    """Specialize an operation
+
+    `observed` tells if the success of the operation decides whether the
+    operations following it are applied.
+    """
+    match operation:
+        case PatchOperationWrapper():
+            return _specialize_wrapper(operation, context, observed)
+        case PatchOperationFindMod():
+            matched = all(m in context.active_package_names for m in operation.mods)
+            branch = operation.match if matched else operation.nomatch
+            if branch is not None:
+                branch = _specialize(branch, context, observed)
+            return PatchOperationResolved(operation, matched, branch)
+        case PatchOperationConditional():
+            return replace(
+                operation,
+                match=_specialize_branch(operation.match, context, observed),
+                nomatch=_specialize_branch(operation.nomatch, context, observed),
+            )
+        case PatchOperationSequence():
+            return _specialize_sequence(operation, context, observed)
+    return operation
+
+
+def _specialize_branch(
+    operation: PatchOperation | None, context: PatchContext, observed: bool
+) -> PatchOperation | None:
+    return _specialize(operation, context, observed) if operation else None
+
+
+def _specialize_wrapper(
+    operation: PatchOperationWrapper, context: PatchContext, observed: bool
+) -> PatchOperation:
+    if not context.is_allowed(operation.may_require, operation.may_require_any_of):
+        return PatchOperationDisabled(operation)
+    # the wrapped result is only looked at when success is not forced
+    inner = _specialize(
+        operation.operation,
+        context,
+        observed and operation.success in (Success.NORMAL, Success.INVERT),
+    )
+    if operation.success == Success.NORMAL:
+        return inner
+    return replace(
+        operation, operation=inner, may_require=None, may_require_any_of=None
+    )
+
+
+def _specialize_sequence(
+    operation: PatchOperationSequence, context: PatchContext, observed: bool
+) -> PatchOperation:
+    # a sequence stops after an unsuccessful operation; its own result is
+    # always considered successful, so the success of its last operation
+    # does not matter
+    operations: list[PatchOperation] = []
+    for i, child in enumerate(operation.operations):
+        last = i == len(operation.operations) - 1
+        child = _specialize(child, context, observed=not last)
+        known = _known_success(child)
+        if known is True:
+            continue
+        if known is False:
+            break
+        if last and isinstance(child, PatchOperationSequence):
+            operations.extend(child.operations)
+        else:
+            operations.append(child)
+    if not observed and len(operations) == 1:
+        return operations[0]
+    return replace(operation, operations=operations)
+
+
+def _known_success(operation: PatchOperation) -> bool | None:
+    """Success of an operation known to have no effect, None if it may have one"""
+    match operation:
+        case PatchOperationDisabled():
+            return True
+        case PatchOperationResolved(branch=None):
+            return False
+        case PatchOperationSequence(operations=[]):
+            # sequence results are never considered unsuccessful
+            return True
+    return None
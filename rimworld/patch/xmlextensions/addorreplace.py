@@ -6,14 +6,16 @@ from typing import Self
 from lxml import etree
 
 from rimworld.error import MalformedPatchError, NoNodesFound
-from rimworld.patch.proto import PatchOperation, PatchOperationResult
+from rimworld.patch.journal import Change
+from rimworld.patch.proto import (PatchContext, PatchOperation,
+                                  PatchOperationResult)
 from rimworld.patch.result import (PatchOperationBasicCounterResult,
                                    PatchOperationFailedResult)
 from rimworld.patch.serializers import SafeElement, ensure_value, ensure_xpath
 from rimworld.xml import ElementXpath
 
-from .base import (Compare, get_check_attributes, get_compare,
-                   get_existing_node, set_check_attributes, set_compare)
+from .base import (ChildIndex, Compare, get_check_attributes, get_compare,
+                   set_check_attributes, set_compare)
 
 
 @dataclass(frozen=True)
@@ -28,19 +30,28 @@ class PatchOperationAddOrReplace(PatchOperation):
     check_attributes: bool
     value: SafeElement
 
-    def __call__(self, xml: etree._ElementTree, *_) -> PatchOperationResult:
-        found = self.xpath.search(xml)
+    def __call__(
+        self, xml: etree._ElementTree, context: PatchContext
+    ) -> PatchOperationResult:
+        found = context.search(self.xpath, xml)
 
         if not found:
             return PatchOperationFailedResult(self, NoNodesFound(str(self.xpath)))
 
-        for node in found:
-            for v in self.value.copy():
-                existing = get_existing_node(self.compare, node, v)
+        values = self.value.materialize(len(found), context.consume_values)
+        for node, value in zip(found, values):
+            index = ChildIndex(self.compare, node)
+            for v in list(value):
+                existing = index.find(v)
                 if existing is None:
                     node.append(v)
+                    index.appended(v)
+                    context.record(self, Change.INSERTED, v)
                 else:
+                    context.record(self, Change.REPLACED, existing)
                     node.replace(existing, v)
+                    index.replaced(existing, v)
+                context.notify_changed(v)
 
         return PatchOperationBasicCounterResult(self, len(found))
 
@@ -105,3 +105,49 @@ def get_existing_node(
             if (n := node.find(value.tag)) is not None and n.text == value.text:
                 return n
     return None
+
+
+class ChildIndex:
+    """Children of a node keyed the way `get_existing_node` looks them up
+
+    Finds the same node `get_existing_node` would, without scanning the
+    children on every lookup. Children appended to the node, or replaced
+    with one found by `find`, have to be reported to keep the index up to
+    date.
+    """
+
+    def __init__(self, compare: Compare, node: etree._Element) -> None:
+        self.compare = compare
+        self.node = node
+        self._first: dict[object, etree._Element] = {}
+        for child in node:
+            self.appended(child)
+
+    def find(self, value: etree._Element) -> etree._Element | None:
+        """Check if a node exists"""
+        if not isinstance(value.tag, str):
+            return get_existing_node(self.compare, self.node, value)
+        match self.compare:
+            case Compare.NAME:
+                return self._first.get(value.tag)
+            case Compare.INNER_TEXT:
+                return self._first.get(value.text)
+            case Compare.BOTH:
+                if (
+                    n := self._first.get(value.tag)
+                ) is not None and n.text == value.text:
+                    return n
+        return None
+
+    def appended(self, child: etree._Element):
+        """Report a child appended to the node"""
+        if self.compare == Compare.INNER_TEXT or isinstance(child.tag, str):
+            self._first.setdefault(self._key(child), child)
+
+    def replaced(self, old: etree._Element, new: etree._Element):
+        """Report a child found by `find` replaced in place with `new`"""
+        # `new` matched the lookup that found `old`, so it has the same key
+        self._first[self._key(old)] = new
+
+    def _key(self, child: etree._Element) -> object:
+        return child.text if self.compare == Compare.INNER_TEXT else child.tag
@@ -6,13 +6,15 @@ from typing import Self
 from lxml import etree
 
 from rimworld.error import MalformedPatchError, NoNodesFound
-from rimworld.patch.proto import PatchOperation, PatchOperationResult
+from rimworld.patch.journal import Change
+from rimworld.patch.proto import (PatchContext, PatchOperation,
+                                  PatchOperationResult)
 from rimworld.patch.result import (PatchOperationBasicCounterResult,
                                    PatchOperationFailedResult)
 from rimworld.patch.serializers import SafeElement, ensure_value, ensure_xpath
-from rimworld.patch.xmlextensions.base import (Compare, get_check_attributes,
-                                               get_compare, get_existing_node,
-                                               get_safety_depth,
+from rimworld.patch.xmlextensions.base import (ChildIndex, Compare,
+                                               get_check_attributes,
+                                               get_compare, get_safety_depth,
                                                set_check_attributes,
                                                set_compare, set_safety_depth)
 from rimworld.xml import ElementXpath
@@ -31,34 +33,46 @@ class PatchOperationSafeAdd(PatchOperation):
     compare: Compare = Compare.NAME
     check_attributes: bool = False
 
-    def __call__(self, xml: etree._ElementTree, *_) -> PatchOperationResult:
-        found = self.xpath.search(xml)
+    def __call__(
+        self, xml: etree._ElementTree, context: PatchContext
+    ) -> PatchOperationResult:
+        found = context.search(self.xpath, xml)
 
         if not found:
             return PatchOperationFailedResult(self, NoNodesFound(str(self.xpath)))
 
-        for node in found:
-            for value in self.value.copy():
-                self._apply_recursive(node, value, self.safety_depth)
+        values = self.value.materialize(len(found), context.consume_values)
+        for node, value in zip(found, values):
+            self._apply_recursive(node, list(value), self.safety_depth, context)
 
         return PatchOperationBasicCounterResult(self, len(found))
 
-    def _apply_recursive(self, node: etree._Element, value: etree._Element, depth: int):
-        existing = get_existing_node(self.compare, node, value)
-
-        if self.check_attributes:
-            if set(node.attrib.items()) != set(value.attrib.items()):
-                existing = None
-
-        if existing is None:
-            node.append(value)
-            return
-
-        if depth == 1:
-            return
-
-        for sub_value in value:
-            self._apply_recursive(existing, sub_value, depth - 1)
+    def _apply_recursive(
+        self,
+        node: etree._Element,
+        values: list[etree._Element],
+        depth: int,
+        context: PatchContext,
+    ):
+        index = ChildIndex(self.compare, node)
+        for value in values:
+            existing = index.find(value)
+
+            if self.check_attributes:
+                if set(node.attrib.items()) != set(value.attrib.items()):
+                    existing = None
+
+            if existing is None:
+                node.append(value)
+                index.appended(value)
+                context.record(self, Change.INSERTED, value)
+                context.notify_changed(value)
+                continue
+
+            if depth == 1:
+                continue
+
+            self._apply_recursive(existing, list(value), depth - 1, context)
 
     @classmethod
     def from_xml(cls, node: etree._Element) -> Self:
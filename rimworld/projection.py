@@ -0,0 +1,183 @@
+""" Loading only the def types a caller needs
+
+`project_world` keeps the defs of some types in a loaded world, along with
+the defs they inherit from:
+
+>>> world = etree.ElementTree(etree.fromstring('''
+... <Defs>
+...     <ThingDef Name="BaseThing" Abstract="True" />
+...     <ThingDef ParentName="BaseThing"><defName>Steel</defName></ThingDef>
+...     <StatDef><defName>Mass</defName></StatDef>
+... </Defs>
+... '''))
+>>> [node.tag for node in project_world(world, {"StatDef"}).getroot()]
+['StatDef']
+
+`load_world(..., def_types=...)` gives the same result without building
+the rest of the world. A `Projection` drops defs of other types as their
+Def files are merged, and skips the patch operations which, judging from
+their xpaths, only touch defs of other types:
+
+>>> from rimworld.patch import get_operation
+>>> projection = Projection({"StatDef"})
+>>> projection.wants(get_operation(etree.fromstring('''
+... <Operation Class="PatchOperationRemove">
+...     <xpath>/Defs/ThingDef[defName="Steel"]/comps</xpath>
+... </Operation>
+... ''')))
+False
+
+When an operation may touch any def, or what it does to a def of a
+requested type may depend on a def of another type, the projection cannot
+be proven to be the same as loading everything, and `UnsafeProjectionError`
+is raised. So it is if a requested def ends up inheriting from a def of
+another type. `load_world` then loads every def type instead.
+"""
+
+from typing import Collection
+
+from lxml import etree
+
+from rimworld.error import UnsafeProjectionError
+from rimworld.inheritance import InheritanceResolver
+from rimworld.memory import DefOrigins
+from rimworld.patch import PatchOperation
+from rimworld.patch.effect import creates_defs, operation_effect
+from rimworld.patch.operations.add import PatchOperationAdd
+from rimworld.patch.operations.attributeadd import PatchOperationAttributeAdd
+from rimworld.patch.operations.attributeset import PatchOperationAttributeSet
+from rimworld.patch.operations.insert import PatchOperationInsert
+from rimworld.patch.operations.replace import PatchOperationReplace
+from rimworld.patch.operations.setname import PatchOperationSetName
+from rimworld.xml import Xpath, def_footprint
+
+__all__ = ["Projection", "project_world"]
+
+
+def project_world(
+    tree: etree._ElementTree,
+    def_types: Collection[str],
+    origins: DefOrigins | None = None,
+) -> etree._ElementTree:
+    """Remove every top-level node but the defs of `def_types` and their parents
+
+    The world is changed in place and returned. Parents are found the way
+    `InheritanceResolver` finds them with `origins`, whatever their type.
+    """
+    root = tree.getroot()
+    resolver = InheritanceResolver(tree, origins)
+    keep: set[etree._Element] = set()
+    for node in root:
+        if node.tag not in def_types:
+            continue
+        while node is not None and node not in keep:
+            keep.add(node)
+            node = resolver.parent(node)
+    for node in list(root):
+        if node not in keep:
+            root.remove(node)
+    return tree
+
+
+class Projection:
+    """Decides which defs and patch operations a load of `def_types` needs
+
+    Defs of other types are dropped, and their `Name` attributes are
+    remembered, so that `check` can tell if a requested def may inherit
+    from one of them.
+    """
+
+    def __init__(self, def_types: Collection[str]) -> None:
+        self.def_types = frozenset(def_types)
+        self.names: set[str] = set()
+
+    def filter_defs(self, defs: etree._ElementTree):
+        """Drop the top-level nodes of a Def file which are not requested"""
+        self.prune(defs.getroot())
+
+    def prune(self, root: etree._Element):
+        """Drop the top-level nodes which are not requested"""
+        for node in list(root):
+            if node.tag not in self.def_types:
+                if (name := node.get("Name")) is not None:
+                    self.names.add(name)
+                root.remove(node)
+
+    def wants(self, operation: PatchOperation) -> bool:
+        """Check if a specialized operation may change requested defs
+
+        Operations which may create requested defs are wanted too. Raises
+        `UnsafeProjectionError` if the operation cannot be applied to the
+        requested defs alone.
+        """
+        effect = operation_effect(operation)
+        if effect is None:
+            return False
+        tags: set[str | None] = set()
+        for footprint in effect.footprints:
+            if footprint.kind == "any":
+                raise UnsafeProjectionError(f"{operation} may touch any def")
+            if footprint.kind == "defs":
+                tags.add(footprint.tag)
+        created, names = self._created(effect.operations)
+        requested = any(t is None or t in self.def_types for t in tags)
+        others = any(t is None or t not in self.def_types for t in tags)
+        if others:
+            self.names.update(names)
+        if not requested and not created & self.def_types:
+            return False
+        if others and (effect.compound or created & self.def_types):
+            raise UnsafeProjectionError(
+                f"{operation} may change requested defs depending on other defs"
+            )
+        return True
+
+    def check(self, tree: etree._ElementTree):
+        """Raise `UnsafeProjectionError` if a requested def may inherit from
+        a def of another type"""
+        for node in tree.getroot():
+            if (parent := node.get("ParentName")) in self.names:
+                raise UnsafeProjectionError(
+                    f"{node.tag} may inherit from {parent} of another def type"
+                )
+
+    @staticmethod
+    def _created(
+        operations: Collection[PatchOperation],
+    ) -> tuple[set[str], set[str]]:
+        """Types and Names of the top-level defs operations may create, rename
+        or retype"""
+        tags: set[str] = set()
+        names: set[str] = set()
+        for op in operations:
+            match op:
+                case PatchOperationAdd() if (
+                    def_footprint(op.xpath.xpath).kind == "root"
+                ):
+                    values = op.value.copy()
+                case PatchOperationInsert() | PatchOperationReplace() if creates_defs(
+                    op, def_footprint(op.xpath.xpath)
+                ):
+                    values = op.value.copy()
+                case PatchOperationSetName() if _whole_defs(op.xpath):
+                    tags.add(op.name)
+                    continue
+                case PatchOperationAttributeAdd() | PatchOperationAttributeSet() if (
+                    op.attribute == "Name" and _whole_defs(op.xpath)
+                ):
+                    names.add(op.value)
+                    continue
+                case _:
+                    continue
+            for value in values:
+                if isinstance(value.tag, str):
+                    tags.add(value.tag)
+                if (name := value.get("Name")) is not None:
+                    names.add(name)
+        return tags, names
+
+
+def _whole_defs(xpath: Xpath) -> bool:
+    """Check if an xpath selects top-level defs themselves"""
+    footprint = def_footprint(xpath.xpath)
+    return footprint.kind == "defs" and footprint.whole
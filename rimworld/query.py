@@ -0,0 +1,151 @@
+""" Looking up defs of a loaded world, and extracting their fields in bulk
+
+>>> world = etree.ElementTree(etree.fromstring('''
+... <Defs>
+...     <ThingDef><defName>Steel</defName><statBases><Mass>0.5</Mass></statBases></ThingDef>
+...     <ThingDef><defName>Wood</defName></ThingDef>
+... </Defs>
+... '''))
+>>> index = DefIndex(world)
+>>> index.get("ThingDef", "Wood").findtext("defName")
+'Wood'
+>>> index.column("ThingDef", "statBases/Mass", float, numpy=False)
+array('d', [0.5, nan])
+"""
+
+from array import array
+from types import ModuleType
+from typing import Any, Iterator
+
+from lxml import etree
+
+__all__ = ["DefIndex"]
+
+
+class DefIndex:
+    """Defs of a world by type and defName
+
+    Built once over the world; changes made to the world afterwards are not
+    reflected. Abstract defs are not indexed, they never make it into the
+    game. Fields inherited from parents are only seen if the index is built
+    over a world with resolved inheritance, see `resolve_inheritance`.
+
+    If several defs of a type have the same defName, the first one is found
+    by `get`, like RimWorld keeps the first one.
+    """
+
+    def __init__(self, tree: etree._ElementTree) -> None:
+        self.tree = tree
+        self._by_type: dict[str, list[etree._Element]] = {}
+        self._by_name: dict[tuple[str, str], etree._Element] = {}
+        for node in tree.getroot():
+            if not isinstance(node.tag, str):
+                continue
+            if node.get("Abstract", "").lower() == "true":
+                continue
+            self._by_type.setdefault(node.tag, []).append(node)
+            if (def_name := node.findtext("defName")) is not None:
+                self._by_name.setdefault((node.tag, def_name), node)
+
+    def get(self, def_type: str, def_name: str) -> etree._Element | None:
+        """Find a def by its type and defName"""
+        return self._by_name.get((def_type, def_name))
+
+    def of_type(self, def_type: str) -> list[etree._Element]:
+        """Defs of a type, in document order"""
+        return self._by_type.get(def_type, [])
+
+    def types(self) -> list[str]:
+        """Types of the indexed defs"""
+        return list(self._by_type)
+
+    def names(self, def_type: str) -> list[str | None]:
+        """defNames of the defs of a type, in the order of `column` values"""
+        return [node.findtext("defName") for node in self.of_type(def_type)]
+
+    # pylint: disable-next=too-many-arguments,too-many-positional-arguments
+    def column(
+        self,
+        def_type: str,
+        path: str,
+        kind: type = str,
+        default: Any = None,
+        numpy: bool | None = None,
+    ) -> Any:
+        """Extract a field of every def of a type
+
+        `path` is relative to the def, like `statBases/MarketValue`. Values
+        are converted to `kind`, one of float, int, bool and str. Defs
+        without the field get `default`, which is NaN for float, 0 for int,
+        False for bool and None for str.
+
+        Numeric and bool columns are returned as NumPy arrays if `numpy` is
+        set, and as `array.array` if it is not. By default NumPy is used if
+        it is installed. Str columns are always lists.
+
+        Raises:
+            ValueError: If a value cannot be converted to `kind`
+            ImportError: If `numpy` is set but NumPy is not installed
+        """
+        if kind not in _KINDS:
+            raise ValueError(f"Unsupported column kind: {kind}")
+        typecode, convert, missing = _KINDS[kind]
+        if default is None:
+            default = missing
+        values = (
+            _value(node, path, convert, default) for node in self.of_type(def_type)
+        )
+        if typecode is None:
+            return list(values)
+        column = array(typecode, values)
+        np = _numpy(required=bool(numpy)) if numpy is not False else None
+        if np is None:
+            return column
+        result = np.asarray(column)
+        return result.astype(bool) if kind is bool else result
+
+    def __iter__(self) -> Iterator[etree._Element]:
+        for nodes in self._by_type.values():
+            yield from nodes
+
+    def __len__(self) -> int:
+        return sum(len(nodes) for nodes in self._by_type.values())
+
+
+def _bool(text: str) -> bool:
+    match text.lower():
+        case "true":
+            return True
+        case "false":
+            return False
+    raise ValueError(f"invalid bool: {text!r}")
+
+
+_KINDS: dict[type, tuple[str | None, Any, Any]] = {
+    float: ("d", float, float("nan")),
+    int: ("q", int, 0),
+    bool: ("b", _bool, False),
+    str: (None, str, None),
+}
+
+
+def _value(node: etree._Element, path: str, convert: Any, default: Any) -> Any:
+    text = node.findtext(path)
+    if text is None or not (text := text.strip()):
+        return default
+    try:
+        return convert(text)
+    except ValueError as e:
+        raise ValueError(
+            f"{node.tag} {node.findtext('defName')}: cannot convert {path}={text!r}"
+        ) from e
+
+
+def _numpy(required: bool) -> ModuleType | None:
+    try:
+        import numpy  # pylint: disable=import-outside-toplevel
+    except ImportError:
+        if required:
+            raise
+        return None
+    return numpy
@@ -0,0 +1,276 @@
+""" Checkpoints of a loaded world, to resume loading from or skip it """
+
+import hashlib
+import os
+import re
+import time
+from pathlib import Path
+from typing import Collection, Sequence
+
+from lxml import etree
+
+from rimworld.cache import FileFingerprint, library_version
+from rimworld.mod import Mod, ModsConfig
+from rimworld.patch import PatchContext
+
+__all__ = ["SnapshotStore", "WorldCache"]
+
+
+class SnapshotStore:
+    """Directory of world snapshots taken after applying a mod
+
+    A snapshot is keyed by everything that went into it: the active mods,
+    and the ordered list of mods applied so far with fingerprints of their
+    Def and Patch files. When only the last mods of a modlist change, loading
+    can resume from the snapshot taken right before them.
+
+    Several modlists can share a directory. Snapshots no longer matching
+    the modlist being loaded are removed once they were not used for
+    `max_age` seconds.
+
+    Args:
+        directory: Where to keep snapshots
+        mods: Package ids of mods to take a snapshot after. If None, a
+            snapshot is taken after every mod.
+        max_age: Remove snapshots of other modlists, or of earlier versions
+            of this one, unused for this many seconds. If None, they are
+            never removed.
+
+    Example:
+        snapshots = SnapshotStore(Path("snapshots"), mods=["ludeon.rimworld"])
+        world = load_world(mod_folders, modsconfig_folder, snapshots=snapshots)
+    """
+
+    # bump when what is stored in a snapshot changes
+    # bump when what is stored in a cached world changes
+    FORMAT_VERSION = 1
+    SUFFIX = ".world.xml"
+
+    def __init__(
+        self,
+        directory: Path,
+        mods: Collection[str] | None = None,
+        max_age: float | None = 7 * 24 * 3600,
+    ) -> None:
+        self.directory = directory
+        self.mods = {m.lower() for m in mods} if mods is not None else None
+        self.max_age = max_age
+        self.resumed_from = 0
+
+    def prefix_keys(
+        self,
+        context: PatchContext,
+        mod_files: Sequence[tuple[Mod, Sequence[Path], Sequence[Path]]],
+        low_memory: bool = False,
+    ) -> list[str]:
+        """Keys of snapshots taken after each mod in `mod_files`, loaded in
+        low memory mode if `low_memory` is set"""
+        hasher = hashlib.sha256()
+        _update(hasher, "SnapshotStore", self.FORMAT_VERSION, library_version())
+        if low_memory:
+            _update(hasher, "low_memory")
+        _update(hasher, *sorted(context.active_package_ids))
+        _update(hasher, *sorted(context.active_package_names))
+        result = []
+        for mod, def_files, patch_files in mod_files:
+            _update(hasher, "mod", mod.package_id, mod.path)
+            for kind, paths in (("defs", def_files), ("patches", patch_files)):
+                for path in paths:
+                    _update(hasher, kind, path, FileFingerprint.of(path))
+            result.append(hasher.copy().hexdigest())
+        return result
+
+    def wants(self, mod: Mod) -> bool:
+        """Check if a snapshot should be taken after the mod"""
+        return self.mods is None or mod.package_id in self.mods
+
+    def load_latest(self, keys: Sequence[str]) -> tuple[etree._ElementTree, int] | None:
+        """Load the snapshot for the longest prefix available
+
+        Returns the world and the number of mods it includes, or None if there
+        is no snapshot for any prefix.
+        """
+        for count in range(len(keys), 0, -1):
+            path = self._path(keys[count - 1])
+            if not path.exists():
+                continue
+            parser = etree.XMLParser(huge_tree=True)
+            try:
+                tree = etree.parse(path, parser)
+            except (OSError, etree.XMLSyntaxError):
+                continue
+            self.resumed_from = count
+            return tree, count
+        self.resumed_from = 0
+        return None
+
+    def save(self, key: str, tree: etree._ElementTree):
+        """Store a snapshot of the world"""
+        path = self._path(key)
+        if path.exists():
+            return
+        self.directory.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        tree.write(tmp_path, encoding="utf-8")
+        os.replace(tmp_path, path)
+
+    def prune(self, keys: Collection[str]):
+        """Mark snapshots keyed by `keys` as used, and remove other snapshots
+        unused for `max_age` seconds"""
+        if not self.directory.exists():
+            return
+        keep = set(keys)
+        now = time.time()
+        for path in self.directory.iterdir():
+            m = _SNAPSHOT_NAME.fullmatch(path.name)
+            if m is None:
+                continue
+            try:
+                if m.group(1) in keep:
+                    os.utime(path, (now, now))
+                elif (
+                    self.max_age is not None
+                    and now - path.stat().st_mtime > self.max_age
+                ):
+                    path.unlink(missing_ok=True)
+            except FileNotFoundError:
+                continue
+
+    def _path(self, key: str) -> Path:
+        return self.directory.joinpath(f"{key}{self.SUFFIX}")
+
+
+class WorldCache:
+    """Directory of fully loaded worlds
+
+    A world is keyed by the game version, the active mods in load order,
+    and fingerprints of every Def and Patch file applied. A world loaded
+    again with the same key is read back instead of being rebuilt.
+
+    Files are fingerprinted by modification time and size, or by a hash of
+    their content if `content_hash` is set. Entries are evicted, least
+    recently used first, once they are older than `max_age` seconds or
+    take more than `max_bytes` together.
+
+    The parser is reused across loads, so do not share a cache between
+    threads.
+
+    Example:
+        cache = WorldCache(Path("worlds"), max_bytes=2 * 1024**3)
+        world = load_world(mod_folders, modsconfig_folder, world_cache=cache)
+    """
+
+    FORMAT_VERSION = 1
+    SUFFIX = ".final.xml"
+
+    def __init__(
+        self,
+        directory: Path,
+        max_bytes: int | None = None,
+        max_age: float | None = None,
+        content_hash: bool = False,
+    ) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.content_hash = content_hash
+        self.hits = 0
+        self.misses = 0
+        self._parser = etree.XMLParser(huge_tree=True)
+
+    def key(
+        self,
+        mods_config: ModsConfig,
+        context: PatchContext,
+        mod_files: Sequence[tuple[Mod, Sequence[Path], Sequence[Path]]],
+        low_memory: bool = False,
+    ) -> str:
+        """Key of the world loaded from `mod_files`, in low memory mode if
+        `low_memory` is set"""
+        hasher = hashlib.sha256()
+        _update(hasher, "WorldCache", self.FORMAT_VERSION, library_version())
+        if low_memory:
+            _update(hasher, "low_memory")
+        _update(hasher, str(mods_config.version))
+        _update(hasher, *sorted(context.active_package_ids))
+        _update(hasher, *sorted(context.active_package_names))
+        for mod, def_files, patch_files in mod_files:
+            _update(hasher, "mod", mod.package_id, mod.path)
+            for kind, paths in (("defs", def_files), ("patches", patch_files)):
+                for path in paths:
+                    _update(hasher, kind, path, self._fingerprint(path))
+        return hasher.hexdigest()
+
+    def load(self, key: str) -> etree._ElementTree | None:
+        """Read the world stored with `key`, None if there is none"""
+        path = self._path(key)
+        try:
+            tree = etree.parse(path, self._parser)
+        except (OSError, etree.XMLSyntaxError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        path.touch()
+        return tree
+
+    def save(self, key: str, tree: etree._ElementTree):
+        """Store a world, and evict entries over the limits"""
+        path = self._path(key)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        tree.write(tmp_path, encoding="utf-8")
+        os.replace(tmp_path, path)
+        self.evict(keep=key)
+
+    def evict(self, keep: str | None = None):
+        """Remove entries older than `max_age`, then the least recently used
+        ones until they fit in `max_bytes`
+
+        The entry keyed by `keep` is never removed.
+        """
+        if not self.directory.exists():
+            return
+        entries = []
+        for path in self.directory.iterdir():
+            m = _WORLD_NAME.fullmatch(path.name)
+            if m is None or m.group(1) == keep:
+                continue
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        if keep is not None and (kept := FileFingerprint.of(self._path(keep))):
+            total += kept.size
+        now = time.time()
+        for mtime, size, path in entries:
+            expired = self.max_age is not None and now - mtime > self.max_age
+            too_big = self.max_bytes is not None and total > self.max_bytes
+            if not expired and not too_big:
+                continue
+            path.unlink(missing_ok=True)
+            total -= size
+
+    def _fingerprint(self, path: Path) -> object:
+        if not self.content_hash:
+            return FileFingerprint.of(path)
+        try:
+            with path.open("rb") as f:
+                return hashlib.file_digest(f, "sha256").hexdigest()
+        except FileNotFoundError:
+            return None
+
+    def _path(self, key: str) -> Path:
+        return self.directory.joinpath(f"{key}{self.SUFFIX}")
+
+
+_SNAPSHOT_NAME = re.compile(r"([0-9a-f]{64})" + re.escape(SnapshotStore.SUFFIX))
+_WORLD_NAME = re.compile(r"([0-9a-f]{64})" + re.escape(WorldCache.SUFFIX))
+
+
+def _update(hasher, *values):
+    for value in values:
+        hasher.update(repr(value).encode("utf-8"))
+        hasher.update(b"\0")
@@ -9,6 +9,8 @@ from typing import (Iterator, Protocol, Self, Sequence, Type, cast,
 from lxml import etree
 
 from .error import DifferentRootsError
+from .xpath import (XPATH_CACHE_SIZE, DefFootprint, DefNameIndex, XpathPlan,
+                    compile_xpath, def_footprint, plan_xpath)
 
 __all__ = [
     "XMLSerializable",
@@ -18,8 +20,18 @@ __all__ = [
     "ElementXpath",
     "AttributeXpath",
     "TextXpath",
+    "XPATH_CACHE_SIZE",
+    "compile_xpath",
+    "DefNameIndex",
+    "XpathPlan",
+    "plan_xpath",
+    "DefFootprint",
+    "def_footprint",
     "load_xml",
+    "normalize_xml",
+    "load_normalized_xml",
     "find_xmls",
+    "compact_xml",
     "merge",
     "make_element",
     "element_text_or_none",
@@ -85,6 +97,24 @@ class AttributeParent:
         self.node.set(self.attribute, value)
 
 
+def _evaluate_xpath(
+    xpath: str,
+    xml: etree._ElementTree | etree._Element,
+    index: DefNameIndex | None = None,
+) -> object:
+    if isinstance(xml, etree._ElementTree):
+        root = xml.getroot()
+        if root is not None and root.getparent() is not None:
+            # A tree wrapping a subelement: lxml evaluates absolute paths against
+            # a temporary document rooted at that subelement, keep that behavior
+            return xml.xpath(xpath)
+        if index is not None and index.root is root:
+            result = plan_xpath(xpath).search(index)
+            if result is not None:
+                return result
+    return compile_xpath(xpath)(xml)
+
+
 # T = TypeVar("T")
 
 
@@ -109,8 +139,20 @@ class Xpath[T](ABC):
         return ElementXpath(xpath)
 
     @abstractmethod
-    def search(self, xml: etree._ElementTree | etree._Element) -> list[T]:
-        """Search the xml"""
+    def search(
+        self,
+        xml: etree._ElementTree | etree._Element,
+        index: DefNameIndex | None = None,
+    ) -> list[T]:
+        """Search the xml
+
+        If `index` is given and was built for the root of `xml`, the xpath is
+        evaluated as planned by `plan_xpath`.
+        """
+
+    def explain(self) -> str:
+        """Describe how the xpath is evaluated when an index is available"""
+        return plan_xpath(self.xpath).explain()
 
     def __str__(self) -> str:
         return self.xpath
@@ -122,8 +164,12 @@ class ElementXpath(Xpath[etree._Element]):
 
     xpath: str
 
-    def search(self, xml: etree._ElementTree | etree._Element) -> list[etree._Element]:
-        result = xml.xpath(self.xpath)
+    def search(
+        self,
+        xml: etree._ElementTree | etree._Element,
+        index: DefNameIndex | None = None,
+    ) -> list[etree._Element]:
+        result = _evaluate_xpath(self.xpath, xml, index)
         assert isinstance(result, list)
         assert all(isinstance(item, etree._Element) for item in result)
         return cast(list[etree._Element], result)
@@ -136,8 +182,12 @@ class AttributeXpath(Xpath[AttributeParent]):
     xpath: str
     attribute: str
 
-    def search(self, xml: etree._ElementTree | etree._Element) -> list[AttributeParent]:
-        result = xml.xpath(self.xpath)
+    def search(
+        self,
+        xml: etree._ElementTree | etree._Element,
+        index: DefNameIndex | None = None,
+    ) -> list[AttributeParent]:
+        result = _evaluate_xpath(self.xpath, xml, index)
         assert isinstance(result, list)
         assert all(
             isinstance(item, etree._Element) and item.get(self.attribute) is not None
@@ -155,8 +205,12 @@ class TextXpath(Xpath[TextParent]):
 
     xpath: str
 
-    def search(self, xml: etree._ElementTree | etree._Element) -> list[TextParent]:
-        result = xml.xpath(self.xpath)
+    def search(
+        self,
+        xml: etree._ElementTree | etree._Element,
+        index: DefNameIndex | None = None,
+    ) -> list[TextParent]:
+        result = _evaluate_xpath(self.xpath, xml, index)
         assert isinstance(result, list)
         assert all(
             isinstance(item, etree._Element) and item.text is not None
@@ -182,6 +236,63 @@ def load_xml(filepath: Path) -> etree._ElementTree:
         return etree.ElementTree(etree.fromstring(content, parser=parser))
 
 
+def normalize_xml(filepath: Path) -> bytes:
+    """
+    Loads an XML file the same way `load_xml` does and serializes it back.
+
+    The result is well-formed and has blank text already removed, so
+    `load_normalized_xml` can parse it without any recovery. This allows the
+    expensive part of parsing to be done in another process.
+
+    Args:
+        filepath (Path): Path to the XML file.
+
+    Returns:
+        bytes: Serialized root element, or empty bytes if the file has none.
+    """
+    root = load_xml(filepath).getroot()
+    if root is None:
+        return b""
+    return etree.tostring(root, encoding="utf-8")
+
+
+def load_normalized_xml(content: bytes) -> etree._ElementTree:
+    """
+    Parses the output of `normalize_xml`.
+
+    Args:
+        content (bytes): XML returned by `normalize_xml`.
+
+    Returns:
+        etree._ElementTree: The same tree `load_xml` would return.
+    """
+    if not content:
+        return etree.ElementTree()
+    return etree.ElementTree(etree.fromstring(content))
+
+
+def compact_xml(tree: etree._ElementTree) -> etree._ElementTree:
+    """
+    Removes comments, processing instructions and whitespace-only tails, in place.
+
+    Args:
+        tree (etree._ElementTree): The tree to compact.
+
+    Returns:
+        etree._ElementTree: The same tree.
+    """
+    root = tree.getroot()
+    if root is None:
+        return tree
+    etree.strip_elements(
+        root, etree.Comment, etree.ProcessingInstruction, with_tail=False
+    )
+    for node in root.iter():
+        if node.tail is not None and not node.tail.strip():
+            node.tail = None
+    return tree
+
+
 def merge(
     merge_to: etree._ElementTree,
     merge_with: etree._ElementTree,
@@ -0,0 +1,882 @@
+""" Compiled xpaths, an index of defs and a planner using it, see `rimworld.xml` """
+
+import re
+from collections import Counter
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Iterator, cast
+
+from lxml import etree
+
+__all__ = [
+    "XPATH_CACHE_SIZE",
+    "compile_xpath",
+    "DefNameIndex",
+    "XpathPlan",
+    "plan_xpath",
+    "DefFootprint",
+    "def_footprint",
+]
+
+
+XPATH_CACHE_SIZE = 4096
+
+
+@lru_cache(maxsize=XPATH_CACHE_SIZE)
+def compile_xpath(xpath: str) -> etree.XPath:
+    """Compile an xpath expression, reusing previously compiled ones
+
+    The cache is process-wide and shared by all `Xpath` instances. It keeps up
+    to `XPATH_CACHE_SIZE` most recently used expressions. Hit and miss counters
+    are available through `compile_xpath.cache_info()`.
+
+    Example:
+        >>> compile_xpath("/Defs/ThingDef") is compile_xpath("/Defs/ThingDef")
+        True
+    """
+    return etree.XPath(xpath)
+
+
+class DefNameIndex:
+    """Index of top-level defs by their defName and Name attribute
+
+    Allows xpaths like `/Defs/ThingDef[defName="Steel"]/...` to find the def
+    without scanning every child of the root. The index is kept up to date by
+    calling `update` with every node that was inserted into the tree or whose
+    content or attributes were changed. Removed defs are dropped lazily on
+    lookup.
+
+    The index also counts top-level defs by tag, so xpaths selecting a def
+    type that is not in the tree are answered without evaluating them. The
+    count may include removed defs, but never misses a def reported with
+    `update`.
+
+    Example:
+        >>> root = etree.fromstring(
+        ...     "<Defs><ThingDef><defName>Steel</defName></ThingDef></Defs>"
+        ... )
+        >>> index = DefNameIndex(root)
+        >>> index.lookup("ThingDef", "Steel") == [root[0]]
+        True
+        >>> root[0][0].text = "Wood"
+        >>> index.update(root[0][0])
+        >>> index.lookup("ThingDef", "Steel")
+        []
+    """
+
+    def __init__(self, root: etree._Element):
+        self.root = root
+        self._defs: dict[tuple[str, str | None, str], list[etree._Element]] = {}
+        self._keys: dict[etree._Element, list[tuple[str, str | None, str]]] = {}
+        self._tags: Counter[str] = Counter()
+        self._tag_of: dict[etree._Element, str] = {}
+        for node in root:
+            self._rekey(node)
+
+    def lookup(self, tag: str | None, def_name: str) -> list[etree._Element]:
+        """Find top-level defs by defName, in document order
+
+        If `tag` is None, defs of any type are returned.
+        """
+        return self._find(("defName", tag, def_name))
+
+    def lookup_name(self, tag: str | None, name: str) -> list[etree._Element]:
+        """Find top-level defs by their Name attribute, in document order
+
+        If `tag` is None, defs of any type are returned.
+        """
+        return self._find(("Name", tag, name))
+
+    def has_tag(self, tag: str) -> bool:
+        """Check if there may be top-level defs with the tag"""
+        return self._tags[tag] > 0
+
+    def has_def_name(self, def_name: str) -> bool:
+        """Check if there are top-level defs of any type with the defName"""
+        return bool(self._find(("defName", None, def_name)))
+
+    def update(self, *nodes: etree._Element):
+        """Update defs containing the given nodes
+
+        Nodes can be top-level defs themselves or any node inside them. Nodes
+        outside of the indexed tree, as well as the root itself, are ignored.
+        """
+        tops: dict[etree._Element, None] = {}
+        for node in nodes:
+            parent = node.getparent()
+            while parent is not None and parent is not self.root:
+                node, parent = parent, parent.getparent()
+            if parent is not None:
+                tops[node] = None
+        for top in tops:
+            self._rekey(top)
+
+    def _find(self, key: tuple[str, str | None, str]) -> list[etree._Element]:
+        candidates = self._defs.get(key)
+        if not candidates:
+            return []
+        found = [c for c in candidates if c.getparent() is self.root]
+        if len(found) != len(candidates):
+            for c in candidates:
+                if c.getparent() is not self.root:
+                    self._forget(c)
+        if len(found) > 1:
+            found.sort(key=self.root.index)
+        return found
+
+    def _rekey(self, node: etree._Element):
+        self._forget(node)
+        if not isinstance(node.tag, str):
+            return
+        self._tag_of[node] = node.tag
+        self._tags[node.tag] += 1
+        values = [
+            ("defName", "".join(def_name.itertext()))
+            for def_name in node.iterchildren("defName")
+        ]
+        if (name := node.get("Name")) is not None:
+            values.append(("Name", name))
+        if not values:
+            return
+        keys = list(
+            dict.fromkeys(
+                (kind, tag, value) for kind, value in values for tag in (node.tag, None)
+            )
+        )
+        self._keys[node] = keys
+        for key in keys:
+            self._defs.setdefault(key, []).append(node)
+
+    def _forget(self, node: etree._Element):
+        if (tag := self._tag_of.pop(node, None)) is not None:
+            self._tags[tag] -= 1
+        for key in self._keys.pop(node, ()):
+            defs = self._defs[key]
+            defs.remove(node)
+            if not defs:
+                del self._defs[key]
+
+
+class _Unsupported(Exception):
+    """Raised by the xpath planner on expressions it does not handle"""
+
+
+@dataclass(frozen=True)
+class _Token:
+    kind: str
+    value: str
+    start: int
+
+
+_TOKEN = re.compile(
+    r"""\s*(?:
+        (?P<literal>"[^"]*"|'[^']*')
+      | (?P<number>\d+(?:\.\d*)?|\.\d+)
+      | (?P<op>//|/|\[|\]|\(|\)|!=|<=|>=|=|<|>|@|\*|\||,|::|\.\.|\.|\$|\+|-)
+      | (?P<name>[A-Za-z_][\w.\-]*)
+    )""",
+    re.VERBOSE,
+)
+
+
+def _tokenize(xpath: str) -> list[_Token]:
+    tokens = []
+    pos = 0
+    while pos < len(xpath):
+        if xpath[pos:].isspace():
+            break
+        if (m := _TOKEN.match(xpath, pos)) is None:
+            raise _Unsupported(f"unexpected character {xpath[pos]!r}")
+        kind = cast(str, m.lastgroup)
+        tokens.append(_Token(kind, m.group(kind), m.start(kind)))
+        pos = m.end()
+    return tokens
+
+
+@dataclass(frozen=True)
+class _Child:
+    name: str
+
+
+@dataclass(frozen=True)
+class _Attribute:
+    name: str
+
+
+@dataclass(frozen=True)
+class _Text:
+    pass
+
+
+@dataclass(frozen=True)
+class _Compare:
+    operand: _Child | _Attribute | _Text
+    value: str
+
+
+@dataclass(frozen=True)
+class _Exists:
+    operand: _Child | _Attribute | _Text
+
+
+@dataclass(frozen=True)
+class _Not:
+    expr: "_Predicate"
+
+
+@dataclass(frozen=True)
+class _And:
+    exprs: tuple["_Predicate", ...]
+
+
+@dataclass(frozen=True)
+class _Or:
+    exprs: tuple["_Predicate", ...]
+
+
+type _Predicate = _Compare | _Exists | _Not | _And | _Or
+
+
+def _text_nodes(node: etree._Element) -> Iterator[str]:
+    if node.text is not None:
+        yield node.text
+    for child in node:
+        if child.tail is not None:
+            yield child.tail
+
+
+# pylint: disable-next=too-many-return-statements
+def _matches(expr: _Predicate, node: etree._Element) -> bool:
+    match expr:
+        case _Compare(_Child(name), value):
+            return any("".join(c.itertext()) == value for c in node.iterchildren(name))
+        case _Compare(_Attribute(name), value):
+            return node.get(name) == value
+        case _Compare(_Text(), value):
+            return any(text == value for text in _text_nodes(node))
+        case _Exists(_Child(name)):
+            return node.find(name) is not None
+        case _Exists(_Attribute(name)):
+            return node.get(name) is not None
+        case _Exists(_Text()):
+            return next(_text_nodes(node), None) is not None
+        case _Not(e):
+            return not _matches(e, node)
+        case _And(exprs):
+            return all(_matches(e, node) for e in exprs)
+        case _Or(exprs):
+            return any(_matches(e, node) for e in exprs)
+    raise AssertionError(f"Unknown predicate {expr}")
+
+
+def _index_keys(expr: _Predicate) -> list[tuple[str, str]] | None:
+    """Index keys, one of which every node matching `expr` must have"""
+    match expr:
+        case _Compare(_Child("defName"), value):
+            return [("defName", value)]
+        case _Compare(_Attribute("Name"), value):
+            return [("Name", value)]
+        case _And(exprs):
+            return next((k for e in exprs if (k := _index_keys(e)) is not None), None)
+        case _Or(exprs):
+            keys = []
+            for e in exprs:
+                if (k := _index_keys(e)) is None:
+                    return None
+                keys.extend(k)
+            return list(dict.fromkeys(keys))
+    return None
+
+
+class _PredicateParser:
+    """Parse a predicate made of comparisons of children, attributes or text()
+    with literals, existence tests, `not()`, `and` and `or`"""
+
+    def __init__(self, tokens: list[_Token], pos: int):
+        self.tokens = tokens
+        self.pos = pos
+
+    def peek(self, offset: int = 0) -> _Token | None:
+        """Token at the current position"""
+        pos = self.pos + offset
+        return self.tokens[pos] if pos < len(self.tokens) else None
+
+    def is_op(self, value: str, offset: int = 0) -> bool:
+        """Check if the current token is the given operator"""
+        token = self.peek(offset)
+        return token is not None and token.kind == "op" and token.value == value
+
+    def expect_op(self, value: str):
+        """Consume an operator"""
+        if not self.is_op(value):
+            raise _Unsupported(f"expected {value!r}")
+        self.pos += 1
+
+    def parse_or(self) -> _Predicate:
+        """or-expression"""
+        exprs = [self.parse_and()]
+        while (t := self.peek()) is not None and (t.kind, t.value) == ("name", "or"):
+            self.pos += 1
+            exprs.append(self.parse_and())
+        return exprs[0] if len(exprs) == 1 else _Or(tuple(exprs))
+
+    def parse_and(self) -> _Predicate:
+        """and-expression"""
+        exprs = [self.parse_atom()]
+        while (t := self.peek()) is not None and (t.kind, t.value) == ("name", "and"):
+            self.pos += 1
+            exprs.append(self.parse_atom())
+        return exprs[0] if len(exprs) == 1 else _And(tuple(exprs))
+
+    def parse_atom(self) -> _Predicate:
+        """Parenthesized expression, not(), comparison or existence test"""
+        if self.is_op("("):
+            self.pos += 1
+            expr = self.parse_or()
+            self.expect_op(")")
+            return expr
+        token = self.peek()
+        if token is not None and token.kind == "literal":
+            self.pos += 1
+            self.expect_op("=")
+            return _Compare(self.parse_operand(), token.value[1:-1])
+        if token is not None and token.value == "not" and self.is_op("(", 1):
+            self.pos += 2
+            expr = self.parse_or()
+            self.expect_op(")")
+            return _Not(expr)
+        operand = self.parse_operand()
+        if not self.is_op("="):
+            return _Exists(operand)
+        self.pos += 1
+        token = self.peek()
+        if token is None or token.kind != "literal":
+            raise _Unsupported("only comparisons with string literals are supported")
+        self.pos += 1
+        return _Compare(operand, token.value[1:-1])
+
+    def parse_operand(self) -> _Child | _Attribute | _Text:
+        """child name, @attribute or text()"""
+        token = self.peek()
+        if token is None:
+            raise _Unsupported("unexpected end of predicate")
+        if self.is_op("@"):
+            name = self.peek(1)
+            if name is None or name.kind != "name":
+                raise _Unsupported("unsupported attribute test")
+            self.pos += 2
+            return _Attribute(name.value)
+        if token.kind != "name":
+            raise _Unsupported(f"unsupported token {token.value!r} in predicate")
+        if self.is_op("(", 1):
+            if token.value == "text" and self.is_op(")", 2):
+                self.pos += 3
+                return _Text()
+            raise _Unsupported(f"unsupported function {token.value}()")
+        if self.is_op("/", 1) or self.is_op("::", 1):
+            raise _Unsupported("paths in predicates are not supported")
+        self.pos += 1
+        return _Child(token.value)
+
+
+@dataclass(frozen=True)
+class _Step:
+    tag: str | None
+    predicates: tuple[_Predicate, ...]
+    source: str
+
+    def matches(self, node: etree._Element) -> bool:
+        """Check if node passes the step's name test and predicates"""
+        if self.tag is not None and node.tag != self.tag:
+            return False
+        return all(_matches(p, node) for p in self.predicates)
+
+
+def _parse_step(xpath: str, tokens: list[_Token], pos: int) -> tuple[_Step, int] | None:
+    """Parse a child step starting after a "/" at `pos`
+
+    Returns None if the step is not supported.
+    """
+    token = tokens[pos] if pos < len(tokens) else None
+    if token is None:
+        return None
+    if token.kind == "name":
+        tag = token.value
+    elif token.kind == "op" and token.value == "*":
+        tag = None
+    else:
+        return None
+    parser = _PredicateParser(tokens, pos + 1)
+    if parser.is_op("(") or parser.is_op("::"):
+        return None
+    predicates = []
+    while parser.is_op("["):
+        parser.pos += 1
+        try:
+            predicates.append(parser.parse_or())
+            parser.expect_op("]")
+        except _Unsupported:
+            return None
+    end = tokens[parser.pos].start if parser.pos < len(tokens) else len(xpath)
+    return _Step(tag, tuple(predicates), xpath[token.start : end].strip()), parser.pos
+
+
+_PARENT_OF_LEAF = re.compile(r"/(?:text\(\)|@[\w.\-]+)/\.\.\s*$")
+
+
+@dataclass(frozen=True)
+class XpathPlan:
+    """How an xpath is evaluated against a tree with a `DefNameIndex`
+
+    Created by `plan_xpath`. A planned xpath finds defs through the index,
+    walks the following child steps directly and hands whatever is left over
+    to lxml, relative to each node found so far. If `reason` is set, the
+    xpath is evaluated by lxml as a whole.
+
+    If `def_tag` is set, the xpath only selects nodes under top-level defs
+    with that tag, and is known to select nothing if there are none. So it
+    is with `def_names` and defs having one of those defNames.
+    """
+
+    xpath: str
+    reason: str | None = None
+    def_step: _Step | None = None
+    keys: tuple[tuple[str, str], ...] = ()
+    steps: tuple[_Step, ...] = ()
+    remainder: str = ""
+    def_tag: str | None = None
+    def_names: tuple[str, ...] = ()
+
+    @property
+    def remainder_is_local(self) -> bool:
+        """Whether the remainder only selects nodes inside its context node"""
+        local = _PARENT_OF_LEAF.sub("", self.remainder)
+        return ".." not in local and "::" not in local
+
+    def explain(self) -> str:
+        """Describe the chosen strategy
+
+        Example:
+            >>> print(plan_xpath('/Defs/ThingDef[defName="A"]/comps/li/text()/..')
+            ...     .explain())
+            index lookup: ThingDef[defName="A"] by defName
+            child iteration: comps/li
+            lxml: ./text()/..
+            >>> print(plan_xpath('/Defs/ThingDef/label').explain())
+            lxml: def step has no defName or @Name condition to look up
+            tag check: nothing is selected without ThingDef defs
+        """
+        if self.reason is not None or self.def_step is None:
+            lines = [f"lxml: {self.reason}"]
+            if self.def_tag is not None:
+                lines.append(
+                    f"tag check: nothing is selected without {self.def_tag} defs"
+                )
+            if self.def_names:
+                lines.append(
+                    "defName check: nothing is selected without "
+                    + " or ".join(self.def_names)
+                )
+            return "\n".join(lines)
+        kinds = " or ".join(dict.fromkeys(kind for kind, _ in self.keys))
+        lines = [f"index lookup: {self.def_step.source} by {kinds}"]
+        if self.steps:
+            lines.append(
+                "child iteration: " + "/".join(step.source for step in self.steps)
+            )
+        if self.remainder:
+            lines.append(f"lxml: .{self.remainder}")
+        return "\n".join(lines)
+
+    def search(self, index: DefNameIndex) -> list | None:
+        """Evaluate the plan, or return None if lxml has to be used instead"""
+        if index.root.tag != "Defs":
+            return None
+        if (self.def_tag is not None and not index.has_tag(self.def_tag)) or (
+            self.def_names and not any(map(index.has_def_name, self.def_names))
+        ):
+            return []
+        if self.def_step is None:
+            return None
+        nodes = self._find_defs(index, self.def_step)
+        for step in self.steps:
+            nodes = [
+                child
+                for node in nodes
+                for child in node.iterchildren(step.tag or "*")
+                if step.matches(child)
+            ]
+        if not self.remainder:
+            return nodes
+        if len(nodes) > 1 and not self.remainder_is_local:
+            return None
+        relative = compile_xpath(f".{self.remainder}")
+        return [item for node in nodes for item in cast(list, relative(node))]
+
+    def _find_defs(self, index: DefNameIndex, step: _Step) -> list[etree._Element]:
+        found: list[etree._Element] = []
+        for kind, value in self.keys:
+            if kind == "defName":
+                found.extend(index.lookup(step.tag, value))
+            else:
+                found.extend(index.lookup_name(step.tag, value))
+        if len(self.keys) > 1:
+            found = list(dict.fromkeys(found))
+            found.sort(key=index.root.index)
+        return [node for node in found if step.matches(node)]
+
+
+@lru_cache(maxsize=XPATH_CACHE_SIZE)
+def plan_xpath(xpath: str) -> XpathPlan:
+    """Plan how to evaluate an xpath against a tree with a `DefNameIndex`
+
+    Supported xpaths start with `/Defs/<tag or *>` and a predicate that
+    requires a defName or a Name attribute, like `[defName="A" or
+    defName="B"]` or `[@Name="Base"]`. The following child steps may use
+    predicates comparing children, attributes or `text()` with literals,
+    existence tests, `not()`, `and` and `or`. Anything after the first
+    unsupported step is left to lxml.
+
+    Example:
+        >>> plan_xpath('/Defs/*[defName="A"]/label').explain()
+        'index lookup: *[defName="A"] by defName\\nchild iteration: label'
+    """
+    try:
+        return _plan(xpath)
+    except _Unsupported as e:
+        footprint = def_footprint(xpath)
+        def_names = tuple(v for k, v in footprint.keys if k == "defName")
+        if len(def_names) != len(footprint.keys):
+            def_names = ()
+        return XpathPlan(xpath, str(e), def_tag=_def_tag(xpath), def_names=def_names)
+
+
+def _plan(xpath: str) -> XpathPlan:
+    tokens = _tokenize(xpath)
+    _check_no_union(tokens)
+    if [t.value for t in tokens[:3]] != ["/", "Defs", "/"]:
+        raise _Unsupported("xpath does not select children of /Defs")
+    if (parsed := _parse_step(xpath, tokens, 3)) is None:
+        raise _Unsupported("def step is not supported")
+    def_step, pos = parsed
+    keys = next(
+        (k for p in def_step.predicates if (k := _index_keys(p)) is not None), None
+    )
+    if keys is None:
+        raise _Unsupported("def step has no defName or @Name condition to look up")
+    steps = []
+    while pos < len(tokens) and tokens[pos].value == "/":
+        if (parsed := _parse_step(xpath, tokens, pos + 1)) is None:
+            break
+        step, pos = parsed
+        steps.append(step)
+    remainder = xpath[tokens[pos].start :].rstrip() if pos < len(tokens) else ""
+    if remainder and not remainder.startswith("/"):
+        raise _Unsupported(f"unsupported expression {remainder!r} after a step")
+    return XpathPlan(
+        xpath, None, def_step, tuple(keys), tuple(steps), remainder, def_step.tag
+    )
+
+
+def _check_no_union(tokens: list[_Token]):
+    depth = 0
+    for token in tokens:
+        if token.kind == "op" and token.value in "[(":
+            depth += 1
+        elif token.kind == "op" and token.value in "])":
+            depth -= 1
+        elif token.kind == "op" and token.value == "|" and depth == 0:
+            raise _Unsupported("unions are not supported")
+
+
+_PATH_OPS = {"/", "//", "@", "::", ".", "..", "*"}
+
+
+def _def_tag(xpath: str) -> str | None:
+    """Tag of the defs a location path starting with `/Defs/<tag>` selects under
+
+    Returns None if the xpath is not such a path, for example if it is a union.
+    """
+    try:
+        tokens = _tokenize(xpath)
+    except _Unsupported:
+        return None
+    if [t.value for t in tokens[:3]] != ["/", "Defs", "/"] or len(tokens) < 4:
+        return None
+    if tokens[3].kind != "name" or (len(tokens) > 4 and tokens[4].value in ("(", "::")):
+        return None
+    depth = 0
+    for previous, token in zip(tokens[3:], tokens[4:]):
+        if token.kind == "op" and token.value in "[(":
+            depth += 1
+        elif token.kind == "op" and token.value in "])":
+            depth -= 1
+        elif depth == 0 and not _continues_path(previous, token):
+            return None
+    return tokens[3].value
+
+
+def _continues_path(previous: _Token, token: _Token) -> bool:
+    """Check if a token outside of predicates continues a location path"""
+    if token.kind == "name":
+        return previous.value in ("/", "//", "@", "::")
+    if token.kind != "op" or token.value not in _PATH_OPS:
+        return False
+    return token.value != "*" or previous.value in ("/", "//", "::")
+
+
+@dataclass(frozen=True)
+class DefFootprint:
+    """Top-level defs an xpath may select nodes in, see `def_footprint`
+
+    `kind` is one of:
+    - "none": nothing, the xpath starts with a root other than Defs
+    - "root": the Defs root itself
+    - "defs": nodes inside top-level defs tagged `tag` (any tag if None)
+      having one of the defNames or Name attributes in `keys`, if there are
+      any. If `whole` is set, the xpath selects the defs themselves.
+    - "any": the xpath may select or depend on anything
+    """
+
+    kind: str
+    tag: str | None = None
+    keys: tuple[tuple[str, str], ...] = ()
+    whole: bool = False
+
+
+@lru_cache(maxsize=XPATH_CACHE_SIZE)
+# pylint: disable-next=too-many-return-statements
+def def_footprint(xpath: str) -> DefFootprint:
+    """Find the top-level defs an xpath may select nodes in
+
+    Only nodes of those defs decide what the xpath selects, so it can be
+    evaluated against a tree holding nothing but them.
+
+    Example:
+        >>> def_footprint('/Defs/ThingDef[defName="A"]/comps')
+        DefFootprint(kind='defs', tag='ThingDef', keys=(('defName', 'A'),), whole=False)
+        >>> def_footprint('/Defs/ThingDef[tags/li="A"]').tag
+        'ThingDef'
+        >>> def_footprint('/Defs/ThingDef[1]/comps').kind
+        'any'
+    """
+    try:
+        tokens = _tokenize(xpath)
+        _check_no_union(tokens)
+    except _Unsupported:
+        return DefFootprint("any")
+    values = [t.value for t in tokens]
+    if values == ["/", "Defs"]:
+        return DefFootprint("root")
+    if (
+        values[:1] == ["/"]
+        and len(tokens) > 1
+        and tokens[1].kind == "name"
+        and values[1] != "Defs"
+        and values[2:3] not in (["("], ["::"])
+    ):
+        return DefFootprint("none")
+    if values[:3] != ["/", "Defs", "/"]:
+        return DefFootprint("any")
+    if (parsed := _parse_step(xpath, tokens, 3)) is not None:
+        def_step, pos = parsed
+        tag = def_step.tag
+        keys = next(
+            (k for p in def_step.predicates if (k := _index_keys(p)) is not None), []
+        )
+    elif (local := _local_step(tokens, 3)) is not None:
+        tag, keys, pos = local
+    else:
+        return DefFootprint("any")
+    if (depth := _depth_below(tokens[pos:])) is None:
+        return DefFootprint("any")
+    return DefFootprint("defs", tag, tuple(keys), whole=depth == 0)
+
+
+def _local_step(
+    tokens: list[_Token], pos: int
+) -> tuple[str | None, list[tuple[str, str]], int] | None:
+    """Parse a child step whose predicates `_parse_step` does not support
+
+    Returns the tag of the step, the index keys found by `_required_keys`
+    and the position after it, or None unless every predicate is a boolean
+    test of the node itself, which does not depend on its position among
+    its siblings.
+    """
+    token = tokens[pos] if pos < len(tokens) else None
+    if token is None or not (token.kind == "name" or token.value == "*"):
+        return None
+    tag = token.value if token.kind == "name" else None
+    keys = None
+    pos += 1
+    if pos < len(tokens) and tokens[pos].value in ("(", "::"):
+        return None
+    while pos < len(tokens) and tokens[pos].value == "[":
+        if (end := _closing(tokens, pos)) is None:
+            return None
+        if _depth_below(tokens[pos : end + 1]) != 0 or not _is_boolean_test(
+            tokens[pos + 1 : end]
+        ):
+            return None
+        if keys is None:
+            keys = _required_keys(tokens[pos + 1 : end])
+        pos = end + 1
+    return tag, keys or [], pos
+
+
+def _required_keys(tokens: list[_Token]) -> list[tuple[str, str]] | None:
+    """Index keys, one of which every node matching a predicate must have
+
+    Found in the first operand of the top-level `and` of the predicate that
+    `_PredicateParser` supports, or in the whole predicate if it is an `or`.
+    """
+    operands: list[list[_Token]] = [[]]
+    nesting = 0
+    previous = None
+    for token in tokens:
+        if token.kind == "op" and token.value in "[(":
+            nesting += 1
+        elif token.kind == "op" and token.value in "])":
+            nesting -= 1
+        elif (
+            nesting == 0
+            and token.value in ("and", "or")
+            and previous is not None
+            and (previous.kind != "op" or previous.value in (")", "]", ".", ".."))
+        ):
+            if token.value == "or":
+                operands = [tokens]
+                break
+            operands.append([])
+            previous = token
+            continue
+        operands[-1].append(token)
+        previous = token
+    for operand in operands:
+        parser = _PredicateParser(operand, 0)
+        try:
+            expr = parser.parse_or()
+        except _Unsupported:
+            continue
+        if parser.pos == len(operand) and (keys := _index_keys(expr)) is not None:
+            return keys
+    return None
+
+
+def _closing(tokens: list[_Token], pos: int) -> int | None:
+    """Position of the bracket or parenthesis closing the one at `pos`"""
+    opening = tokens[pos].value
+    closing = "]" if opening == "[" else ")"
+    nesting = 0
+    for i in range(pos, len(tokens)):
+        if tokens[i].kind != "op":
+            continue
+        if tokens[i].value == opening:
+            nesting += 1
+        elif tokens[i].value == closing:
+            nesting -= 1
+            if nesting == 0:
+                return i
+    return None
+
+
+_COMPARISONS = ("=", "!=", "<", ">", "<=", ">=")
+_BOOLEAN_FUNCTIONS = ("not", "contains", "starts-with", "boolean", "true", "false")
+_NODE_TESTS = ("text", "node")
+
+
+def _is_boolean_test(tokens: list[_Token]) -> bool:
+    """Check if a predicate is a boolean expression which does not use the
+    position of the node it filters, variables or id()
+
+    Comparisons, `and`, `or`, boolean functions and paths are boolean. The
+    path tests themselves are left to `_depth_below`.
+    """
+    if not tokens:
+        return False
+    brackets = parens = 0
+    path = True
+    previous = None
+    for i, token in enumerate(tokens):
+        call = i + 1 < len(tokens) and tokens[i + 1].value == "("
+        if token.value == "$" or (call and token.value == "id"):
+            return False
+        if call and brackets == 0 and token.value in ("position", "last"):
+            return False
+        top = brackets == 0 and parens == 0
+        if top and token.kind == "op" and token.value in _COMPARISONS:
+            return True
+        if (
+            top
+            and token.value in ("and", "or")
+            and previous is not None
+            and (previous.kind != "op" or previous.value in (")", "]", ".", ".."))
+        ):
+            return True
+        if top and path:
+            path = _continues_location_path(previous, token, call)
+        if token.value in "[(" and token.kind == "op":
+            brackets += token.value == "["
+            parens += token.value == "("
+        elif token.value in "])" and token.kind == "op":
+            brackets -= token.value == "]"
+            parens -= token.value == ")"
+        previous = token
+    return path or (
+        tokens[0].value in _BOOLEAN_FUNCTIONS
+        and len(tokens) > 1
+        and tokens[1].value == "("
+        and _closing(tokens, 1) == len(tokens) - 1
+    )
+
+
+def _continues_location_path(
+    previous: _Token | None, token: _Token, call: bool
+) -> bool:
+    """Check if a token at the top level of a predicate continues a relative
+    location path"""
+    if token.kind == "name":
+        return not call or token.value in _NODE_TESTS
+    if token.kind != "op":
+        return False
+    if token.value in ("*", "@", ".", ".."):
+        return previous is None or previous.value in ("/", "//", "@")
+    if token.value == "(":
+        return previous is not None and previous.value in _NODE_TESTS
+    return token.value in ("/", "//", "[")
+
+
+def _depth_below(tokens: list[_Token]) -> int | None:
+    """Depth of the nodes a path following a def step selects, relative to
+    the def, or None if the path may look outside of the def"""
+    depth = nesting = 0
+    previous = None
+    for token in tokens:
+        if token.value == "::":
+            return None
+        if token.kind == "op" and token.value in "[(":
+            nesting += 1
+        elif token.kind == "op" and token.value in "])":
+            nesting -= 1
+        elif nesting > 0:
+            # relative paths in predicates start at the node being filtered
+            if token.value == ".." or (
+                token.value in ("/", "//")
+                and previous is not None
+                and previous.kind != "name"
+                and previous.value not in ("*", ")", "]", ".")
+            ):
+                return None
+        elif previous is None and token.value not in ("/", "//"):
+            return None
+        elif previous is not None and not _continues_path(previous, token):
+            return None
+        elif previous is not None and previous.value in ("/", "//"):
+            if token.value == "..":
+                depth -= 1
+            elif token.value != ".":
+                depth += 1
+            if depth < 0:
+                return None
+        previous = token
+    return depth
@@ -0,0 +1,330 @@
+""" Tests for rimworld.incremental """
+
+import random
+from pathlib import Path
+
+import pytest
+
+from rimworld import load_world
+from rimworld.error import IncrementalRebuildError
+from rimworld.incremental import DependencyGraph
+from rimworld.snapshot import SnapshotStore, WorldCache
+from rimworld.xml import xml_to_string
+
+FILES = {
+    "Base/About/About.xml": """<ModMetaData>
+      <packageId>test.base</packageId><name>Base</name><author>Tester</author>
+      <supportedVersions><li>1.5</li></supportedVersions>
+    </ModMetaData>""",
+    "Base/Defs/Things.xml": """<Defs>
+      <ThingDef Name="BaseThing" Abstract="True"><category>Item</category></ThingDef>
+      <ThingDef ParentName="BaseThing"><defName>Steel</defName><mass>1</mass></ThingDef>
+      <!-- a comment -->
+      <ThingDef ParentName="BaseThing"><defName>Wood</defName><mass>2</mass></ThingDef>
+    </Defs>""",
+    "Base/Defs/Stats.xml": """<Defs>
+      <StatDef><defName>Beauty</defName><label>beauty</label></StatDef>
+    </Defs>""",
+    "Base/Patches/Base.xml": """<Patch>
+      <Operation Class="PatchOperationAdd">
+        <xpath>/Defs/ThingDef[defName="Wood"]</xpath>
+        <value><label>wood</label></value>
+      </Operation>
+    </Patch>""",
+    "Addon/About/About.xml": """<ModMetaData>
+      <packageId>test.addon</packageId><name>Addon</name><author>Tester</author>
+      <supportedVersions><li>1.5</li></supportedVersions>
+    </ModMetaData>""",
+    "Addon/Defs/Recipes.xml": """<Defs>
+      <RecipeDef><defName>Smelt</defName><products><Steel>1</Steel></products></RecipeDef>
+    </Defs>""",
+    "Addon/Patches/Values.xml": """<Patch>
+      <Operation Class="PatchOperationReplace">
+        <xpath>/Defs/ThingDef[defName="Steel"]/mass</xpath>
+        <value><mass>5</mass></value>
+      </Operation>
+      <Operation Class="PatchOperationAdd">
+        <xpath>/Defs/ThingDef/label/..</xpath>
+        <value><labeled /></value>
+      </Operation>
+    </Patch>""",
+    "Addon/Patches/Conditional.xml": """<Patch>
+      <Operation Class="PatchOperationConditional">
+        <xpath>/Defs/ThingDef[defName="Steel"]/mass[text()="5"]</xpath>
+        <match Class="PatchOperationAdd">
+          <xpath>/Defs/RecipeDef[defName="Smelt"]/products</xpath>
+          <value><Slag>1</Slag></value>
+        </match>
+      </Operation>
+      <Operation Class="PatchOperationInsert">
+        <xpath>/Defs/StatDef[defName="Beauty"]</xpath>
+        <value><StatDef><defName>Ugliness</defName></StatDef></value>
+      </Operation>
+      <Operation Class="PatchOperationAdd">
+        <xpath>/Defs</xpath>
+        <value><ThingDef ParentName="BaseThing"><defName>Gold</defName></ThingDef></value>
+      </Operation>
+    </Patch>""",
+    "Config/ModsConfig.xml": """<ModsConfigData>
+      <version>1.5.4104 rev435</version>
+      <activeMods><li>test.base</li><li>test.addon</li></activeMods>
+      <knownExpansions />
+    </ModsConfigData>""",
+}
+
+
+@pytest.fixture(name="mods_folder")
+def fixture_mods_folder(tmp_path: Path) -> Path:
+    """A small modlist, with ModsConfig.xml in Config"""
+    for relative, content in FILES.items():
+        path = tmp_path.joinpath(relative)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content)
+    return tmp_path
+
+
+@pytest.fixture(name="graph")
+def fixture_graph(mods_folder: Path) -> DependencyGraph:
+    """Dependencies recorded while loading the modlist"""
+    graph = DependencyGraph()
+    world = load(mods_folder, dependencies=graph)
+    assert graph.tree is world
+    return graph
+
+
+def load(mods_folder: Path, **kwargs):
+    """Load the modlist"""
+    return load_world(
+        [mods_folder], mods_folder / "Config" / "ModsConfig.xml", **kwargs
+    )
+
+
+def edit(path: Path, before: str, after: str):
+    """Replace text in a file"""
+    content = path.read_text()
+    assert before in content
+    path.write_text(content.replace(before, after))
+
+
+def test_records(mods_folder: Path, graph: DependencyGraph):
+    """Operations record the defs they searched and changed"""
+    values = mods_folder / "Addon" / "Patches" / "Values.xml"
+    things = mods_folder / "Base" / "Defs" / "Things.xml"
+    assert graph.records[(values, 0)].reads == {(things, -1, 1)}
+    assert graph.records[(values, 0)].writes == {(things, -1, 1)}
+    assert graph.records[(values, 1)].reads == {(things, -1, 3)}
+    assert xml_to_string(graph.tree) == xml_to_string(load(mods_folder))
+
+
+def test_rebuild_nothing_changed(graph: DependencyGraph):
+    """Nothing is replayed without changes"""
+    graph.rebuild([], verify=True)
+    assert graph.last_rebuild is not None
+    assert (graph.last_rebuild.defs, graph.last_rebuild.operations) == (0, 0)
+
+
+@pytest.mark.parametrize(
+    "relative,old,new,operations",
+    [
+        # the replaced value no longer passes the conditional
+        ("Addon/Patches/Values.xml", "<mass>5</mass>", "<mass>6</mass>", 4),
+        ("Addon/Patches/Conditional.xml", "<Slag>", "<Ash>", 5),
+        ("Addon/Patches/Conditional.xml", "Ugliness", "Plainness", 5),
+        ("Base/Patches/Base.xml", "<label>wood</label>", "<mass>3</mass>", 2),
+        ("Base/Defs/Stats.xml", "<label>beauty</label>", "<label>pretty</label>", 1),
+        # a new def appears between existing ones
+        (
+            "Base/Defs/Things.xml",
+            "<!-- a comment -->",
+            "<ThingDef><defName>Clay</defName><label>clay</label></ThingDef>",
+            4,
+        ),
+        (
+            "Base/Defs/Things.xml",
+            "<defName>Steel</defName>",
+            "<defName>Iron</defName>",
+            4,
+        ),
+        # top-level nodes created by operations keep their place
+        (
+            "Addon/Patches/Conditional.xml",
+            '<Operation Class="PatchOperationInsert">',
+            '<Operation Class="PatchOperationInsert"><order>Append</order>',
+            5,
+        ),
+        ("Addon/Patches/Values.xml", '"Steel"]/mass</xpath>', '"Steel"]</xpath>', 4),
+    ],
+)
+# pylint: disable-next=too-many-arguments,too-many-positional-arguments
+def test_rebuild(
+    mods_folder: Path,
+    graph: DependencyGraph,
+    relative: str,
+    old: str,
+    new: str,
+    operations: int,
+):
+    """Only operations reaching the changed defs are replayed"""
+    path = mods_folder / relative
+    edit(path, old, new)
+    world = graph.rebuild([path], verify=True)
+    assert graph.last_rebuild is not None
+    assert graph.last_rebuild.reason is None
+    assert graph.last_rebuild.operations == operations
+    assert xml_to_string(world) == xml_to_string(load(mods_folder))
+
+    edit(path, new, old)
+    graph.rebuild([path], verify=True)
+
+
+def test_rebuild_any_def(mods_folder: Path, graph: DependencyGraph):
+    """The whole world is rebuilt if an operation may touch any def"""
+    path = mods_folder / "Base" / "Patches" / "Base.xml"
+    edit(path, 'ThingDef[defName="Wood"]', "*[last()]")
+    graph.rebuild([path], verify=True)
+    assert graph.last_rebuild is not None
+    assert graph.last_rebuild.reason is not None
+    assert "may change any def" in graph.last_rebuild.reason
+
+    edit(path, "<label>wood</label>", "<label>lumber</label>")
+    graph.rebuild([path], verify=True)
+    assert graph.last_rebuild.reason is not None
+
+
+def test_rebuild_created_def(mods_folder: Path):
+    """Defs a changed operation now creates are found by later operations"""
+    base = mods_folder / "Base" / "Patches" / "Base.xml"
+    edit(
+        base,
+        "</Patch>",
+        """<Operation Class="PatchOperationAdd"><xpath>/Defs</xpath>
+          <value><ThingDef><defName>Lead</defName><mass>2</mass></ThingDef></value>
+        </Operation></Patch>""",
+    )
+    edit(
+        mods_folder / "Addon" / "Patches" / "Values.xml",
+        "</Patch>",
+        """<Operation Class="PatchOperationReplace">
+          <xpath>/Defs/ThingDef[defName="Tin"]/mass</xpath>
+          <value><mass>9</mass></value>
+        </Operation></Patch>""",
+    )
+    graph = DependencyGraph()
+    load(mods_folder, dependencies=graph)
+    edit(base, "<defName>Lead</defName>", "<defName>Tin</defName>")
+    world = graph.rebuild([base], verify=True)
+    assert world.xpath('/Defs/ThingDef[defName="Tin"]/mass/text()') == ["9"]
+
+
+def test_rebuild_verify(mods_folder: Path, graph: DependencyGraph):
+    """Verification catches changes the graph was not told about"""
+    edit(mods_folder / "Addon" / "Defs" / "Recipes.xml", "Smelt", "Melt")
+    with pytest.raises(IncrementalRebuildError):
+        graph.rebuild([], verify=True)
+
+
+def test_dependencies_with_snapshots(mods_folder: Path, tmp_path: Path):
+    """Dependencies are only recorded for a complete load"""
+    with pytest.raises(ValueError):
+        load(
+            mods_folder,
+            snapshots=SnapshotStore(tmp_path / "snapshots"),
+            dependencies=DependencyGraph(),
+        )
+    with pytest.raises(ValueError):
+        load(
+            mods_folder,
+            world_cache=WorldCache(tmp_path / "worlds"),
+            dependencies=DependencyGraph(),
+        )
+
+
+NAMES = ("Steel", "Wood", "Gold", "Iron")
+
+
+def _random_def(rng: random.Random) -> str:
+    tag = rng.choice(("ThingDef", "ThingDef", "StatDef"))
+    return (
+        f"<{tag}><defName>{rng.choice(NAMES)}</defName>"
+        f"<mass>{rng.randint(1, 9)}</mass></{tag}>"
+    )
+
+
+def _random_operation(rng: random.Random) -> str:
+    target = f'/Defs/{rng.choice(("ThingDef", "*"))}[defName="{rng.choice(NAMES)}"]'
+    value = f"<mass>{rng.randint(1, 9)}</mass>"
+    operations = [
+        ("PatchOperationAdd", f"<xpath>{target}</xpath><value>{value}</value>"),
+        (
+            "PatchOperationReplace",
+            f"<xpath>{target}/mass</xpath><value>{value}</value>",
+        ),
+        ("PatchOperationRemove", f"<xpath>{target}/mass</xpath>"),
+        (
+            "PatchOperationReplace",
+            f"<xpath>{target}/defName</xpath>"
+            f"<value><defName>{rng.choice(NAMES)}</defName></value>",
+        ),
+        (
+            "PatchOperationAdd",
+            f"<xpath>/Defs</xpath><value>{_random_def(rng)}</value>",
+        ),
+        (
+            "PatchOperationInsert",
+            f"<xpath>{target}</xpath><value>{_random_def(rng)}</value>",
+        ),
+        (
+            "PatchOperationConditional",
+            f"<xpath>{target}/mass</xpath>"
+            f'<match Class="PatchOperationAdd"><xpath>/Defs/*[defName='
+            f'"{rng.choice(NAMES)}"]</xpath><value><matched /></value></match>',
+        ),
+    ]
+    name, content = rng.choice(operations)
+    return f'<Operation Class="{name}">{content}</Operation>'
+
+
+def _write_random_modlist(folder: Path, rng: random.Random) -> list[Path]:
+    """Three mods with a Def file and a Patch file each, returns their files"""
+    files = []
+    package_ids = []
+    for i in range(3):
+        package_ids.append(f"test.random{i}")
+        mod = folder / f"Mod{i}"
+        mod.joinpath("About").mkdir(parents=True)
+        mod.joinpath("About", "About.xml").write_text(
+            f"<ModMetaData><packageId>test.random{i}</packageId><name>Random {i}"
+            "</name><author>Tester</author>"
+            "<supportedVersions><li>1.5</li></supportedVersions></ModMetaData>"
+        )
+        for kind, make in (("Defs", _random_def), ("Patches", _random_operation)):
+            path = mod / kind / f"{kind}.xml"
+            path.parent.mkdir()
+            root = "Defs" if kind == "Defs" else "Patch"
+            items = "".join(make(rng) for _ in range(rng.randint(1, 4)))
+            path.write_text(f"<{root}>{items}</{root}>")
+            files.append(path)
+    folder.joinpath("Config").mkdir()
+    folder.joinpath("Config", "ModsConfig.xml").write_text(
+        "<ModsConfigData><version>1.5.4104 rev435</version><activeMods>"
+        + "".join(f"<li>{p}</li>" for p in package_ids)
+        + "</activeMods><knownExpansions /></ModsConfigData>"
+    )
+    return files
+
+
+@pytest.mark.parametrize("seed", range(100))
+def test_rebuild_random(tmp_path: Path, seed: int):
+    """Rebuilding after random edits gives the same world as a full load"""
+    rng = random.Random(seed)
+    files = _write_random_modlist(tmp_path, rng)
+    graph = DependencyGraph()
+    load(tmp_path, dependencies=graph)
+    for _ in range(3):
+        path = rng.choice(files)
+        root = "Defs" if path.parent.name == "Defs" else "Patch"
+        make = _random_def if root == "Defs" else _random_operation
+        items = "".join(make(rng) for _ in range(rng.randint(1, 4)))
+        path.write_text(f"<{root}>{items}</{root}>")
+        world = graph.rebuild([path])
+        assert xml_to_string(world) == xml_to_string(load(tmp_path))
@@ -0,0 +1,137 @@
+""" Tests for rimworld.inheritance """
+
+import pytest
+from lxml import etree
+
+from rimworld.inheritance import InheritanceResolver, resolve_inheritance
+from rimworld.memory import DefOrigins
+from rimworld.xml import assert_xml_eq, xml_to_string
+
+PARSER = etree.XMLParser(remove_blank_text=True)
+
+
+def make_world(defs: str) -> etree._ElementTree:
+    """A world holding the given defs"""
+    return etree.ElementTree(etree.fromstring(f"<Defs>{defs}</Defs>", PARSER))
+
+
+def make_defs(defs: str) -> etree._Element:
+    """Expected defs"""
+    return etree.fromstring(f"<Defs>{defs}</Defs>", PARSER)
+
+
+@pytest.mark.parametrize(
+    "parent,child,expected",
+    [
+        (
+            "<mass>1</mass><label>base</label>",
+            "<mass>2</mass>",
+            "<mass>2</mass><label>base</label>",
+        ),
+        (
+            "<tags><li>A</li></tags>",
+            "<tags><li>B</li></tags>",
+            "<tags><li>A</li><li>B</li></tags>",
+        ),
+        (
+            "<tags><li>A</li></tags>",
+            '<tags Inherit="False"><li>B</li></tags>',
+            "<tags><li>B</li></tags>",
+        ),
+        (
+            "<stats><Beauty>1</Beauty></stats>",
+            "<stats><Mass>2</Mass></stats>",
+            "<stats><Beauty>1</Beauty><Mass>2</Mass></stats>",
+        ),
+        (
+            "<graphic><path>a</path></graphic>",
+            "<graphic>b</graphic>",
+            "<graphic>b</graphic>",
+        ),
+        (
+            '<graphic Class="A"><path>a</path></graphic>',
+            '<graphic Class="B" />',
+            '<graphic Class="B"><path>a</path></graphic>',
+        ),
+    ],
+)
+def test_merge_rules(parent: str, child: str, expected: str):
+    """Children overwrite their parent the way RimWorld does it"""
+    world = make_world(
+        f'<ThingDef Name="Base" Abstract="True">{parent}</ThingDef>'
+        f'<ThingDef ParentName="Base">{child}</ThingDef>'
+    )
+    assert_xml_eq(
+        resolve_inheritance(world).getroot(),
+        make_defs(f'<ThingDef ParentName="Base">{expected}</ThingDef>'),
+    )
+
+
+def test_chain():
+    """Grandparents are resolved first, and their results are reused"""
+    world = make_world(
+        '<ThingDef Name="A" Abstract="True"><a>1</a><tags><li>A</li></tags></ThingDef>'
+        '<ThingDef Name="B" ParentName="A"><b>1</b><tags><li>B</li></tags></ThingDef>'
+        '<ThingDef ParentName="B"><defName>C</defName><a>2</a></ThingDef>'
+    )
+    original = xml_to_string(world)
+    resolver = InheritanceResolver(world)
+    c = resolver.resolve(world.getroot()[2])
+    b = resolver.resolve(world.getroot()[1])
+    assert resolver.resolve(world.getroot()[1]) is b
+    assert_xml_eq(
+        c,
+        etree.fromstring(
+            '<ThingDef ParentName="B"><a>2</a><tags><li>A</li><li>B</li></tags>'
+            "<b>1</b><defName>C</defName></ThingDef>",
+            PARSER,
+        ),
+    )
+    assert xml_to_string(world) == original
+    assert [n.get("Name") for n in resolver.resolve_all().getroot()] == ["B", None]
+
+
+def test_last_name_wins():
+    """The parent with a duplicated Name is the def loaded last"""
+    world = make_world(
+        '<ThingDef Name="Base"><a>1</a></ThingDef>'
+        '<ThingDef Name="Base"><a>2</a></ThingDef>'
+        '<ThingDef ParentName="Base"><defName>C</defName></ThingDef>'
+    )
+    resolved = InheritanceResolver(world).resolve(world.getroot()[2])
+    assert resolved.findtext("a") == "2"
+
+
+def test_same_mod_name_wins():
+    """With origins, the parent is the def of the child's mod, or the first"""
+    world = make_world("")
+    origins = DefOrigins()
+    for mod, defs in [
+        ("a", '<ThingDef Name="Base"><a>1</a></ThingDef>'),
+        ("b", '<ThingDef Name="Base"><a>2</a></ThingDef>'),
+        ("c", '<ThingDef Name="Base"><a>3</a></ThingDef>'),
+        ("b", '<ThingDef ParentName="Base"><defName>B</defName></ThingDef>'),
+        ("d", '<ThingDef ParentName="Base"><defName>D</defName></ThingDef>'),
+    ]:
+        world.getroot().extend(make_defs(defs))
+        origins.claim(world.getroot(), mod)
+    resolved = resolve_inheritance(world, origins).getroot()
+    assert [n.findtext("a") for n in resolved[3:]] == ["2", "1"]
+
+
+@pytest.mark.parametrize(
+    "defs",
+    [
+        '<ThingDef ParentName="Missing"><defName>A</defName></ThingDef>',
+        '<ThingDef Name="A" ParentName="B"><defName>A</defName></ThingDef>'
+        '<ThingDef Name="B" ParentName="A"><defName>B</defName></ThingDef>',
+    ],
+)
+def test_broken_parents(defs: str, caplog: pytest.LogCaptureFixture):
+    """Missing and cyclic parents are reported, and ignored"""
+    world = make_world(defs)
+    resolved = resolve_inheritance(world)
+    assert [n.findtext("defName") for n in resolved.getroot()] == [
+        n.findtext("defName") for n in world.getroot()
+    ]
+    assert caplog.records
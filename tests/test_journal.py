@@ -0,0 +1,172 @@
+""" rimworld.patch.journal """
+
+import pytest
+from lxml import etree
+
+from rimworld.patch import Change, MutationJournal, PatchContext, get_operation
+
+DEFS = """<Defs>
+    <ThingDef Name="Base"><defName>Steel</defName><label>steel</label><comps/></ThingDef>
+    <ThingDef><defName>Wood</defName><label>wood</label></ThingDef>
+</Defs>"""
+
+
+def apply(operation: str, journal: MutationJournal) -> etree._ElementTree:
+    """Apply an operation to DEFS, recording changes in the journal"""
+    parser = etree.XMLParser(remove_blank_text=True)
+    xml = etree.ElementTree(etree.fromstring(DEFS, parser))
+    context = PatchContext(set(), set(), journal=journal)
+    get_operation(etree.fromstring(operation, parser))(xml, context)
+    return xml
+
+
+@pytest.mark.parametrize(
+    ("operation", "expected"),
+    [
+        (
+            '<Operation Class="PatchOperationAdd"><xpath>/Defs/ThingDef/comps</xpath>'
+            "<value><li>a</li></value></Operation>",
+            [
+                (
+                    Change.INSERTED,
+                    "/Defs/ThingDef[1]/comps/li",
+                    "Steel",
+                    None,
+                    None,
+                    None,
+                )
+            ],
+        ),
+        (
+            '<Operation Class="PatchOperationAdd"><xpath>/Defs/ThingDef[defName="Wood"]'
+            "/label</xpath><value>s</value></Operation>",
+            [(Change.TEXT, "/Defs/ThingDef[2]/label", "Wood", None, "wood", "woods")],
+        ),
+        (
+            '<Operation Class="PatchOperationInsert"><xpath>/Defs/ThingDef/label</xpath>'
+            "<value><description>d</description></value></Operation>",
+            [
+                (
+                    Change.INSERTED,
+                    "/Defs/ThingDef[1]/description",
+                    "Steel",
+                    None,
+                    None,
+                    None,
+                ),
+                (
+                    Change.INSERTED,
+                    "/Defs/ThingDef[2]/description",
+                    "Wood",
+                    None,
+                    None,
+                    None,
+                ),
+            ],
+        ),
+        (
+            '<Operation Class="PatchOperationRemove"><xpath>/Defs/ThingDef[2]</xpath>'
+            "</Operation>",
+            [(Change.REMOVED, "/Defs/ThingDef[2]", "Wood", None, None, None)],
+        ),
+        (
+            '<Operation Class="PatchOperationReplace"><xpath>/Defs/ThingDef/label/text()'
+            "</xpath><value>x</value></Operation>",
+            [
+                (Change.TEXT, "/Defs/ThingDef[1]/label", "Steel", None, "steel", "x"),
+                (Change.TEXT, "/Defs/ThingDef[2]/label", "Wood", None, "wood", "x"),
+            ],
+        ),
+        (
+            '<Operation Class="PatchOperationReplace"><xpath>/Defs/ThingDef[1]/label</xpath>'
+            "<value><label>a</label><labelShort>b</labelShort></value></Operation>",
+            [
+                (Change.REPLACED, "/Defs/ThingDef[1]/label", "Steel", None, None, None),
+                (
+                    Change.INSERTED,
+                    "/Defs/ThingDef[1]/labelShort",
+                    "Steel",
+                    None,
+                    None,
+                    None,
+                ),
+            ],
+        ),
+        (
+            '<Operation Class="PatchOperationSetName"><xpath>/Defs/ThingDef[1]/comps</xpath>'
+            "<name>modExtensions</name></Operation>",
+            [
+                (
+                    Change.RENAMED,
+                    "/Defs/ThingDef[1]/comps",
+                    "Steel",
+                    None,
+                    "comps",
+                    "modExtensions",
+                )
+            ],
+        ),
+        (
+            '<Operation Class="PatchOperationAttributeSet"><xpath>/Defs/ThingDef[1]</xpath>'
+            "<attribute>Name</attribute><value>New</value></Operation>",
+            [(Change.ATTRIBUTE, "/Defs/ThingDef[1]", "Steel", "Name", "Base", "New")],
+        ),
+        (
+            '<Operation Class="PatchOperationAttributeRemove"><xpath>/Defs/ThingDef[1]</xpath>'
+            "<attribute>Name</attribute></Operation>",
+            [(Change.ATTRIBUTE, "/Defs/ThingDef[1]", "Steel", "Name", "Base", None)],
+        ),
+        (
+            '<Operation Class="XmlExtensions.PatchOperationAddOrReplace">'
+            "<xpath>/Defs/ThingDef[2]</xpath><value><label>w</label><comps/></value>"
+            "</Operation>",
+            [
+                (Change.REPLACED, "/Defs/ThingDef[2]/label", "Wood", None, None, None),
+                (Change.INSERTED, "/Defs/ThingDef[2]/comps", "Wood", None, None, None),
+            ],
+        ),
+    ],
+)
+def test_journal(operation: str, expected: list[tuple]):
+    """Operations record what they changed"""
+    journal = MutationJournal()
+    journal.begin("test.mod", "Patches/a.xml")
+    expected_xml = apply(operation, MutationJournal(max_entries=0))
+    assert etree.tostring(apply(operation, journal)) == etree.tostring(expected_xml)
+    assert [
+        (m.change, m.path, m.def_name, m.name, m.old, m.new) for m in journal
+    ] == expected
+    assert all(m.mod == "test.mod" and m.file == "Patches/a.xml" for m in journal)
+
+
+def test_journal_bounded():
+    """Only the latest entries are kept"""
+    journal = MutationJournal(max_entries=1)
+    apply(
+        '<Operation Class="PatchOperationAdd"><xpath>/Defs/ThingDef</xpath>'
+        "<value><a/><b/></value></Operation>",
+        journal,
+    )
+    assert [m.path for m in journal] == ["/Defs/ThingDef[2]/b"]
+    assert journal.dropped == 3
+
+
+def test_journal_conflicts():
+    """Defs changed by several mods are reported"""
+    journal = MutationJournal()
+    parser = etree.XMLParser(remove_blank_text=True)
+    xml = etree.ElementTree(etree.fromstring(DEFS, parser))
+    context = PatchContext(set(), set(), journal=journal)
+    for mod, xpath in (
+        ("a", "/Defs/ThingDef"),
+        ("b", '/Defs/ThingDef[defName="Wood"]'),
+    ):
+        journal.begin(mod, None)
+        get_operation(
+            etree.fromstring(
+                f'<Operation Class="PatchOperationAdd"><xpath>{xpath}</xpath>'
+                "<value><x/></value></Operation>"
+            )
+        )(xml, context)
+    assert journal.conflicts() == {"Wood": {"a", "b"}}
+    assert len(journal.by_def()["Steel"]) == 1
@@ -0,0 +1,35 @@
+""" Tests for rimworld.mod.load_mods """
+
+from pathlib import Path
+
+from rimworld.mod import find_mod_folders, load_mods
+
+EXPANSIONS = Path("./testdata/rimworld_expansions")
+
+
+def test_find_mod_folders():
+    """Mod folders are found recursively, nested mods are not searched"""
+    found = set(find_mod_folders(EXPANSIONS))
+    assert found == {
+        EXPANSIONS.joinpath(name)
+        for name in ("Anomaly", "Biotech", "Core", "Ideology", "Royalty")
+    }
+
+
+def test_load_mods_workers_same_order():
+    """Parallel loading yields mods in the same order as serial loading"""
+    serial = list(load_mods(EXPANSIONS))
+    parallel = list(load_mods(EXPANSIONS, workers=4))
+    assert [m.path for m in parallel] == [m.path for m in serial]
+    assert [m.about for m in parallel] == [m.about for m in serial]
+
+
+def test_load_mods_workers_skips_broken(tmp_path: Path):
+    """A broken mod does not abort the parallel scan"""
+    broken = tmp_path.joinpath("Broken", "About")
+    broken.mkdir(parents=True)
+    broken.joinpath("About.xml").write_text("<ModMetaData></ModMetaData>")
+
+    mods = list(load_mods(tmp_path, EXPANSIONS, workers=2))
+    assert len(mods) == 5
+    assert all(m.path.parent == EXPANSIONS for m in mods)
@@ -0,0 +1,485 @@
+""" Tests for rimworld.load_world """
+
+import json
+import logging
+import os
+from pathlib import Path
+
+import pytest
+
+from rimworld import load_world
+from rimworld.events import ChromeTrace, Event, EventKind, Instrumentation
+from rimworld.memory import DefOrigins, memory_report
+from rimworld.patch import PatchCache
+from rimworld.patch.profiler import PatchProfiler
+from rimworld.projection import project_world
+from rimworld.snapshot import SnapshotStore, WorldCache
+from rimworld.xml import compact_xml, xml_to_string
+
+MODSCONFIG = """<ModsConfigData>
+  <version>1.5.4104 rev435</version>
+  <activeMods>
+    <li>test.base</li>
+    <li>test.addon</li>
+  </activeMods>
+  <knownExpansions />
+</ModsConfigData>"""
+
+FILES = {
+    "Base/About/About.xml": """<ModMetaData>
+      <packageId>test.base</packageId><name>Base</name><author>Tester</author>
+      <supportedVersions><li>1.5</li></supportedVersions>
+    </ModMetaData>""",
+    "Base/Defs/Things.xml": """<Defs>
+      <ThingDef Name="BaseThing" Abstract="True"><category>Item</category></ThingDef>
+      <ThingDef ParentName="BaseThing">
+        <defName>Steel</defName>
+        <statBases><MarketValue>1.9</MarketValue></statBases>
+      </ThingDef>
+      <!-- a comment -->
+      <ThingDef ParentName="BaseThing">
+        <defName>Wood</defName>
+        <statBases><MarketValue>1.2</MarketValue></statBases>
+      </ThingDef>
+    </Defs>""",
+    "Base/Defs/Recipes/Recipes.xml": """<Defs>
+      <RecipeDef><defName>Smelt</defName><recipeUsers><li>Smelter</li></recipeUsers></RecipeDef>
+    </Defs>""",
+    "Addon/About/About.xml": """<ModMetaData>
+      <packageId>test.addon</packageId><name>Addon</name><author>Tester</author>
+      <supportedVersions><li>1.5</li></supportedVersions>
+    </ModMetaData>""",
+    "Addon/Defs/Stats.xml": """<Defs>
+      <StatDef><defName>Beauty</defName><label>beauty</label></StatDef>
+    </Defs>""",
+    "Addon/Patches/Patches.xml": """<Patch>
+      <Operation Class="PatchOperationReplace">
+        <xpath>/Defs/ThingDef[defName="Steel"]/statBases/MarketValue</xpath>
+        <value><MarketValue>2.5</MarketValue></value>
+      </Operation>
+      <Operation Class="PatchOperationAdd">
+        <xpath>/Defs/RecipeDef[defName="Smelt"]/recipeUsers</xpath>
+        <value><li>ElectricSmelter</li></value>
+      </Operation>
+      <Operation Class="PatchOperationAdd" MayRequire="test.missing">
+        <xpath>/Defs/ThingDef[defName="Steel"]</xpath>
+        <value><missing /></value>
+      </Operation>
+      <Operation Class="PatchOperationFindMod">
+        <mods><li>Base</li></mods>
+        <match Class="PatchOperationAdd">
+          <xpath>/Defs/ThingDef[defName="Wood"]/statBases</xpath>
+          <value><Beauty>1</Beauty></value>
+        </match>
+      </Operation>
+      <Operation Class="PatchOperationAdd">
+        <xpath>/Defs</xpath>
+        <value><ThingDef ParentName="BaseThing"><defName>Gold</defName></ThingDef></value>
+      </Operation>
+    </Patch>""",
+    "Config/ModsConfig.xml": MODSCONFIG,
+}
+
+
+@pytest.fixture(name="modlist")
+def fixture_modlist(tmp_path: Path) -> tuple[Path, Path]:
+    """A small modlist, returns mods folder and path to ModsConfig.xml"""
+    for relative, content in FILES.items():
+        path = tmp_path.joinpath(relative)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content)
+    return tmp_path, tmp_path.joinpath("Config", "ModsConfig.xml")
+
+
+def test_load_world(modlist: tuple[Path, Path]):
+    """Defs are merged and patches applied"""
+    mods_folder, modsconfig = modlist
+    world = load_world([mods_folder], modsconfig)
+    assert (
+        world.xpath('/Defs/ThingDef[defName="Steel"]/statBases/MarketValue/text()')[0]
+        == "2.5"
+    )
+    assert world.xpath("/Defs/RecipeDef/recipeUsers/li/text()") == [
+        "Smelter",
+        "ElectricSmelter",
+    ]
+    assert world.xpath('/Defs/ThingDef[defName="Wood"]/statBases/Beauty')
+    assert not world.xpath("//missing")
+    assert world.xpath('/Defs/ThingDef[defName="Gold"]')
+
+
+def test_load_world_processes(modlist: tuple[Path, Path]):
+    """Parsing in worker processes gives the same world"""
+    mods_folder, modsconfig = modlist
+    expected = load_world([mods_folder], modsconfig)
+    world = load_world([mods_folder], modsconfig, processes=2)
+    assert xml_to_string(world) == xml_to_string(expected)
+
+
+def test_load_world_profiler(modlist: tuple[Path, Path]):
+    """Profiling records every operation without changing the world"""
+    mods_folder, modsconfig = modlist
+    expected = load_world([mods_folder], modsconfig)
+    profiler = PatchProfiler()
+    world = load_world([mods_folder], modsconfig, profiler=profiler)
+    assert xml_to_string(world) == xml_to_string(expected)
+
+    assert [(r.operation, r.depth) for r in profiler.records] == [
+        ("PatchOperationReplace", 0),
+        ("PatchOperationAdd", 0),
+        ("PatchOperationAdd", 0),
+        ("PatchOperationFindMod", 0),
+        ("PatchOperationAdd", 1),
+        ("PatchOperationAdd", 0),
+    ]
+    assert {r.mod for r in profiler.records} == {"test.addon"}
+    assert all(r.file and r.file.endswith("Patches.xml") for r in profiler.records)
+    assert profiler.records[0].nodes_matched == 1
+    assert profiler.records[2].nodes_matched == 0  # denied by MayRequire
+    assert profiler.records[4].parent == 3
+    assert list(profiler.by_mod()) == ["test.addon"]
+
+
+def test_load_world_events(modlist: tuple[Path, Path], tmp_path: Path):
+    """Every step of loading is reported to listeners"""
+    mods_folder, modsconfig = modlist
+    expected = load_world([mods_folder], modsconfig)
+    events: list[Event] = []
+    trace = ChromeTrace()
+    world = load_world(
+        [mods_folder],
+        modsconfig,
+        workers=2,
+        events=Instrumentation(events.append, trace),
+    )
+    assert xml_to_string(world) == xml_to_string(expected)
+
+    counts = {kind: 0 for kind in EventKind}
+    for event in events:
+        counts[event.kind] += 1
+        assert event.duration >= 0
+    assert counts == {
+        EventKind.MOD_DISCOVERED: 2,
+        EventKind.ABOUT_PARSED: 2,
+        EventKind.DEF_FILE_PARSED: 3,
+        EventKind.DEFS_MERGED: 3,
+        EventKind.PATCH_FILE_PARSED: 1,
+        EventKind.PATCH_FILE_SKIPPED: 0,
+        EventKind.OPERATION_APPLIED: 5,
+    }
+    merged = [e for e in events if e.kind == EventKind.DEFS_MERGED]
+    assert sum(e.nodes for e in merged) == 6  # the comment is merged too
+    parsed = next(e for e in events if e.kind == EventKind.PATCH_FILE_PARSED)
+    assert (parsed.mod, parsed.nodes) == ("test.addon", 5)
+    assert (
+        parsed.size == mods_folder.joinpath("Addon/Patches/Patches.xml").stat().st_size
+    )
+    applied = [
+        (e.operation, e.nodes) for e in events if e.kind == EventKind.OPERATION_APPLIED
+    ]
+    assert applied == [
+        ("PatchOperationReplace", 1),
+        ("PatchOperationAdd", 1),
+        ("PatchOperationAdd", 0),
+        ("PatchOperationFindMod", 1),
+        ("PatchOperationAdd", 1),
+    ]
+
+    trace.dump(tmp_path.joinpath("trace.json"))
+    trace_events = json.loads(tmp_path.joinpath("trace.json").read_text())[
+        "traceEvents"
+    ]
+    assert len(trace_events) == len(events)
+    assert {e["ph"] for e in trace_events} == {"X"}
+    assert "PatchOperationFindMod" in {e["name"] for e in trace_events}
+
+
+def test_load_world_events_sequence(modlist: tuple[Path, Path]):
+    """Sequences holding a PatchOperationTest are reported with their nodes"""
+    mods_folder, modsconfig = modlist
+    mods_folder.joinpath("Addon/Patches/Sequence.xml").write_text(
+        """<Patch>
+      <Operation Class="PatchOperationSequence">
+        <operations>
+          <li Class="PatchOperationTest">
+            <xpath>/Defs/ThingDef[defName="Steel"]</xpath>
+          </li>
+          <li Class="PatchOperationAdd">
+            <xpath>/Defs/ThingDef[defName="Steel"]</xpath>
+            <value><label>steel</label></value>
+          </li>
+        </operations>
+      </Operation>
+    </Patch>"""
+    )
+    events: list[Event] = []
+    world = load_world([mods_folder], modsconfig, events=Instrumentation(events.append))
+    assert world.xpath('/Defs/ThingDef[defName="Steel"]/label/text()') == ["steel"]
+    applied = [
+        (e.operation, e.nodes)
+        for e in events
+        if e.kind == EventKind.OPERATION_APPLIED and e.path.name == "Sequence.xml"
+    ]
+    assert applied == [("PatchOperationSequence", 1)]
+
+
+def test_load_world_low_memory(modlist: tuple[Path, Path]):
+    """Low memory mode only drops comments and blank tails"""
+    mods_folder, modsconfig = modlist
+    expected = compact_xml(load_world([mods_folder], modsconfig))
+    world = load_world([mods_folder], modsconfig, low_memory=True)
+    assert not world.xpath("//comment()")
+    assert xml_to_string(world) == xml_to_string(expected)
+
+
+def test_load_world_low_memory_caches(modlist: tuple[Path, Path], tmp_path: Path):
+    """Worlds loaded in low memory mode are not reused for a full load"""
+    mods_folder, modsconfig = modlist
+    expected = load_world([mods_folder], modsconfig)
+    caches = {
+        "world_cache": WorldCache(tmp_path / "worlds"),
+        "snapshots": SnapshotStore(tmp_path / "snapshots"),
+    }
+    for name, cache in caches.items():
+        load_world([mods_folder], modsconfig, low_memory=True, **{name: cache})
+        world = load_world([mods_folder], modsconfig, **{name: cache})
+        assert xml_to_string(world) == xml_to_string(expected)
+
+
+def test_load_world_def_origins(modlist: tuple[Path, Path]):
+    """Defs are attributed to the mod that merged or inserted them"""
+    mods_folder, modsconfig = modlist
+    origins = DefOrigins()
+    world = load_world([mods_folder], modsconfig, def_origins=origins)
+    assert {
+        node.findtext("defName") or node.get("Name"): origins.mod_of(node)
+        for node in world.getroot()
+        if isinstance(node.tag, str)
+    } == {
+        "BaseThing": "test.base",
+        "Steel": "test.base",
+        "Wood": "test.base",
+        "Smelt": "test.base",
+        "Beauty": "test.addon",
+        "Gold": "test.addon",
+    }
+    report = memory_report(world, origins)
+    assert set(report.by_mod) == {"test.base", "test.addon"}
+    assert report.by_mod["test.base"].nodes > report.by_mod["test.addon"].nodes
+
+
+@pytest.mark.parametrize(
+    "def_types",
+    [{"ThingDef"}, {"RecipeDef"}, {"StatDef", "RecipeDef"}, {"PawnKindDef"}],
+)
+def test_load_world_def_types(
+    modlist: tuple[Path, Path],
+    def_types: set[str],
+    caplog: pytest.LogCaptureFixture,
+):
+    """Loading some def types gives the same defs as filtering the whole world"""
+    mods_folder, modsconfig = modlist
+    expected = project_world(load_world([mods_folder], modsconfig), def_types)
+    with caplog.at_level(logging.INFO, logger="rimworld"):
+        world = load_world([mods_folder], modsconfig, def_types=def_types)
+    assert xml_to_string(world) == xml_to_string(expected)
+    assert "Loading every def type" not in caplog.text
+
+
+@pytest.mark.parametrize(
+    "operation",
+    [
+        # may touch any def
+        """<Operation Class="PatchOperationRemove">
+          <xpath>/Defs/*[1]/defName</xpath>
+        </Operation>""",
+        # a recipe changed depending on a thing
+        """<Operation Class="PatchOperationConditional">
+          <xpath>/Defs/ThingDef[defName="Steel"]/statBases</xpath>
+          <match Class="PatchOperationAdd">
+            <xpath>/Defs/RecipeDef[defName="Smelt"]</xpath>
+            <value><workAmount>100</workAmount></value>
+          </match>
+        </Operation>""",
+        # a recipe inheriting from a thing
+        """<Operation Class="PatchOperationAttributeSet">
+          <xpath>/Defs/RecipeDef[defName="Smelt"]</xpath>
+          <attribute>ParentName</attribute>
+          <value>BaseThing</value>
+        </Operation>""",
+    ],
+)
+def test_load_world_def_types_fallback(
+    modlist: tuple[Path, Path], operation: str, caplog: pytest.LogCaptureFixture
+):
+    """Every def type is loaded when skipping other types may change the result"""
+    mods_folder, modsconfig = modlist
+    mods_folder.joinpath("Addon", "Patches", "Unsafe.xml").write_text(
+        f"<Patch>{operation}</Patch>"
+    )
+    expected = project_world(load_world([mods_folder], modsconfig), {"RecipeDef"})
+    with caplog.at_level(logging.INFO, logger="rimworld"):
+        world = load_world([mods_folder], modsconfig, def_types={"RecipeDef"})
+    assert xml_to_string(world) == xml_to_string(expected)
+    assert "Loading every def type" in caplog.text
+
+
+def test_load_world_def_types_fallback_measurements(modlist: tuple[Path, Path]):
+    """Only the load which is kept is profiled and reported"""
+    mods_folder, modsconfig = modlist
+    mods_folder.joinpath("Addon", "Patches", "Unsafe.xml").write_text(
+        """<Patch><Operation Class="PatchOperationRemove">
+          <xpath>/Defs/*[1]/defName</xpath>
+        </Operation></Patch>"""
+    )
+
+    def measure(**kwargs) -> tuple[list[str], list[EventKind]]:
+        profiler = PatchProfiler()
+        events: list[Event] = []
+        load_world(
+            [mods_folder],
+            modsconfig,
+            profiler=profiler,
+            events=Instrumentation(events.append),
+            **kwargs,
+        )
+        return [r.operation for r in profiler.records], [e.kind for e in events]
+
+    assert measure(def_types={"ThingDef"}) == measure()
+
+
+def test_load_world_patch_cache(modlist: tuple[Path, Path], tmp_path: Path):
+    """Cached patch operations give the same world"""
+    mods_folder, modsconfig = modlist
+    expected = load_world([mods_folder], modsconfig)
+    cache_path = tmp_path / "cache" / "patches.cache"
+
+    world = load_world([mods_folder], modsconfig, patch_cache=cache_path)
+    assert xml_to_string(world) == xml_to_string(expected)
+    assert cache_path.exists()
+
+    cache = PatchCache(cache_path)
+    world = load_world([mods_folder], modsconfig, patch_cache=cache_path)
+    assert xml_to_string(world) == xml_to_string(expected)
+    assert cache.lookup(mods_folder / "Addon" / "Patches" / "Patches.xml")
+
+
+def test_load_world_snapshots(modlist: tuple[Path, Path], tmp_path: Path):
+    """Loading resumes from the latest snapshot still matching the modlist"""
+    mods_folder, modsconfig = modlist
+    expected = load_world([mods_folder], modsconfig)
+    snapshots = SnapshotStore(tmp_path / "snapshots", max_age=0)
+
+    world = load_world([mods_folder], modsconfig, snapshots=snapshots)
+    assert xml_to_string(world) == xml_to_string(expected)
+    assert snapshots.resumed_from == 0
+    assert len(list(snapshots.directory.iterdir())) == 2
+
+    world = load_world([mods_folder], modsconfig, snapshots=snapshots)
+    assert xml_to_string(world) == xml_to_string(expected)
+    assert snapshots.resumed_from == 2
+
+    patch = mods_folder / "Addon" / "Patches" / "Patches.xml"
+    patch.write_text(patch.read_text().replace("2.5", "3.75"))
+    expected = load_world([mods_folder], modsconfig)
+    world = load_world([mods_folder], modsconfig, snapshots=snapshots)
+    assert xml_to_string(world) == xml_to_string(expected)
+    assert snapshots.resumed_from == 1
+    assert len(list(snapshots.directory.iterdir())) == 2
+
+
+def test_load_world_snapshots_selected_mods(modlist: tuple[Path, Path], tmp_path: Path):
+    """Snapshots are only taken after the chosen mods"""
+    mods_folder, modsconfig = modlist
+    snapshots = SnapshotStore(tmp_path / "snapshots", mods=["Test.Base"])
+    load_world([mods_folder], modsconfig, snapshots=snapshots)
+    assert len(list(snapshots.directory.iterdir())) == 1
+
+    world = load_world([mods_folder], modsconfig, snapshots=snapshots)
+    assert snapshots.resumed_from == 1
+    assert xml_to_string(world) == xml_to_string(load_world([mods_folder], modsconfig))
+
+
+def test_load_world_snapshots_shared(modlist: tuple[Path, Path], tmp_path: Path):
+    """Modlists sharing a directory keep each other's recent snapshots"""
+    mods_folder, modsconfig = modlist
+    snapshots = SnapshotStore(tmp_path / "snapshots")
+    load_world([mods_folder], modsconfig, snapshots=snapshots)
+    base_only = tmp_path / "BaseOnly.xml"
+    base_only.write_text(modsconfig.read_text().replace("<li>test.addon</li>", ""))
+    load_world([mods_folder], base_only, snapshots=snapshots)
+
+    load_world([mods_folder], modsconfig, snapshots=snapshots)
+    assert snapshots.resumed_from == 2
+    load_world([mods_folder], base_only, snapshots=snapshots)
+    assert snapshots.resumed_from == 1
+
+
+@pytest.mark.parametrize("content_hash", [False, True])
+def test_load_world_world_cache(
+    modlist: tuple[Path, Path], tmp_path: Path, content_hash: bool
+):
+    """Worlds are read back until the modlist or its files change"""
+    mods_folder, modsconfig = modlist
+    expected = load_world([mods_folder], modsconfig)
+    cache = WorldCache(tmp_path / "worlds", content_hash=content_hash)
+
+    for _ in range(2):
+        world = load_world([mods_folder], modsconfig, world_cache=cache)
+        assert xml_to_string(world) == xml_to_string(expected)
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    patch = mods_folder / "Addon" / "Patches" / "Patches.xml"
+    patch.write_text(patch.read_text().replace("2.5", "3.75"))
+    expected = load_world([mods_folder], modsconfig)
+    world = load_world([mods_folder], modsconfig, world_cache=cache)
+    assert xml_to_string(world) == xml_to_string(expected)
+    assert (cache.hits, cache.misses) == (1, 2)
+    assert len(list(cache.directory.iterdir())) == 2
+
+    modsconfig.write_text(modsconfig.read_text().replace("1.5.4104", "1.5.4200"))
+    load_world([mods_folder], modsconfig, world_cache=cache)
+    assert (cache.hits, cache.misses) == (1, 3)
+
+
+def test_world_cache_eviction(modlist: tuple[Path, Path], tmp_path: Path):
+    """Entries over the limits are evicted, least recently used first"""
+    mods_folder, modsconfig = modlist
+    cache = WorldCache(tmp_path / "worlds")
+    world = load_world([mods_folder], modsconfig)
+    for i, key in enumerate(("a" * 64, "b" * 64, "c" * 64)):
+        cache.save(key, world)
+        os.utime(cache.directory / f"{key}{WorldCache.SUFFIX}", (i, i))
+    assert cache.load("a" * 64) is not None
+    size = (cache.directory / f"{'a' * 64}{WorldCache.SUFFIX}").stat().st_size
+
+    cache.max_bytes = 2 * size
+    cache.save("d" * 64, world)
+    assert sorted(p.name[0] for p in cache.directory.iterdir()) == ["a", "d"]
+
+    cache.max_age = -1
+    cache.evict(keep="d" * 64)
+    assert [p.name[0] for p in cache.directory.iterdir()] == ["d"]
+
+
+def test_load_world_skips_dead_patches(
+    modlist: tuple[Path, Path], caplog: pytest.LogCaptureFixture
+):
+    """Patch files for inactive mods are not loaded"""
+    mods_folder, modsconfig = modlist
+    expected = load_world([mods_folder], modsconfig)
+    mods_folder.joinpath("Addon", "Patches", "Compat.xml").write_text(
+        """<Patch>
+          <Operation Class="PatchOperationRemove" MayRequire="test.missing">
+            <xpath>/Defs/ThingDef</xpath>
+          </Operation>
+          <Operation Class="PatchOperationFindMod">
+            <mods><li>Missing</li></mods>
+            <match Class="PatchOperationRemove"><xpath>/Defs/ThingDef</xpath></match>
+          </Operation>
+        </Patch>"""
+    )
+    with caplog.at_level(logging.INFO, logger="rimworld"):
+        world = load_world([mods_folder], modsconfig)
+    assert xml_to_string(world) == xml_to_string(expected)
+    assert "Skipped 1 patch files" in caplog.text
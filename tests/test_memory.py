@@ -0,0 +1,44 @@
+""" Tests for rimworld.memory """
+
+from lxml import etree
+
+from rimworld.memory import DefOrigins, memory_report
+
+WORLD = """<Defs>
+<ThingDef Name="Base"><defName>Steel</defName><tags><li>a</li></tags></ThingDef>
+<!-- a comment -->
+<ThingDef><defName>Wood</defName></ThingDef>
+<StatDef><defName>Beauty</defName></StatDef>
+</Defs>"""
+
+
+def test_memory_report():
+    """Nodes and bytes are attributed to def types and mods"""
+    world = etree.ElementTree(etree.fromstring(WORLD))
+    origins = DefOrigins()
+    root = world.getroot()
+    origins.claim(root[:2], "base")
+    origins.claim(root, "addon")
+
+    report = memory_report(world, origins)
+    assert {name: usage.nodes for name, usage in report.by_type.items()} == {
+        "ThingDef": 6,
+        "<!-- -->": 1,
+        "StatDef": 2,
+    }
+    assert {mod: usage.nodes for mod, usage in report.by_mod.items()} == {
+        "base": 5,
+        "addon": 4,
+    }
+    assert report.total.nodes == 10
+    # the root and its text are only counted in the total
+    assert report.total.bytes > sum(u.bytes for u in report.by_type.values())
+    assert report.by_type["ThingDef"].bytes > report.by_type["StatDef"].bytes
+    assert "ThingDef" in report.report()
+    assert report.to_json()["mods"]["base"]["nodes"] == 5
+
+
+def test_memory_report_without_origins():
+    """Defs belong to no mod when origins are not known"""
+    world = etree.ElementTree(etree.fromstring(WORLD))
+    assert list(memory_report(world).by_mod) == [None]
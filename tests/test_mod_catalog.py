@@ -0,0 +1,67 @@
+""" Tests for rimworld.mod.ModCatalog """
+
+import shutil
+from pathlib import Path
+
+from rimworld.mod import ModCatalog, load_mods
+
+EXPANSIONS = Path("./testdata/rimworld_expansions")
+
+
+def test_warm_catalog_does_not_reparse(tmp_path: Path):
+    """A saved catalog serves unchanged files without parsing them"""
+    catalog_path = tmp_path.joinpath("mods.cache")
+
+    cold = ModCatalog(catalog_path)
+    expected = list(load_mods(EXPANSIONS, catalog=cold))
+    cold.save()
+    assert cold.misses == len(expected) and cold.hits == 0
+
+    warm = ModCatalog(catalog_path)
+    mods = list(load_mods(EXPANSIONS, catalog=warm))
+    assert warm.misses == 0 and warm.hits == len(expected)
+    assert [m.about for m in mods] == [m.about for m in expected]
+
+
+def test_changed_file_is_reparsed(tmp_path: Path):
+    """Files with a different size or mtime are parsed again"""
+    mods_folder = tmp_path.joinpath("mods")
+    shutil.copytree(EXPANSIONS.joinpath("Core"), mods_folder.joinpath("Core"))
+    catalog_path = tmp_path.joinpath("mods.cache")
+
+    catalog = ModCatalog(catalog_path)
+    list(load_mods(mods_folder, catalog=catalog))
+    catalog.save()
+
+    about_path = mods_folder.joinpath("Core", "About", "About.xml")
+    about_path.write_text(
+        about_path.read_text().replace("Ludeon.RimWorld<", "Ludeon.RimWorld.Changed<")
+    )
+
+    catalog = ModCatalog(catalog_path)
+    (mod,) = load_mods(mods_folder, catalog=catalog)
+    assert catalog.misses == 1
+    assert mod.package_id == "ludeon.rimworld.changed"
+
+
+def test_unscanned_entries_are_dropped(tmp_path: Path):
+    """Saving keeps only the files looked up since the catalog was opened"""
+    catalog_path = tmp_path.joinpath("mods.cache")
+    for name in ("Core", "Royalty"):
+        shutil.copytree(
+            EXPANSIONS.joinpath(name), tmp_path.joinpath(name, "mods", name)
+        )
+
+    catalog = ModCatalog(catalog_path)
+    list(load_mods(tmp_path.joinpath("Core", "mods"), catalog=catalog))
+    list(load_mods(tmp_path.joinpath("Royalty", "mods"), catalog=catalog))
+    catalog.save()
+
+    catalog = ModCatalog(catalog_path)
+    list(load_mods(tmp_path.joinpath("Royalty", "mods"), catalog=catalog))
+    assert catalog.hits > 0 and catalog.misses == 0
+    catalog.save()
+
+    catalog = ModCatalog(catalog_path)
+    list(load_mods(tmp_path.joinpath("Core", "mods"), catalog=catalog))
+    assert catalog.hits == 0 and catalog.misses > 0
@@ -0,0 +1,67 @@
+""" Tests for rimworld.mod.ModManifest """
+
+from pathlib import Path
+
+from rimworld.gameversion import GameVersion
+from rimworld.mod import Mod, ModsConfig
+from rimworld.xml import find_xmls
+
+ABOUT = """<ModMetaData>
+  <packageId>test.manifest</packageId>
+  <author>Tester</author>
+  <supportedVersions><li>1.5</li></supportedVersions>
+</ModMetaData>"""
+
+
+def _touch(root: Path, *relative: str):
+    for path in relative:
+        root.joinpath(path).parent.mkdir(parents=True, exist_ok=True)
+        root.joinpath(path).write_text("<Defs />")
+
+
+def test_manifest_matches_find_xmls(tmp_path: Path):
+    """Manifest lists the same files, in the same order, as find_xmls"""
+    _touch(tmp_path, "About/About.xml")
+    tmp_path.joinpath("About", "About.xml").write_text(ABOUT)
+    _touch(
+        tmp_path,
+        "Defs/b.xml",
+        "Defs/a.xml",
+        "Defs/Nested/c.xml",
+        "Defs/Nested/Deeper/d.xml",
+        "Defs/Other/e.xml",
+        "Defs/notes.txt",
+        "Patches/p.xml",
+        "Common/Defs/common.xml",
+        "1.5/Patches/versioned.xml",
+        "1.4/Defs/old.xml",
+        "Languages/English/Keyed/keys.xml",
+        "Textures/texture.xml",
+    )
+    mod = Mod.load(tmp_path)
+    config = ModsConfig(GameVersion.new("1.5"), ["test.manifest"], [])
+
+    expected_defs = []
+    expected_patches = []
+    for folder in mod.mod_folders(config):
+        expected_defs.extend(find_xmls(folder.defs_folder))
+        expected_patches.extend(find_xmls(folder.patches_folder))
+
+    assert list(mod.def_files(config)) == expected_defs
+    assert list(mod.patch_files(config)) == expected_patches
+    assert list(mod.language_files(config)) == [
+        tmp_path.joinpath("Languages/English/Keyed/keys.xml")
+    ]
+    assert tmp_path.joinpath("1.4/Defs/old.xml") not in expected_defs
+
+
+def test_manifest_is_memoized(tmp_path: Path):
+    """Load folders are scanned only once"""
+    _touch(tmp_path, "About/About.xml", "Defs/a.xml")
+    tmp_path.joinpath("About", "About.xml").write_text(ABOUT)
+    mod = Mod.load(tmp_path)
+    config = ModsConfig(GameVersion.new("1.5"), ["test.manifest"], [])
+
+    assert list(mod.def_files(config)) == [tmp_path.joinpath("Defs", "a.xml")]
+    _touch(tmp_path, "Defs/b.xml")
+    assert list(mod.def_files(config)) == [tmp_path.joinpath("Defs", "a.xml")]
@@ -0,0 +1,97 @@
+""" rimworld.patch.cache """
+
+import pickle
+from copy import deepcopy
+from pathlib import Path
+
+import pytest
+from lxml import etree
+
+from rimworld.patch import PatchCache, PatchContext, get_operation
+from rimworld.xml import find_xmls, load_xml, xml_to_string
+
+CASES = [
+    (filename.name, case)
+    for filename in find_xmls(Path(__file__).parent.joinpath("patches"))
+    for case in load_xml(filename).findall("Case")
+]
+
+
+@pytest.mark.parametrize(("filename", "case"), CASES)
+def test_operations_pickle(filename: str, case: etree._Element):
+    """Unpickled operations patch the same way as the original ones"""
+    assert filename
+    operations = [
+        get_operation(node) for node in case.find("Patch").findall("Operation")
+    ]
+    restored = pickle.loads(pickle.dumps(operations))
+    context = PatchContext(set(), set())
+
+    xml = etree.ElementTree(deepcopy(case.find("Defs")))
+    restored_xml = etree.ElementTree(deepcopy(case.find("Defs")))
+    for operation, restored_operation in zip(operations, restored, strict=True):
+        assert type(operation) is type(restored_operation)
+        operation(xml, context)
+        restored_operation(restored_xml, context)
+    assert xml_to_string(restored_xml) == xml_to_string(xml)
+
+
+def test_unknown_operation_pickle():
+    """Unknown operations keep their xml"""
+    node = etree.fromstring(
+        '<Operation Class="Some.Unknown"><xpath>/Defs</xpath><x a="1">y</x></Operation>'
+    )
+    operation = pickle.loads(pickle.dumps(get_operation(node)))
+    serialized = etree.Element("Operation")
+    operation.to_xml(serialized)
+    assert etree.tostring(serialized) == etree.tostring(node)
+
+    comment = pickle.loads(pickle.dumps(get_operation(etree.Comment(" note "))))
+    assert etree.tostring(comment.node) == b"<!-- note -->"
+
+
+def test_patch_cache(tmp_path: Path):
+    """Entries are keyed by content and dropped when unused"""
+    patch = tmp_path / "patch.xml"
+    patch.write_text(
+        '<Patch><Operation Class="PatchOperationRemove">'
+        "<xpath>/Defs/ThingDef</xpath></Operation></Patch>"
+    )
+    cache_path = tmp_path / "patches.cache"
+
+    cache = PatchCache(cache_path)
+    operations = [get_operation(n) for n in load_xml(patch).getroot()]
+    cache.store(patch, operations)
+    cache.save()
+
+    copy = tmp_path / "copy.xml"
+    copy.write_bytes(patch.read_bytes())
+    cache = PatchCache(cache_path)
+    assert cache.lookup(copy) == operations
+    assert (cache.hits, cache.misses) == (1, 0)
+    cache.save()
+
+    patch.write_text("<Patch />")
+    cache = PatchCache(cache_path)
+    assert cache.lookup(patch) is None
+    assert (cache.hits, cache.misses) == (0, 1)
+    cache.save()
+    assert PatchCache(cache_path).lookup(copy) is None
+
+
+def test_patch_cache_format_version(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    """Entries written with another format or library version are ignored"""
+    patch = tmp_path / "patch.xml"
+    patch.write_text("<Patch />")
+    cache_path = tmp_path / "patches.cache"
+    cache = PatchCache(cache_path)
+    cache.store(patch, [])
+    cache.save()
+    assert PatchCache(cache_path).lookup(patch) == []
+
+    monkeypatch.setattr(PatchCache, "FORMAT_VERSION", PatchCache.FORMAT_VERSION + 1)
+    assert PatchCache(cache_path).lookup(patch) is None
+    monkeypatch.undo()
+
+    monkeypatch.setattr("rimworld.patch.cache.library_version", lambda: "other")
+    assert PatchCache(cache_path).lookup(patch) is None
@@ -1,3 +1,5 @@
+from copy import deepcopy
+from dataclasses import replace
 from pathlib import Path
 
 import pytest
@@ -5,8 +7,9 @@ from lxml import etree
 
 from rimworld.mod import Mod
 from rimworld.patch import PatchContext, get_operation
+from rimworld.patch.specialize import specialize
 from rimworld.util import unused
-from rimworld.xml import assert_xml_eq, find_xmls, load_xml
+from rimworld.xml import DefNameIndex, assert_xml_eq, find_xmls, load_xml
 
 
 def make_parameters():  # pylint: disable=too-many-locals
@@ -60,9 +63,12 @@ def make_parameters():  # pylint: disable=too-many-locals
 parameters = make_parameters()
 
 
+@pytest.mark.parametrize("consume_values", [False, True])
+@pytest.mark.parametrize("use_def_index", [False, True])
 @pytest.mark.parametrize(
     ("file", "case", "xml", "context", "patch", "expected"), parameters
 )
+# pylint: disable-next=too-many-arguments,too-many-positional-arguments
 def test_patches_dd(
     file: str,
     case: str | None,
@@ -70,12 +76,41 @@ def test_patches_dd(
     context: PatchContext,
     patch: etree._Element,
     expected: etree._Element,
+    use_def_index: bool,
+    consume_values: bool,
 ):
     """Test patch operations"""
     unused(file)
     unused(case)
-    for node in patch.findall("Operation"):
+    xml = etree.ElementTree(deepcopy(xml.getroot()))
+    if use_def_index:
+        context = replace(context, def_index=DefNameIndex(xml.getroot()))
+    context = replace(context, consume_values=consume_values)
+    for node in deepcopy(patch).findall("Operation"):
         get_operation(node)(xml, context)
 
     expected.tag = "Defs"
     assert_xml_eq(xml.getroot(), expected)
+
+
+@pytest.mark.parametrize(
+    ("file", "case", "xml", "context", "patch", "expected"), parameters
+)
+# pylint: disable-next=too-many-arguments,too-many-positional-arguments
+def test_patches_dd_specialized(
+    file: str,
+    case: str | None,
+    xml: etree._ElementTree,
+    context: PatchContext,
+    patch: etree._Element,
+    expected: etree._Element,
+):
+    """Specialized operations patch the same way"""
+    unused(file)
+    unused(case)
+    xml = etree.ElementTree(deepcopy(xml.getroot()))
+    for node in patch.findall("Operation"):
+        specialize(get_operation(node), context)(xml, context)
+
+    expected.tag = "Defs"
+    assert_xml_eq(xml.getroot(), expected)
@@ -0,0 +1,117 @@
+""" rimworld.patch.prescan """
+
+from pathlib import Path
+
+import pytest
+
+from rimworld import load_world
+from rimworld.events import Event, EventKind, Instrumentation
+from rimworld.patch import PatchContext, patch_can_apply
+
+CONTEXT = PatchContext(
+    active_package_ids={"ludeon.rimworld", "test.present"},
+    active_package_names={"Core", "Present"},
+)
+
+ADD = "<xpath>/Defs</xpath><value><ThingDef /></value>"
+
+
+@pytest.mark.parametrize(
+    ("patch", "can_apply"),
+    [
+        (f'<Operation Class="PatchOperationAdd">{ADD}</Operation>', True),
+        (
+            f'<Operation Class="PatchOperationAdd" MayRequire="test.absent">{ADD}</Operation>',
+            False,
+        ),
+        (
+            f'<Operation Class="PatchOperationAdd" MayRequire="test.present, Ludeon.RimWorld">'
+            f"{ADD}</Operation>",
+            False,
+        ),
+        (
+            f'<Operation Class="PatchOperationAdd" MayRequireAnyOf="test.absent,test.present">'
+            f"{ADD}</Operation>",
+            True,
+        ),
+        (
+            '<Operation Class="PatchOperationFindMod"><mods><li>Absent</li></mods>'
+            f'<match Class="PatchOperationAdd">{ADD}</match></Operation>',
+            False,
+        ),
+        (
+            '<Operation Class="PatchOperationFindMod"><mods><li>Present</li></mods>'
+            f'<match Class="PatchOperationAdd">{ADD}</match></Operation>',
+            True,
+        ),
+        (
+            '<Operation Class="PatchOperationFindMod"><mods><li>Absent</li></mods>'
+            f'<nomatch Class="PatchOperationAdd">{ADD}</nomatch></Operation>',
+            True,
+        ),
+        (
+            '<Operation Class="PatchOperationFindMod" MayRequire="test.absent">'
+            f'<mods><li>Present</li></mods><match Class="PatchOperationAdd">{ADD}</match>'
+            "</Operation>",
+            False,
+        ),
+        (
+            f'<Operation Class="PatchOperationAdd" MayRequire="test.absent">{ADD}</Operation>'
+            "<!-- comment --><NotAnOperation />"
+            f'<Operation Class="PatchOperationRemove"><xpath>/Defs/A</xpath></Operation>',
+            True,
+        ),
+        ("", False),
+    ],
+)
+def test_patch_can_apply(tmp_path: Path, patch: str, can_apply: bool):
+    """Files are skipped only when none of their operations can apply"""
+    path = tmp_path / "patch.xml"
+    path.write_text(f'<?xml version="1.0" encoding="utf-8"?>\n<Patch>{patch}</Patch>')
+    assert patch_can_apply(path, CONTEXT) is can_apply
+
+
+def test_patch_can_apply_malformed(tmp_path: Path):
+    """Files that do not parse cleanly are never skipped"""
+    path = tmp_path / "patch.xml"
+    path.write_text('<Patch><Operation Class="PatchOperationAdd" MayRequire="a">')
+    assert patch_can_apply(path, CONTEXT)
+    assert patch_can_apply(tmp_path / "missing.xml", CONTEXT)
+
+
+def test_load_world_skipped_events(tmp_path: Path):
+    """Patch files skipped by load_world are reported as events"""
+    files = {
+        "Mod/About/About.xml": """<ModMetaData>
+          <packageId>test.mod</packageId><name>Mod</name><author>Tester</author>
+          <supportedVersions><li>1.5</li></supportedVersions>
+        </ModMetaData>""",
+        "Mod/Defs/Things.xml": "<Defs><ThingDef><defName>Steel</defName></ThingDef></Defs>",
+        "Mod/Patches/Absent.xml": f"""<Patch>
+          <Operation Class="PatchOperationAdd" MayRequire="test.absent">{ADD}</Operation>
+        </Patch>""",
+        "Mod/Patches/Present.xml": f"""<Patch>
+          <Operation Class="PatchOperationAdd">{ADD}</Operation>
+        </Patch>""",
+        "Config/ModsConfig.xml": """<ModsConfigData>
+          <version>1.5.4104 rev435</version>
+          <activeMods><li>test.mod</li></activeMods>
+          <knownExpansions />
+        </ModsConfigData>""",
+    }
+    for relative, content in files.items():
+        path = tmp_path.joinpath(relative)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content)
+    events: list[Event] = []
+    load_world(
+        [tmp_path],
+        tmp_path / "Config/ModsConfig.xml",
+        events=Instrumentation(events.append),
+    )
+    skipped = [e for e in events if e.kind == EventKind.PATCH_FILE_SKIPPED]
+    assert [(e.path, e.mod) for e in skipped] == [
+        (tmp_path / "Mod/Patches/Absent.xml", "test.mod")
+    ]
+    parsed = [e.path for e in events if e.kind == EventKind.PATCH_FILE_PARSED]
+    assert parsed == [tmp_path / "Mod/Patches/Present.xml"]
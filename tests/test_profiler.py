@@ -0,0 +1,97 @@
+""" rimworld.patch.profiler """
+
+import json
+from pathlib import Path
+
+from lxml import etree
+
+from rimworld.patch import PatchContext, get_operation
+from rimworld.patch.profiler import PatchProfiler
+
+PATCH = """
+<Operation Class="PatchOperationSequence">
+    <operations>
+        <li Class="PatchOperationConditional">
+            <xpath>/Defs/ThingDef[defName="Steel"]/comps</xpath>
+            <nomatch Class="PatchOperationAdd">
+                <xpath>/Defs/ThingDef[defName="Steel"]</xpath>
+                <value><comps /></value>
+            </nomatch>
+        </li>
+        <li Class="PatchOperationAdd">
+            <xpath>/Defs/ThingDef/comps</xpath>
+            <value><li>comp</li></value>
+        </li>
+    </operations>
+</Operation>
+"""
+
+
+def test_profiler(tmp_path: Path):
+    """Nested operations are recorded, reported and dumped"""
+    defs = etree.ElementTree(
+        etree.fromstring(
+            "<Defs><ThingDef><defName>Steel</defName></ThingDef>"
+            "<ThingDef><comps /></ThingDef></Defs>"
+        )
+    )
+    profiler = PatchProfiler()
+    context = PatchContext(set(), set(), profiler=profiler)
+    operation = profiler.profile(get_operation(etree.fromstring(PATCH)), "m", "p.xml")
+    operation(defs, context)
+
+    assert [
+        (r.operation, r.depth, r.parent, r.nodes_matched, r.nodes_affected)
+        for r in profiler.records
+    ] == [
+        ("PatchOperationSequence", 0, None, 0, 3),
+        ("PatchOperationConditional", 1, 0, 0, 1),
+        ("PatchOperationAdd", 2, 1, 1, 1),
+        ("PatchOperationAdd", 1, 0, 2, 2),
+    ]
+    sequence = profiler.records[0]
+    assert sequence.elapsed >= sum(r.elapsed for r in profiler.records if r.depth == 1)
+    assert profiler.xpaths["/Defs/ThingDef/comps"].nodes_matched == 2
+
+    report = profiler.report(top=10)
+    assert "Slowest operations" in report and "/Defs/ThingDef/comps" in report
+
+    profiler.dump(tmp_path / "profile.json")
+    dumped = json.loads((tmp_path / "profile.json").read_text())
+    assert len(dumped["operations"]) == 4
+    assert dumped["mods"] == {"m": sequence.elapsed}
+
+
+def test_profiler_test_in_sequence():
+    """Sequences holding a PatchOperationTest are measured, and stop when it fails"""
+    defs = etree.ElementTree(
+        etree.fromstring("<Defs><ThingDef><defName>Steel</defName></ThingDef></Defs>")
+    )
+    profiler = PatchProfiler()
+    context = PatchContext(set(), set(), profiler=profiler)
+    for defname in ("Steel", "Wood"):
+        patch = f"""
+        <Operation Class="PatchOperationSequence">
+            <operations>
+                <li Class="PatchOperationTest">
+                    <xpath>/Defs/ThingDef[defName="{defname}"]</xpath>
+                </li>
+                <li Class="PatchOperationAdd">
+                    <xpath>/Defs/ThingDef</xpath>
+                    <value><label>{defname}</label></value>
+                </li>
+            </operations>
+        </Operation>
+        """
+        operation = profiler.profile(get_operation(etree.fromstring(patch)), "m")
+        operation(defs, context)
+
+    assert [(r.operation, r.depth, r.nodes_affected) for r in profiler.records] == [
+        ("PatchOperationSequence", 0, 1),
+        ("PatchOperationTest", 1, 0),
+        ("PatchOperationAdd", 1, 1),
+        ("PatchOperationSequence", 0, 0),
+        ("PatchOperationTest", 1, 0),
+    ]
+    assert [r.successful for r in profiler.records[1::3]] == [True, False]
+    assert defs.xpath("/Defs/ThingDef/label/text()") == ["Steel"]
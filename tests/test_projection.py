@@ -0,0 +1,142 @@
+""" Tests for rimworld.projection """
+
+import pytest
+from lxml import etree
+
+from rimworld.error import UnsafeProjectionError
+from rimworld.patch import PatchContext, get_operation
+from rimworld.patch.specialize import specialize
+from rimworld.projection import Projection, project_world
+
+CONTEXT = PatchContext(active_package_ids=set(), active_package_names={"Core"})
+
+
+def _operation(xml: str):
+    return specialize(get_operation(etree.fromstring(xml)), CONTEXT)
+
+
+def test_project_world_keeps_parents():
+    """Parents are kept whatever their type, other defs and comments are not"""
+    world = etree.ElementTree(
+        etree.fromstring(
+            """<Defs>
+        <ThingDef Name="Base" Abstract="True" />
+        <!-- a comment -->
+        <ThingDef Name="Unused" />
+        <RecipeDef Name="Middle" ParentName="Base" />
+        <RecipeDef ParentName="Middle"><defName>Smelt</defName></RecipeDef>
+        <StatDef><defName>Mass</defName></StatDef>
+    </Defs>"""
+        )
+    )
+    project_world(world, {"RecipeDef"})
+    assert [(n.tag, n.get("Name")) for n in world.getroot()] == [
+        ("ThingDef", "Base"),
+        ("RecipeDef", "Middle"),
+        ("RecipeDef", None),
+    ]
+
+
+@pytest.mark.parametrize(
+    "operation, wanted",
+    [
+        (
+            """<Operation Class="PatchOperationAdd">
+              <xpath>/Defs/RecipeDef[defName="Smelt"]</xpath>
+              <value><workAmount>1</workAmount></value>
+            </Operation>""",
+            True,
+        ),
+        (
+            """<Operation Class="PatchOperationAdd">
+              <xpath>/Defs/ThingDef[defName="Steel"]</xpath>
+              <value><mass>1</mass></value>
+            </Operation>""",
+            False,
+        ),
+        (
+            """<Operation Class="PatchOperationRemove">
+              <xpath>/Defs/*[defName="Steel"]/comps</xpath>
+            </Operation>""",
+            True,
+        ),
+        (
+            """<Operation Class="PatchOperationAdd">
+              <xpath>/Defs</xpath>
+              <value><RecipeDef><defName>Cook</defName></RecipeDef></value>
+            </Operation>""",
+            True,
+        ),
+        (
+            """<Operation Class="PatchOperationAdd">
+              <xpath>/Defs</xpath>
+              <value><ThingDef><defName>Gold</defName></ThingDef></value>
+            </Operation>""",
+            False,
+        ),
+        (
+            """<Operation Class="PatchOperationFindMod">
+              <mods><li>Missing</li></mods>
+              <match Class="PatchOperationRemove">
+                <xpath>/Defs/RecipeDef</xpath>
+              </match>
+            </Operation>""",
+            False,
+        ),
+    ],
+)
+def test_projection_wants(operation: str, wanted: bool):
+    """Operations are wanted if they may change or create requested defs"""
+    assert Projection({"RecipeDef"}).wants(_operation(operation)) is wanted
+
+
+@pytest.mark.parametrize(
+    "operation",
+    [
+        """<Operation Class="PatchOperationRemove">
+          <xpath>/Defs/*[2]</xpath>
+        </Operation>""",
+        """<Operation Class="PatchOperationSequence"><operations>
+          <li Class="PatchOperationTest"><xpath>/Defs/ThingDef[defName="A"]</xpath></li>
+          <li Class="PatchOperationRemove"><xpath>/Defs/RecipeDef/label</xpath></li>
+        </operations></Operation>""",
+        """<Operation Class="PatchOperationSetName">
+          <xpath>/Defs/ThingDef[defName="A"]</xpath>
+          <name>RecipeDef</name>
+        </Operation>""",
+        """<Operation Class="PatchOperationInsert">
+          <xpath>/Defs/ThingDef[defName="A"]</xpath>
+          <value><RecipeDef><defName>Cook</defName></RecipeDef></value>
+        </Operation>""",
+    ],
+)
+def test_projection_unsafe(operation: str):
+    """Operations which need defs of other types cannot be projected"""
+    with pytest.raises(UnsafeProjectionError):
+        Projection({"RecipeDef"}).wants(_operation(operation))
+
+
+def test_projection_check():
+    """Names of dropped defs, even set by skipped operations, are remembered"""
+    projection = Projection({"RecipeDef"})
+    defs = etree.ElementTree(
+        etree.fromstring(
+            """<Defs>
+        <ThingDef Name="Base" />
+        <RecipeDef ParentName="Renamed"><defName>Smelt</defName></RecipeDef>
+    </Defs>"""
+        )
+    )
+    projection.filter_defs(defs)
+    assert [n.tag for n in defs.getroot()] == ["RecipeDef"]
+    assert not projection.wants(
+        _operation(
+            """<Operation Class="PatchOperationAttributeSet">
+          <xpath>/Defs/ThingDef[@Name="Base"]</xpath>
+          <attribute>Name</attribute>
+          <value>Renamed</value>
+        </Operation>"""
+        )
+    )
+    with pytest.raises(UnsafeProjectionError):
+        projection.check(defs)
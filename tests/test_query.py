@@ -0,0 +1,72 @@
+""" Tests for rimworld.query """
+
+import math
+
+import pytest
+from lxml import etree
+
+from rimworld.query import DefIndex
+
+WORLD = """<Defs>
+  <ThingDef Name="BaseThing" Abstract="True"><stackLimit>1</stackLimit></ThingDef>
+  <ThingDef>
+    <defName>Steel</defName><stackLimit>75</stackLimit><smeltable>true</smeltable>
+    <statBases><MarketValue>1.9</MarketValue></statBases>
+  </ThingDef>
+  <ThingDef>
+    <defName>Wood</defName><smeltable>False</smeltable>
+    <statBases><MarketValue> 1.2 </MarketValue></statBases>
+  </ThingDef>
+  <!-- a comment -->
+  <StatDef><defName>MarketValue</defName></StatDef>
+  <StatDef><defName>MarketValue</defName><label>duplicate</label></StatDef>
+</Defs>"""
+
+
+@pytest.fixture(name="index")
+def fixture_index() -> DefIndex:
+    """Index of a small world"""
+    return DefIndex(etree.ElementTree(etree.fromstring(WORLD)))
+
+
+def test_lookup(index: DefIndex):
+    """Defs are found by type and defName, abstract defs are left out"""
+    steel = index.get("ThingDef", "Steel")
+    assert steel is not None and steel.findtext("stackLimit") == "75"
+    assert index.get("StatDef", "Steel") is None
+    assert index.get("StatDef", "MarketValue") is index.of_type("StatDef")[0]
+    assert index.types() == ["ThingDef", "StatDef"]
+    assert index.names("ThingDef") == ["Steel", "Wood"]
+    assert index.of_type("RecipeDef") == []
+    assert len(index) == len(list(index)) == 4
+
+
+def test_columns(index: DefIndex):
+    """Fields are converted, missing ones get a default"""
+    values = index.column("ThingDef", "statBases/MarketValue", float, numpy=False)
+    assert (values.typecode, list(values)) == ("d", [1.9, 1.2])
+    limits = index.column("ThingDef", "stackLimit", int, numpy=False)
+    assert (limits.typecode, list(limits)) == ("q", [75, 0])
+    limits = index.column("ThingDef", "stackLimit", int, default=1, numpy=False)
+    assert list(limits) == [75, 1]
+    assert list(index.column("ThingDef", "smeltable", bool, numpy=False)) == [1, 0]
+    assert index.column("StatDef", "label") == [None, "duplicate"]
+    masses = index.column("ThingDef", "statBases/Mass", float, numpy=False)
+    assert all(math.isnan(m) for m in masses)
+
+
+def test_column_errors(index: DefIndex):
+    """Values that cannot be converted are reported"""
+    with pytest.raises(ValueError, match="Steel"):
+        index.column("ThingDef", "defName", float, numpy=False)
+    with pytest.raises(ValueError):
+        index.column("ThingDef", "defName", bytes)
+
+
+def test_numpy_columns(index: DefIndex):
+    """Numeric columns become NumPy arrays"""
+    numpy = pytest.importorskip("numpy")
+    values = index.column("ThingDef", "statBases/MarketValue", float)
+    assert isinstance(values, numpy.ndarray) and values.dtype == numpy.float64
+    smeltable = index.column("ThingDef", "smeltable", bool, numpy=True)
+    assert smeltable.tolist() == [True, False]
@@ -0,0 +1,39 @@
+""" rimworld.patch.serializers """
+
+import pickle
+
+import pytest
+from lxml import etree
+
+from rimworld.error import PatchError
+from rimworld.patch.serializers import SafeElement
+
+
+def test_materialize_copies():
+    """Each target gets its own copy of the value"""
+    value = SafeElement(etree.fromstring("<value><a>1</a><b/></value>"))
+    copies = list(value.materialize(3))
+    assert len({id(c) for c in copies}) == 3
+    assert all(etree.tostring(c) == b"<value><a>1</a><b/></value>" for c in copies)
+    assert pickle.loads(pickle.dumps(value)).copy().tag == "value"
+
+
+def test_materialize_consume():
+    """The last target gets the value itself, which cannot be used again"""
+    element = etree.fromstring("<value><a>1</a></value>")
+    value = SafeElement(element)
+    copies = list(value.materialize(2, consume=True))
+    assert copies[0] is not element
+    assert copies[1] is element
+    with pytest.raises(PatchError):
+        value.copy()
+    with pytest.raises(PatchError):
+        list(value.materialize(1))
+
+
+def test_materialize_text():
+    """Values without child elements are never copied"""
+    element = etree.fromstring("<value>text</value>")
+    value = SafeElement(element)
+    assert all(v is element for v in value.materialize(3, consume=True))
+    assert value.copy().text == "text"
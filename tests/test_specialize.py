@@ -0,0 +1,127 @@
+""" rimworld.patch.specialize """
+
+from lxml import etree
+
+from rimworld.patch import (PatchContext, PatchOperationAdd,
+                            PatchOperationSequence, PatchOperationWrapper,
+                            Success, get_operation)
+from rimworld.patch.specialize import (PatchOperationDisabled,
+                                       PatchOperationResolved, specialize)
+from rimworld.xml import xml_to_string
+
+CONTEXT = PatchContext(
+    active_package_ids={"ludeon.rimworld", "test.present"},
+    active_package_names={"Core", "Present"},
+)
+
+DEFS = "<Defs><ThingDef><defName>A</defName></ThingDef></Defs>"
+
+
+def add(label: str, tag: str = "li", attributes: str = "") -> str:
+    """An Add operation"""
+    return (
+        f'<{tag} Class="PatchOperationAdd" {attributes}>'
+        f"<xpath>/Defs/ThingDef</xpath><value><label>{label}</label></value></{tag}>"
+    )
+
+
+def sequence(*operations: str, tag: str = "li") -> str:
+    """A Sequence operation"""
+    items = "".join(operations)
+    return f'<{tag} Class="PatchOperationSequence"><operations>{items}</operations></{tag}>'
+
+
+def find_mod(mod: str, match: str = "", nomatch: str = "", tag: str = "li") -> str:
+    """A FindMod operation, branches are made with tags `match` and `nomatch`"""
+    return (
+        f'<{tag} Class="PatchOperationFindMod"><mods><li>{mod}</li></mods>'
+        f"{match}{nomatch}</{tag}>"
+    )
+
+
+def assert_same_effect(xml: str):
+    """The specialized operation patches the same way as the original one"""
+    original = get_operation(etree.fromstring(xml))
+    expected = etree.ElementTree(etree.fromstring(DEFS))
+    original(expected, CONTEXT)
+    actual = etree.ElementTree(etree.fromstring(DEFS))
+    specialize(original, CONTEXT)(actual, CONTEXT)
+    assert xml_to_string(actual) == xml_to_string(expected)
+
+
+def test_may_require():
+    """Denied operations are disabled, allowed ones lose their checks"""
+    denied = get_operation(
+        etree.fromstring(add("a", "Operation", 'MayRequire="test.absent"'))
+    )
+    assert isinstance(specialize(denied, CONTEXT), PatchOperationDisabled)
+
+    allowed = get_operation(
+        etree.fromstring(
+            add("a", "Operation", 'MayRequireAnyOf="test.absent,test.present"')
+        )
+    )
+    assert isinstance(allowed, PatchOperationWrapper)
+    assert isinstance(specialize(allowed, CONTEXT), PatchOperationAdd)
+
+    forced = specialize(
+        PatchOperationWrapper(
+            allowed.operation, ["test.present"], None, Success.ALWAYS
+        ),
+        CONTEXT,
+    )
+    assert isinstance(forced, PatchOperationWrapper)
+    assert forced.may_require is None
+
+
+def test_find_mod():
+    """Only the taken branch is kept"""
+    xml = find_mod("Core", add("a", "match"), add("b", "nomatch"), tag="Operation")
+    specialized = specialize(get_operation(etree.fromstring(xml)), CONTEXT)
+    assert isinstance(specialized, PatchOperationResolved)
+    assert specialized.matched
+    assert isinstance(specialized.branch, PatchOperationAdd)
+    assert_same_effect(xml)
+
+
+def test_sequence_flattened():
+    """Operations without effect are pruned and a trailing sequence is flattened"""
+    xml = sequence(
+        add("a", attributes='MayRequire="test.absent"'),
+        add("b"),
+        sequence(add("c"), find_mod("Absent", add("d", "match"))),
+        tag="Operation",
+    )
+    specialized = specialize(get_operation(etree.fromstring(xml)), CONTEXT)
+    assert isinstance(specialized, PatchOperationSequence)
+    assert [type(op) for op in specialized.operations] == [
+        PatchOperationAdd,
+        PatchOperationAdd,
+    ]
+    assert_same_effect(xml)
+
+
+def test_sequence_stopped():
+    """Operations after a FindMod without a taken branch are never applied"""
+    xml = sequence(
+        add("a"), find_mod("Absent", add("b", "match")), add("c"), tag="Operation"
+    )
+    specialized = specialize(get_operation(etree.fromstring(xml)), CONTEXT)
+    assert isinstance(specialized, PatchOperationAdd)
+    assert_same_effect(xml)
+
+
+def test_nested_sequence_kept():
+    """A nested sequence does not stop the outer one, so it is not flattened"""
+    xml = sequence(
+        sequence(add("a"), find_mod("Absent", add("b", "match")), add("c")),
+        add("d"),
+        tag="Operation",
+    )
+    specialized = specialize(get_operation(etree.fromstring(xml)), CONTEXT)
+    assert isinstance(specialized, PatchOperationSequence)
+    nested, last = specialized.operations
+    assert isinstance(nested, PatchOperationSequence)
+    assert len(nested.operations) == 1
+    assert isinstance(last, PatchOperationAdd)
+    assert_same_effect(xml)
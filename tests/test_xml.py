@@ -1,8 +1,12 @@
 """ rimwold.xml """
 
+from copy import deepcopy
+
+import pytest
 from lxml import etree
 
-from rimworld.xml import make_element
+from rimworld.xml import (DefNameIndex, ElementXpath, Xpath, compact_xml,
+                          compile_xpath, make_element)
 
 
 def test_make_element_with_parent():
@@ -10,3 +14,149 @@ def test_make_element_with_parent():
     parent = etree.Element("parent")
     child = make_element("child", parent=parent)
     assert parent.find("child") is child
+
+
+def test_compact_xml():
+    """Comments, processing instructions and blank tails are removed"""
+    xml = etree.ElementTree(
+        etree.fromstring(
+            "<Defs><!-- a --><ThingDef><?pi x?><label>a <b/> b</label> </ThingDef>"
+            "\n  <!-- b --></Defs>"
+        )
+    )
+    assert compact_xml(xml) is xml
+    assert etree.tostring(xml, encoding=str) == (
+        "<Defs><ThingDef><label>a <b/> b</label></ThingDef></Defs>"
+    )
+
+
+def test_xpath_search_uses_compiled_cache():
+    """Repeated searches reuse the compiled expression"""
+    xml = etree.ElementTree(
+        etree.fromstring(
+            '<Defs><ThingDef Name="A"><defName>Steel</defName></ThingDef></Defs>'
+        )
+    )
+    xpath = Xpath.choose('/Defs/ThingDef[defName="Steel"]')
+    text_xpath = Xpath.choose('/Defs/ThingDef[defName="Steel"]/defName/text()')
+    attribute_xpath = Xpath.choose("/Defs/ThingDef/@Name")
+
+    compile_xpath.cache_clear()
+    assert xpath.search(xml) == xml.xpath(xpath.xpath)
+    assert [t.text for t in text_xpath.search(xml)] == ["Steel"]
+    assert [a.value for a in attribute_xpath.search(xml)] == ["A"]
+    assert compile_xpath.cache_info().misses == 3
+
+    hits = compile_xpath.cache_info().hits
+    xpath.search(xml)
+    assert compile_xpath.cache_info().hits == hits + 1
+
+
+@pytest.mark.parametrize(
+    "xpath",
+    [
+        "/Defs/ThingDef",
+        "/Defs/ThingDef[defName='Steel']",
+        "/*/ThingDef",
+        "/Defs/ThingDef | /Defs/ThingDef/defName",
+        "//defName",
+        "ThingDef",
+    ],
+)
+def test_xpath_search_matches_lxml(xpath):
+    """Cached search returns what lxml returns, both on trees and elements"""
+    xml = etree.ElementTree(
+        etree.fromstring(
+            "<Defs><ThingDef><defName>Steel</defName></ThingDef><ThingDef/></Defs>"
+        )
+    )
+    elt_xpath = ElementXpath(xpath)
+    assert elt_xpath.search(xml) == xml.xpath(xpath)
+    assert elt_xpath.search(xml.getroot()) == xml.getroot().xpath(xpath)
+
+    wrapped = etree.ElementTree(etree.SubElement(etree.Element("Case"), "Defs"))
+    etree.SubElement(wrapped.getroot(), "ThingDef")
+    assert elt_xpath.search(wrapped) == wrapped.xpath(xpath)
+
+
+def _defs_tree() -> etree._ElementTree:
+    return etree.ElementTree(
+        etree.fromstring(
+            "<Defs>"
+            '<ThingDef Name="A"><defName>Steel</defName><label>steel</label></ThingDef>'
+            "<ThingDef><defName>Wood</defName><label>wood</label></ThingDef>"
+            "<RecipeDef><defName>Steel</defName></RecipeDef>"
+            "<ThingDef><defName>Steel</defName><label>more steel</label></ThingDef>"
+            "</Defs>"
+        )
+    )
+
+
+@pytest.mark.parametrize(
+    "xpath",
+    [
+        '/Defs/ThingDef[defName="Steel"]',
+        "/Defs/ThingDef[defName='Wood']/label",
+        '/Defs/ThingDef[ defName = "Steel" ]/label/text()',
+        '/Defs/ThingDef[defName="Steel"]/@Name',
+        '/Defs/ThingDef[defName="Steel"]/..',
+        '/Defs/ThingDef[defName="Steel"]/label/../../RecipeDef',
+        '/Defs/ThingDef[defName="Steel"]/following-sibling::*',
+        '/Defs/ThingDef[defName="Steel"][2]',
+        '/Defs/ThingDef[defName="Steel"] | /Defs/RecipeDef',
+        '/Defs/ThingDef[defName="Iron"]/label',
+    ],
+)
+def test_def_name_index_search(xpath):
+    """Searching through the index returns what lxml returns"""
+    xml = _defs_tree()
+    index = DefNameIndex(xml.getroot())
+    found = Xpath.choose(xpath).search(xml, index)
+    expected = Xpath.choose(xpath).search(xml)
+    assert found == expected
+
+
+def test_def_name_index_update():
+    """The index follows changes reported through update"""
+    xml = _defs_tree()
+    root = xml.getroot()
+    index = DefNameIndex(root)
+    xpath = ElementXpath('/Defs/ThingDef[defName="Wood"]')
+
+    wood = root[1]
+    assert xpath.search(xml, index) == [wood]
+
+    wood.find("defName").text = "Plank"
+    index.update(wood.find("defName"))
+    assert not xpath.search(xml, index)
+
+    new_wood = make_element("ThingDef", parent=root)
+    make_element("defName", "Wood", parent=new_wood)
+    index.update(new_wood)
+    assert xpath.search(xml, index) == [new_wood]
+
+    root.remove(new_wood)
+    assert not xpath.search(xml, index)
+
+    wood.tag = "TerrainDef"
+    wood.find("defName").text = "Wood"
+    index.update(wood)
+    assert not xpath.search(xml, index)
+    assert ElementXpath('/Defs/TerrainDef[defName="Wood"]').search(xml, index) == [wood]
+
+    duplicate = deepcopy(root[0])
+    root.insert(0, duplicate)
+    index.update(duplicate)
+    assert ElementXpath('/Defs/ThingDef[defName="Steel"]').search(xml, index) == [
+        duplicate,
+        root[1],
+        root[4],
+    ]
+
+
+def test_def_name_index_ignores_other_trees():
+    """An index is only used for the tree it was built for"""
+    xml = _defs_tree()
+    index = DefNameIndex(etree.fromstring("<Defs/>"))
+    xpath = ElementXpath('/Defs/ThingDef[defName="Wood"]')
+    assert xpath.search(xml, index) == [xml.getroot()[1]]
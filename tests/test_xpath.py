@@ -0,0 +1,253 @@
+""" rimworld.xpath """
+
+from copy import deepcopy
+
+import pytest
+from lxml import etree
+
+from rimworld.xml import DefNameIndex, Xpath
+from rimworld.xpath import def_footprint, plan_xpath
+
+DEFS = """
+<Defs>
+    <ThingDef Name="BaseThing" Abstract="True">
+        <label>base</label>
+    </ThingDef>
+    <ThingDef ParentName="BaseThing">
+        <defName>Steel</defName>
+        <label>steel</label>
+        <comps>
+            <li Class="CompProperties_Forbiddable"/>
+            <li Class="CompProperties_Art"><minQuality>Good</minQuality></li>
+            <li>plain</li>
+        </comps>
+        <tags><li>a</li><li>b</li></tags>
+    </ThingDef>
+    <ThingDef ParentName="BaseThing">
+        <defName>Wood</defName>
+        <label>wood<!-- comment -->s</label>
+        <comps><li Class="CompProperties_Forbiddable"/></comps>
+    </ThingDef>
+    <RecipeDef Name="BaseRecipe">
+        <defName>Steel</defName>
+        <label>smelt</label>
+    </RecipeDef>
+    <ThingDef>
+        <defName>Steel</defName>
+        <label>duplicate</label>
+    </ThingDef>
+</Defs>
+"""
+
+XPATHS = [
+    '/Defs/ThingDef[defName="Steel"]',
+    '/Defs/ThingDef[defName="Steel" or defName="Wood"]/label',
+    '/Defs/ThingDef[defName="Wood" or defName="Steel"]/label',
+    "/Defs/ThingDef[(defName='Wood' or defName='Iron') and label]",
+    '/Defs/*[defName="Steel"]',
+    '/Defs/*[defName="Steel"]/label/text()',
+    '/Defs/*[@Name="BaseRecipe"]/label',
+    '/Defs/ThingDef[@Name="BaseThing"]',
+    '/Defs/ThingDef[@Name="BaseRecipe"]',
+    '/Defs/ThingDef[defName="Steel"]/comps/li[@Class="CompProperties_Art"]',
+    '/Defs/ThingDef[defName="Steel"]/comps/li[@Class]/minQuality',
+    '/Defs/ThingDef[defName="Steel"]/comps/li[not(@Class)]',
+    '/Defs/ThingDef[defName="Steel"]/comps/li[text()="plain"]',
+    '/Defs/ThingDef[defName="Steel"]/tags/li[text()="b"]',
+    '/Defs/ThingDef[defName="Steel"]/tags/*',
+    '/Defs/ThingDef[defName="Steel"]/comps/li[1]',
+    '/Defs/ThingDef[defName="Steel"]/comps//minQuality',
+    '/Defs/ThingDef[defName="Steel"]/label/..',
+    '/Defs/ThingDef[tags/li="a"]/label',
+    '/Defs/ThingDef[comps/li[@Class="CompProperties_Art"]]',
+    '/Defs/*[contains(label, "s")]/defName',
+    "/Defs/ThingDef[count(comps/li) > 1]",
+    '/Defs/ThingDef[defName="Steel"]/following-sibling::*[1]',
+    '/Defs/ThingDef[defName="Wood"][label="woods"]',
+    '/Defs/ThingDef[defName="Wood" and label="wood"]',
+    '/Defs/ThingDef[defName="Steel"]/@ParentName',
+    '/Defs/ThingDef[defName="Steel"] | /Defs/RecipeDef',
+    '/Defs/ThingDef[defName="Iron"]/label',
+    "/Defs/ThingDef/label",
+    '/Defs/ThingDef[label="steel"]',
+    '/Defs/ThingDef[defName="Steel" or label="wood"]',
+    '/Defs/ThingDef[defName="Steel"][position() = 1]',
+    '/Defs/ThingDef[defName = "Steel"]/comps/li[@Class="CompProperties_Art"]'
+    "/minQuality/text()",
+    '/Defs/VFECore.ExpandableProjectileDef[starts-with(defName, "A")]/label',
+    "/Defs/RecipeDef/label",
+    '/Defs/ThingDef[defName="Wood" and comps/li]/label',
+    '/Defs/ThingDef[tags/li="a"][defName="Steel" or defName="Iron"]',
+    '/Defs/*[defName="Iron" and comps/li]',
+]
+
+
+@pytest.fixture(name="xml")
+def fixture_xml() -> etree._ElementTree:
+    """Defs for the planner to search"""
+    parser = etree.XMLParser(remove_blank_text=True)
+    return etree.ElementTree(etree.fromstring(DEFS, parser=parser))
+
+
+@pytest.mark.parametrize("xpath", XPATHS)
+def test_planned_search(xml: etree._ElementTree, xpath: str):
+    """Planned search returns the same nodes lxml does"""
+    index = DefNameIndex(xml.getroot())
+    xp = Xpath.choose(xpath)
+    assert xp.search(xml, index) == xp.search(xml)
+
+
+def test_planned_search_after_changes(xml: etree._ElementTree):
+    """Planned search follows changes reported to the index"""
+    root = xml.getroot()
+    index = DefNameIndex(root)
+    xpath = Xpath.choose('/Defs/*[@Name="BaseThing" or defName="Wood"]')
+
+    root[0].set("Name", "Renamed")
+    index.update(root[0])
+    assert xpath.search(xml, index) == xpath.search(xml) == [root[2]]
+
+    root[3].set("Name", "BaseThing")
+    index.update(root[3])
+    assert xpath.search(xml, index) == xpath.search(xml) == [root[2], root[3]]
+
+
+@pytest.mark.parametrize(
+    ("xpath", "strategy"),
+    [
+        ('/Defs/ThingDef[defName="A" or defName="B"]', "index lookup"),
+        ('/Defs/*[@Name="A"]/comps/li[@Class="B"]', "index lookup"),
+        ("/Defs/ThingDef/label", "lxml"),
+        ('Defs/ThingDef[defName="A"]', "lxml"),
+        ('/Defs/ThingDef[defName="A"] | /Defs/ThingDef', "lxml"),
+        ('/Defs/ThingDef[defName="A"][1]', "lxml"),
+        ('/Defs/ThingDef[starts-with(defName, "A")]', "lxml"),
+    ],
+)
+def test_explain(xpath: str, strategy: str):
+    """explain() tells which strategy is used"""
+    assert plan_xpath(xpath).explain().startswith(f"{strategy}:")
+    assert Xpath.choose(xpath).explain() == plan_xpath(xpath).explain()
+
+
+def test_explain_remainder():
+    """Steps the planner cannot walk are left to lxml"""
+    plan = plan_xpath('/Defs/ThingDef[defName="A"]/comps/li[2]/label')
+    assert plan.explain().splitlines() == [
+        'index lookup: ThingDef[defName="A"] by defName',
+        "child iteration: comps",
+        "lxml: ./li[2]/label",
+    ]
+
+
+@pytest.mark.parametrize(
+    ("xpath", "tag"),
+    [
+        ('/Defs/ThingDef[defName="A"]/label', "ThingDef"),
+        ("/Defs/ThingDef/comps/li[2]", "ThingDef"),
+        ('/Defs/Mod.SomeDef[starts-with(defName, "A")]/@Name', "Mod.SomeDef"),
+        ("/Defs/ThingDef/child::label/text()", "ThingDef"),
+        ('/Defs/*[defName="A"]', None),
+        ("/Defs/ThingDef | /Defs/RecipeDef", None),
+        ("/Defs/ThingDef/label = 'a'", None),
+        ("/Defs/ThingDef/label and /Defs/RecipeDef", None),
+        ("/Defs/following-sibling::ThingDef", None),
+        ("/Defs", None),
+        ("//ThingDef", None),
+    ],
+)
+def test_def_tag(xpath: str, tag: str | None):
+    """Only plain location paths under a def type are checked for the tag"""
+    assert plan_xpath(xpath).def_tag == tag
+
+
+def test_absent_def_tag(xml: etree._ElementTree):
+    """Xpaths under def types not in the tree select nothing"""
+    root = xml.getroot()
+    index = DefNameIndex(root)
+    xpath = Xpath.choose("/Defs/StatDef/label")
+    assert not index.has_tag("StatDef")
+    assert xpath.search(xml, index) == []
+
+    root[3].tag = "StatDef"
+    index.update(root[3])
+    assert index.has_tag("StatDef")
+    assert xpath.search(xml, index) == xpath.search(xml) == [root[3][1]]
+
+    root[3].tag = "RecipeDef"
+    index.update(root[3])
+    assert not index.has_tag("StatDef")
+    assert index.has_def_name("Wood")
+    assert not index.has_def_name("Iron")
+
+
+def test_absent_def_name(xml: etree._ElementTree):
+    """Xpaths left to lxml which need a defName not in the tree select nothing"""
+    root = xml.getroot()
+    index = DefNameIndex(root)
+    xpath = Xpath.choose('/Defs/*[defName="Iron" and comps/li]/label')
+    assert plan_xpath(xpath.xpath).def_names == ("Iron",)
+    assert xpath.search(xml, index) == []
+
+    root[2][0].text = "Iron"
+    index.update(root[2][0])
+    assert xpath.search(xml, index) == xpath.search(xml) == [root[2][1]]
+
+
+@pytest.mark.parametrize(
+    ("xpath", "kind", "whole"),
+    [
+        ('/Defs/ThingDef[defName="A"]/label', "defs", False),
+        ("/Defs/ThingDef/comps/li[2]", "defs", False),
+        ("/Defs/ThingDef/label/..", "defs", True),
+        ('/Defs/*[@Name="A"]/text()/..', "defs", True),
+        ("/Defs/ThingDef/label/../..", "any", False),
+        ("/Defs/ThingDef[1]/label", "any", False),
+        ('/Defs/ThingDef[tags/li="a"]/label', "defs", False),
+        ("/Defs/ThingDef[not(comps/li[1])]", "defs", True),
+        ("/Defs/ThingDef[last()]/label", "any", False),
+        ("/Defs/ThingDef[count(comps/li)]", "any", False),
+        ("/Defs/ThingDef[not(position() = 1)]", "any", False),
+        ("/Defs/ThingDef[preceding-sibling::ThingDef]", "any", False),
+        ("/Defs/ThingDef/comps[/Defs/RecipeDef]", "any", False),
+        ("/Defs/ThingDef | /Defs/RecipeDef", "any", False),
+        ("/Defs/ThingDef/label = 'a'", "any", False),
+        ("/Defs//li", "any", False),
+        ("/Defs", "root", False),
+        ("/ThingDef/label", "none", False),
+    ],
+)
+def test_def_footprint(xpath: str, kind: str, whole: bool):
+    """Footprints are narrowed down for paths staying inside defs"""
+    footprint = def_footprint(xpath)
+    assert (footprint.kind, footprint.whole) == (kind, whole)
+
+
+@pytest.mark.parametrize("xpath", XPATHS)
+def test_def_footprint_subtree(xml: etree._ElementTree, xpath: str):
+    """Xpaths select the same nodes in a tree of just the defs in their footprint"""
+    footprint = def_footprint(xpath)
+    if footprint.kind != "defs":
+        return
+    subtree = etree.Element("Defs")
+    for node in xml.getroot():
+        if footprint.tag not in (None, node.tag):
+            continue
+        if footprint.keys and not any(
+            (
+                node.get("Name") == value
+                if kind == "Name"
+                else node.findtext(kind) == value
+            )
+            for kind, value in footprint.keys
+        ):
+            continue
+        subtree.append(deepcopy(node))
+    expected = [
+        etree.tostring(getattr(n, "node", n)) for n in Xpath.choose(xpath).search(xml)
+    ]
+    actual = [
+        etree.tostring(getattr(n, "node", n))
+        for n in Xpath.choose(xpath).search(etree.ElementTree(subtree))
+    ]
+    assert actual == expected